@@ -1,7 +1,130 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
 class Settings:
     APP_NAME = "Semantic Kernel FastAPI"
     DEBUG = True
     HOST = "127.0.0.1"
     PORT = 8000
 
+    # Shared outbound HTTP client
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "100"))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+    HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+    HTTP_RETRY_BACKOFF_SECONDS = float(os.getenv("HTTP_RETRY_BACKOFF_SECONDS", "0.5"))
+
+    # api.weather.gov
+    WEATHER_API_BASE_URL = os.getenv("WEATHER_API_BASE_URL", "https://api.weather.gov").rstrip("/")
+    WEATHER_API_USER_AGENT = os.getenv("WEATHER_API_USER_AGENT", "app")
+
+    # Weather caches
+    WEATHER_POINTS_CACHE_PRECISION = int(os.getenv("WEATHER_POINTS_CACHE_PRECISION", "4"))
+    WEATHER_POINTS_CACHE_TTL_SECONDS = float(os.getenv("WEATHER_POINTS_CACHE_TTL_SECONDS", "604800"))
+    WEATHER_POINTS_CACHE_MAX_SIZE = int(os.getenv("WEATHER_POINTS_CACHE_MAX_SIZE", "10000"))
+    WEATHER_FORECAST_CACHE_TTL_SECONDS = float(os.getenv("WEATHER_FORECAST_CACHE_TTL_SECONDS", "900"))
+    WEATHER_FORECAST_CACHE_STALE_SECONDS = float(os.getenv("WEATHER_FORECAST_CACHE_STALE_SECONDS", "600"))
+    WEATHER_FORECAST_CACHE_MAX_SIZE = int(os.getenv("WEATHER_FORECAST_CACHE_MAX_SIZE", "2000"))
+
+    # Forecast projection handed to the model (0 periods keeps all; empty units keeps the upstream units)
+    WEATHER_FORECAST_PERIODS = int(os.getenv("WEATHER_FORECAST_PERIODS", "0"))
+    WEATHER_FORECAST_FIELDS = [field.strip() for field in os.getenv(
+        "WEATHER_FORECAST_FIELDS",
+        "name,startTime,temperature,temperatureUnit,probabilityOfPrecipitation,windSpeed,windDirection,shortForecast").split(",") if field.strip()]
+    WEATHER_FORECAST_UNITS = os.getenv("WEATHER_FORECAST_UNITS", "").upper()
+    WEATHER_FORECAST_FULL_DIAGNOSTICS = os.getenv("WEATHER_FORECAST_FULL_DIAGNOSTICS", "false").lower() in ("1", "true", "yes")
+
+    # Parallel tool calls and the multi-location weather tool
+    WEATHER_PARALLEL_TOOL_CALLS = os.getenv("WEATHER_PARALLEL_TOOL_CALLS", "true").lower() in ("1", "true", "yes")
+    WEATHER_TOOL_CONCURRENCY = int(os.getenv("WEATHER_TOOL_CONCURRENCY", "4"))
+    WEATHER_MAX_BATCH_LOCATIONS = int(os.getenv("WEATHER_MAX_BATCH_LOCATIONS", "10"))
+
+    # Offline geocoder used by get_lat_long before falling back to the LLM
+    GEOCODER_DATA_PATH = os.getenv("GEOCODER_DATA_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "us_places.csv"))
+    GEOCODER_MIN_PREFIX_LENGTH = int(os.getenv("GEOCODER_MIN_PREFIX_LENGTH", "4"))
+    GEOCODER_FUZZY_CUTOFF = float(os.getenv("GEOCODER_FUZZY_CUTOFF", "0.85"))
+    GEOCODER_CACHE_SIZE = int(os.getenv("GEOCODER_CACHE_SIZE", "4096"))
+    GEOCODER_CACHE_TTL_SECONDS = float(os.getenv("GEOCODER_CACHE_TTL_SECONDS", "86400"))
+
+    # Azure AI agent definition cache
+    AGENT_DEFINITION_CACHE_TTL_SECONDS = float(os.getenv("AGENT_DEFINITION_CACHE_TTL_SECONDS", "300"))
+    AGENT_DEFINITION_CACHE_STALE_SECONDS = float(os.getenv("AGENT_DEFINITION_CACHE_STALE_SECONDS", "3600"))
+
+    # Blob download and AI project file upload
+    FILE_UPLOAD_MEMORY_LIMIT_BYTES = int(os.getenv("FILE_UPLOAD_MEMORY_LIMIT_BYTES", str(8 * 1024 * 1024)))
+    FILE_UPLOAD_TEMP_DIR = os.getenv("FILE_UPLOAD_TEMP_DIR") or None
+    BLOB_DOWNLOAD_CONCURRENCY = int(os.getenv("BLOB_DOWNLOAD_CONCURRENCY", "4"))
+
+    # Uploaded file / vector store dedup index
+    FILE_INDEX_PATH = os.getenv("FILE_INDEX_PATH", os.path.join(".cache", "file_index.sqlite"))
+    FILE_INDEX_RETENTION_SECONDS = float(os.getenv("FILE_INDEX_RETENTION_SECONDS", str(7 * 24 * 3600)))
+    FILE_INDEX_CLEANUP_INTERVAL_SECONDS = float(os.getenv("FILE_INDEX_CLEANUP_INTERVAL_SECONDS", "3600"))
+    FILE_INDEX_MAX_JOBS = int(os.getenv("FILE_INDEX_MAX_JOBS", "1000"))
+
+    # Batch scheduler
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "100"))
+
+    # Client-side rate limits of the upstream deployments (0 disables a limit)
+    AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-10-21")
+    RATE_LIMIT_ESTIMATED_COMPLETION_TOKENS = int(os.getenv("RATE_LIMIT_ESTIMATED_COMPLETION_TOKENS", "800"))
+    RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+    RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "1"))
+    AZURE_OPENAI_RPM = float(os.getenv("AZURE_OPENAI_RPM", "0"))
+    AZURE_OPENAI_TPM = float(os.getenv("AZURE_OPENAI_TPM", "0"))
+    AZURE_AI_AGENT_RPM = float(os.getenv("AZURE_AI_AGENT_RPM", "0"))
+    AZURE_AI_AGENT_TPM = float(os.getenv("AZURE_AI_AGENT_TPM", "0"))
+
+    # Prompt registry hot reload (0 disables watching)
+    PROMPT_RELOAD_INTERVAL_SECONDS = float(os.getenv("PROMPT_RELOAD_INTERVAL_SECONDS", "2"))
+
+    # Worker processes serving the app (set by gunicorn.conf.py). With more than one,
+    # caches and threads are shared through CACHE_PATH unless CACHE_BACKEND=memory
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+    CACHE_BACKEND = (os.getenv("CACHE_BACKEND", "") or ("sqlite" if WEB_CONCURRENCY > 1 else "memory")).lower()
+    CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(".cache", "shared_cache.sqlite"))
+
+    # Server-side weather conversation threads (THREAD_STORE_PATH enables SQLite persistence)
+    THREAD_STORE_MAX_THREADS = int(os.getenv("THREAD_STORE_MAX_THREADS", "1000"))
+    THREAD_STORE_TTL_SECONDS = float(os.getenv("THREAD_STORE_TTL_SECONDS", str(24 * 3600)))
+    THREAD_STORE_PATH = os.getenv("THREAD_STORE_PATH", "")
+
+    # Chat history compaction (the tokenizer is used when tiktoken is installed)
+    HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "4000"))
+    HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "4"))
+    HISTORY_TOOL_RESULT_MAX_TOKENS = int(os.getenv("HISTORY_TOOL_RESULT_MAX_TOKENS", "500"))
+    HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "400"))
+    HISTORY_TOKENIZER_ENCODING = os.getenv("HISTORY_TOKENIZER_ENCODING", "o200k_base")
+
+    # /weather response cache (opt-in; a similarity threshold above 0 enables the embedding tier)
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+    RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900"))
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY_THRESHOLD", "0"))
+
+    # Telemetry pipeline. TELEMETRY_EXPORTER is azure, console or none; empty picks
+    # azure when APPLICATIONINSIGHTS_CONNECTION_STRING is set, otherwise console
+    TELEMETRY_EXPORTER = os.getenv("TELEMETRY_EXPORTER", "").lower()
+    TELEMETRY_SAMPLE_RATIO = float(os.getenv("TELEMETRY_SAMPLE_RATIO", "1.0"))
+    TELEMETRY_TAIL_SAMPLING = os.getenv("TELEMETRY_TAIL_SAMPLING", "false").lower() in ("1", "true", "yes")
+    TELEMETRY_SLOW_REQUEST_MS = float(os.getenv("TELEMETRY_SLOW_REQUEST_MS", "2000"))
+    TELEMETRY_TAIL_MAX_TRACES = int(os.getenv("TELEMETRY_TAIL_MAX_TRACES", "2048"))
+    TELEMETRY_BATCH_MAX_QUEUE_SIZE = int(os.getenv("TELEMETRY_BATCH_MAX_QUEUE_SIZE", "2048"))
+    TELEMETRY_BATCH_MAX_EXPORT_SIZE = int(os.getenv("TELEMETRY_BATCH_MAX_EXPORT_SIZE", "512"))
+    TELEMETRY_BATCH_SCHEDULE_DELAY_MS = float(os.getenv("TELEMETRY_BATCH_SCHEDULE_DELAY_MS", "5000"))
+    TELEMETRY_METRIC_EXPORT_INTERVAL_MS = float(os.getenv("TELEMETRY_METRIC_EXPORT_INTERVAL_MS", "5000"))
+    TELEMETRY_INSTRUMENT_REQUESTS = os.getenv("TELEMETRY_INSTRUMENT_REQUESTS", "true").lower() in ("1", "true", "yes")
+
+    # Event loop diagnostics: lag measurement, stack traces of blocking code and /debug/profile
+    DIAGNOSTICS_ENABLED = os.getenv("DIAGNOSTICS_ENABLED", "false").lower() in ("1", "true", "yes")
+    DIAGNOSTICS_LOOP_INTERVAL_MS = float(os.getenv("DIAGNOSTICS_LOOP_INTERVAL_MS", "50"))
+    DIAGNOSTICS_SLOW_CALLBACK_MS = float(os.getenv("DIAGNOSTICS_SLOW_CALLBACK_MS", "100"))
+    DIAGNOSTICS_PROFILE_MAX_SECONDS = float(os.getenv("DIAGNOSTICS_PROFILE_MAX_SECONDS", "60"))
+
 settings = Settings()
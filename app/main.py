@@ -1,13 +1,11 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from .routes.agent_endpoints import router as workflow_router
 from .routes.status import router as status_router
+from .routes.batch_endpoints import router as batch_router
+from .routes.debug import router as debug_router
+import asyncio
 import logging
-from azure.monitor.opentelemetry.exporter import (
-    AzureMonitorLogExporter,
-    AzureMonitorMetricExporter,
-    AzureMonitorTraceExporter,
-)
-from azure.monitor.opentelemetry import configure_azure_monitor
 from opentelemetry._logs import set_logger_provider
 from opentelemetry.metrics import set_meter_provider
 from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
@@ -18,10 +16,19 @@ from opentelemetry.sdk.metrics.view import DropAggregation, View
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased, TraceIdRatioBased
 from opentelemetry.semconv.resource import ResourceAttributes
 from opentelemetry.trace import set_tracer_provider
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.requests import RequestsInstrumentor
+from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+from app.utils.http_client import close_http_client
+from app.services.azure_clients import azure_clients
+from app.prompts.file_service import file_service
+from app.services.registry import services
+from app.config.settings import settings
+from app.utils.telemetry import TailSamplingSpanProcessor
+from app.utils.diagnostics import EventLoopMonitor
 
 from dotenv import load_dotenv
 import os
@@ -30,19 +37,37 @@ load_dotenv()
 ai_connection_string = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
 resource = Resource.create({ResourceAttributes.SERVICE_NAME: "demo-ai-flows-python"})
 
-# Setup logging functions
-# configure_azure_monitor()
+# azure, console or none; none keeps the no-op providers so telemetry costs nothing
+exporter_mode = settings.TELEMETRY_EXPORTER or ("azure" if ai_connection_string else "console")
 
-# Instrumenting the requests library for OpenTelemetry tracing
-RequestsInstrumentor().instrument()
 def configure_tracer(exporter):
-    tracer_provider = TracerProvider(resource=resource)
-    tracer_provider.add_span_processor(BatchSpanProcessor(exporter))
+    # With tail sampling every span is recorded and the processor decides per trace
+    if settings.TELEMETRY_TAIL_SAMPLING:
+        sampler = ALWAYS_ON
+    else:
+        sampler = ParentBased(TraceIdRatioBased(settings.TELEMETRY_SAMPLE_RATIO))
+    tracer_provider = TracerProvider(resource=resource, sampler=sampler)
+    processor = BatchSpanProcessor(
+        exporter,
+        max_queue_size=settings.TELEMETRY_BATCH_MAX_QUEUE_SIZE,
+        max_export_batch_size=settings.TELEMETRY_BATCH_MAX_EXPORT_SIZE,
+        schedule_delay_millis=settings.TELEMETRY_BATCH_SCHEDULE_DELAY_MS)
+    if settings.TELEMETRY_TAIL_SAMPLING:
+        processor = TailSamplingSpanProcessor(
+            processor,
+            ratio=settings.TELEMETRY_SAMPLE_RATIO,
+            slow_ms=settings.TELEMETRY_SLOW_REQUEST_MS,
+            max_traces=settings.TELEMETRY_TAIL_MAX_TRACES)
+    tracer_provider.add_span_processor(processor)
     set_tracer_provider(tracer_provider)
 
 def configure_logger(exporter):
     logger_provider = LoggerProvider(resource=resource)
-    logger_provider.add_log_record_processor(BatchLogRecordProcessor(exporter))
+    logger_provider.add_log_record_processor(BatchLogRecordProcessor(
+        exporter,
+        max_queue_size=settings.TELEMETRY_BATCH_MAX_QUEUE_SIZE,
+        max_export_batch_size=settings.TELEMETRY_BATCH_MAX_EXPORT_SIZE,
+        schedule_delay_millis=settings.TELEMETRY_BATCH_SCHEDULE_DELAY_MS))
     set_logger_provider(logger_provider)
 
     handler = LoggingHandler()
@@ -53,28 +78,68 @@ def configure_logger(exporter):
 
 def configure_metric(exporter):
     meter_provider = MeterProvider(
-        metric_readers=[PeriodicExportingMetricReader(exporter, export_interval_millis=5000)],
+        metric_readers=[PeriodicExportingMetricReader(exporter, export_interval_millis=settings.TELEMETRY_METRIC_EXPORT_INTERVAL_MS)],
         resource=resource,
         views=[
             View(instrument_name="*", aggregation=DropAggregation()),
             View(instrument_name="semantic_kernel*"),
+            View(instrument_name="app.*"),
         ],
     )
     set_meter_provider(meter_provider)
 
-# Initialization logging based on connection string
-if ai_connection_string:
+# Initialization logging based on the exporter mode
+if exporter_mode == "azure":
+    # The exporter stack is only imported when it is used
+    from azure.monitor.opentelemetry.exporter import (
+        AzureMonitorLogExporter,
+        AzureMonitorMetricExporter,
+        AzureMonitorTraceExporter,
+    )
     configure_tracer(AzureMonitorTraceExporter(connection_string=ai_connection_string))
     configure_logger(AzureMonitorLogExporter(connection_string=ai_connection_string))
     configure_metric(AzureMonitorMetricExporter(connection_string=ai_connection_string))
-else:
+elif exporter_mode == "console":
     configure_tracer(ConsoleSpanExporter())
     #configure_logger(ConsoleLogExporter())
     #configure_metric(ConsoleMetricExporter())
 
+# Instrumenting the requests and httpx libraries for OpenTelemetry tracing
+if exporter_mode != "none":
+    if settings.TELEMETRY_INSTRUMENT_REQUESTS:
+        RequestsInstrumentor().instrument()
+    HTTPXClientInstrumentor().instrument()
+
+async def start_services():
+    await services.start()
+    # Orphaned file cleanup needs the agent clients, so it starts once they are up
+    from app.utils.file_utils import run_file_cleanup
+    await run_file_cleanup()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Services load in the background; /ready reports when they are available
+    background_tasks = [asyncio.create_task(start_services())]
+    if settings.PROMPT_RELOAD_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(file_service.watch(settings.PROMPT_RELOAD_INTERVAL_SECONDS)))
+    if settings.DIAGNOSTICS_ENABLED:
+        monitor = EventLoopMonitor(settings.DIAGNOSTICS_LOOP_INTERVAL_MS, settings.DIAGNOSTICS_SLOW_CALLBACK_MS)
+        background_tasks.append(asyncio.create_task(monitor.run()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await services.close()
+    # Release pooled connections held by the shared outbound HTTP and Azure clients
+    await close_http_client()
+    await azure_clients.close()
+
 # FastAPI app setup
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(workflow_router)
+app.include_router(batch_router)
 app.include_router(status_router)
-FastAPIInstrumentor.instrument_app(app)
+if settings.DIAGNOSTICS_ENABLED:
+    app.include_router(debug_router)
+if exporter_mode != "none":
+    FastAPIInstrumentor.instrument_app(app)
 
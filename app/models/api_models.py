@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import List
+from typing import Any, List
 
 @dataclass
 class Source:
@@ -13,6 +13,8 @@ class ExecutionStep:
     content: str
     start_time: str | None = None
     end_time: str | None = None
+    # Measured with a monotonic clock; start/end times are wall-clock for display
+    duration_ms: float | None = None
 
 @dataclass
 class ExecutionDiagnostics:
@@ -37,6 +39,8 @@ class ChatMessage:
 @dataclass
 class ChatRequest:
     messages: List[ChatMessage] = field(default_factory=list)
+    # When set, only new messages are sent and earlier turns are kept server-side
+    thread_id: str = None
 
 @dataclass
 class ChatThreadRequest:
@@ -61,4 +65,52 @@ class FileReference:
 class AgentCreateRequest:
     instructions: str
     name: str
-    model: str
\ No newline at end of file
+    model: str
+
+@dataclass
+class FileIndexRequest:
+    file: str
+    thread_id: str = None
+
+@dataclass
+class FileIndexJob:
+    job_id: str
+    file: str
+    status: str = "pending"
+    thread_id: str = None
+    file_id: str = None
+    vector_store_id: str = None
+    error: str = None
+
+@dataclass
+class BatchChatRequest:
+    requests: List[ChatThreadRequest] = field(default_factory=list)
+    priority: int = 0
+    tenant: str = "default"
+
+@dataclass
+class BatchWeatherRequest:
+    requests: List[ChatRequest] = field(default_factory=list)
+    priority: int = 0
+    tenant: str = "default"
+
+@dataclass
+class BatchItemResult:
+    index: int
+    result: RequestResult = None
+    error: str = None
+
+@dataclass
+class BatchJob:
+    job_id: str
+    kind: str
+    total: int
+    completed: int = 0
+    failed: int = 0
+    status: str = "running"
+
+@dataclass
+class StreamEvent:
+    """A single event of a streamed agent response."""
+    event: str
+    data: Any = None
@@ -1,24 +1,117 @@
+import asyncio
+import glob
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from string import Template
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+@dataclass
+class CachedFile:
+    content: str
+    mtime: float
+    version: str
 
 class FileService:
     """
-    FileService is a class that provides functionality to manage and read files 
-    using a mapping of file names to their full paths.
+    FileService is a registry of prompt files. Every *.txt file next to this
+    module is discovered at startup and kept in memory; watch() reloads files
+    whose modification time changes, so prompts can be edited without a restart.
     """
-    def __init__(self):
+    def __init__(self, directory: str = PROMPTS_DIRECTORY):
         # Initialize a dictionary to map file names to their full paths
+        self.directory = directory
         self.file_map = {}
-        self.add_file('WeatherSystemPrompt.txt', './app/prompts/WeatherSystemPrompt.txt') 
+        self._files: dict[str, CachedFile] = {}
+        self._rendered: dict[tuple, str] = {}
+        self.discover()
+
+    def discover(self) -> None:
+        for file_path in sorted(glob.glob(os.path.join(self.directory, "*.txt"))):
+            file_name = os.path.basename(file_path)
+            if file_name not in self.file_map:
+                self.add_file(file_name, file_path)
+
     def add_file(self, file_name, file_path):
         self.file_map[file_name] = file_path
+        self._load(file_name)
+
+    def _load(self, file_name) -> bool:
+        file_path = self.file_map[file_name]
+        try:
+            mtime = os.path.getmtime(file_path)
+            with open(file_path, 'r', encoding='utf-8') as file:
+                content = file.read()
+        except FileNotFoundError:
+            self._files.pop(file_name, None)
+            return False
+        self._files[file_name] = CachedFile(content=content, mtime=mtime, version=hashlib.sha256(content.encode()).hexdigest()[:12])
+        return True
+
+    def _get(self, file_name) -> CachedFile:
+        if file_name not in self.file_map:
+            raise RuntimeError(f"File '{file_name}' not found in the file map.")
+        cached = self._files.get(file_name)
+        if cached is None and not self._load(file_name):
+            raise RuntimeError( f"File '{file_name}' not found at path '{self.file_map[file_name]}'.")
+        return self._files[file_name]
 
     def read_file(self, file_name):
-        if file_name in self.file_map:
-            file_path = self.file_map[file_name]
+        return self._get(file_name).content
+
+    def version(self, file_name) -> str:
+        """
+        Returns a short content hash that changes whenever the file is reloaded with new content.
+        """
+        return self._get(file_name).version
+
+    def render(self, file_name, **variables) -> str:
+        """
+        Substitutes $name placeholders in a prompt. Rendered results are cached per
+        prompt version and variables; unknown placeholders are left untouched.
+        """
+        cached = self._get(file_name)
+        key = (file_name, cached.version, tuple(sorted(variables.items())))
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            rendered = self._rendered[key] = Template(cached.content).safe_substitute(variables)
+        return rendered
+
+    def reload_changed(self) -> list[str]:
+        """
+        Reloads files whose modification time changed and picks up new files.
+        Returns the names of the files that were reloaded.
+        """
+        self.discover()
+        reloaded = []
+        for file_name, file_path in self.file_map.items():
             try:
-                with open(file_path, 'r') as file:
-                    content = file.read()
-                return content
+                mtime = os.path.getmtime(file_path)
             except FileNotFoundError:
-                raise RuntimeError( f"File '{file_name}' not found at path '{file_path}'.")
-        else:
-            raise RuntimeError(f"File '{file_name}' not found in the file map.")
+                continue
+            cached = self._files.get(file_name)
+            if cached is None or cached.mtime != mtime:
+                if self._load(file_name):
+                    reloaded.append(file_name)
+        if reloaded:
+            self._rendered = {key: value for key, value in self._rendered.items() if key[0] not in reloaded}
+            logger.info("Reloaded prompt files: %s", ", ".join(reloaded))
+        return reloaded
+
+    async def watch(self, interval_seconds: float) -> None:
+        """
+        Polls the prompt files for changes; started from the FastAPI lifespan.
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await asyncio.to_thread(self.reload_changed)
+            except Exception as e:
+                logger.warning("Could not reload prompt files: %s", e)
+
+# Shared registry so prompts are read from disk once per process
+file_service = FileService()
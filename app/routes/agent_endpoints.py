@@ -1,40 +1,105 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from app.models.api_models import ChatRequest, ChatThreadRequest
-from app.services.weather_agent_service import WeatherAgentService
-from app.services.chat_agent_service import ChatAgentService
+from app.models.api_models import ChatRequest, ChatThreadRequest, FileIndexRequest
+from app.services.registry import get_chat_agent_service, get_weather_service
+from app.utils.sse import sse_response
 router = APIRouter()
 
 
-weather_service = WeatherAgentService()
-chat_agent_service = ChatAgentService()
-
 class WorkflowInput(BaseModel):
     data: str
 
 class Message(BaseModel):
     query: str
 
+async def require_thread(thread_id: str, weather_service) -> None:
+    # Thread ids are issued by the server; unknown ones are not started implicitly
+    if thread_id and not await weather_service.has_thread(thread_id):
+        raise HTTPException(status_code=404, detail=f"Thread '{thread_id}' not found.")
+
+@router.post("/weather/threads")
+async def create_weather_thread(weather_service=Depends(get_weather_service)):
+    """
+    POST endpoint for starting a /weather conversation. Returns the thread_id to send with each message.
+    """
+    thread_id = await weather_service.create_thread()
+    return {"result": {"thread_id": thread_id}}
+
 @router.post("/weather")
-async def run_weather_workflow(input_data: ChatRequest):
+async def run_weather_workflow(input_data: ChatRequest, weather_service=Depends(get_weather_service)):
     """
     POST endpoint for executing a weather workflow.
     """
+    await require_thread(input_data.thread_id, weather_service)
     result = await weather_service.run_weather(input_data)
     return {"result": result}
 
+@router.post("/weather/stream")
+async def run_weather_stream(input_data: ChatRequest, weather_service=Depends(get_weather_service)):
+    """
+    POST endpoint for streaming a weather workflow as Server-Sent Events.
+    """
+    await require_thread(input_data.thread_id, weather_service)
+    return sse_response(weather_service.stream_weather(input_data))
+
 @router.post("/agent/weather")
-async def run_weather_workflow(input_data: ChatThreadRequest):
+async def run_weather_workflow(input_data: ChatThreadRequest, weather_service=Depends(get_weather_service)):
     """
     POST endpoint for executing a weather workflow.
     """
+    await require_thread(input_data.thread_id, weather_service)
     result = await weather_service.run_weather_agent(input_data)
     return {"result": result}
 
+@router.post("/agent/weather/stream")
+async def run_weather_agent_stream(input_data: ChatThreadRequest, weather_service=Depends(get_weather_service)):
+    """
+    POST endpoint for streaming a weather agent run as Server-Sent Events.
+    """
+    await require_thread(input_data.thread_id, weather_service)
+    return sse_response(weather_service.stream_weather_agent(input_data))
+
 @router.post("/agent/chat")
-async def run_weather_workflow(input_data: ChatThreadRequest):
+async def run_weather_workflow(input_data: ChatThreadRequest, chat_agent_service=Depends(get_chat_agent_service)):
     """
     POST endpoint for executing a weather workflow.
     """
     result = await chat_agent_service.run_chat_sk(input_data)
-    return {"result": result}
\ No newline at end of file
+    return {"result": result}
+
+@router.post("/agent/chat/stream")
+async def run_chat_stream(input_data: ChatThreadRequest, chat_agent_service=Depends(get_chat_agent_service)):
+    """
+    POST endpoint for streaming a chat agent response as Server-Sent Events.
+    """
+    return sse_response(chat_agent_service.stream_chat_sk(input_data))
+
+@router.post("/agent/files")
+async def index_file(input_data: FileIndexRequest, chat_agent_service=Depends(get_chat_agent_service)):
+    """
+    POST endpoint for uploading and indexing a blob for a thread in the background.
+    Returns a job whose thread_id can be used for chat once its status is "ready".
+    """
+    try:
+        job = await chat_agent_service.start_file_indexing(input_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": job}
+
+@router.get("/agent/files/jobs/{job_id}")
+async def get_file_index_job(job_id: str, chat_agent_service=Depends(get_chat_agent_service)):
+    """
+    GET endpoint for polling a file indexing job.
+    """
+    job = await chat_agent_service.get_file_indexing_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return {"result": job}
+
+@router.post("/agent/cache/invalidate")
+async def invalidate_agent_cache(chat_agent_service=Depends(get_chat_agent_service)):
+    """
+    POST endpoint for dropping the cached agent definition after the agent is changed, in every worker.
+    """
+    await chat_agent_service.invalidate_agent_definition()
+    return {"result": "invalidated"}
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.models.api_models import BatchChatRequest, BatchWeatherRequest
+from app.services.registry import get_batch_service
+router = APIRouter()
+
+
+@router.post("/agent/chat/batch")
+async def run_chat_batch(input_data: BatchChatRequest, batch_service=Depends(get_batch_service)):
+    """
+    POST endpoint for running a batch of chat requests and returning all results.
+    """
+    try:
+        result = await batch_service.run_batch("chat", input_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": result}
+
+@router.post("/weather/batch")
+async def run_weather_batch(input_data: BatchWeatherRequest, batch_service=Depends(get_batch_service)):
+    """
+    POST endpoint for running a batch of weather requests and returning all results.
+    """
+    try:
+        result = await batch_service.run_batch("weather", input_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": result}
+
+@router.post("/agent/chat/batch/jobs")
+async def start_chat_batch_job(input_data: BatchChatRequest, batch_service=Depends(get_batch_service)):
+    """
+    POST endpoint for starting a background batch of chat requests.
+    """
+    try:
+        job = await batch_service.start_job("chat", input_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": job}
+
+@router.post("/weather/batch/jobs")
+async def start_weather_batch_job(input_data: BatchWeatherRequest, batch_service=Depends(get_batch_service)):
+    """
+    POST endpoint for starting a background batch of weather requests.
+    """
+    try:
+        job = await batch_service.start_job("weather", input_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": job}
+
+@router.get("/batch/jobs/{job_id}")
+async def get_batch_job(job_id: str, batch_service=Depends(get_batch_service)):
+    """
+    GET endpoint for the progress of a batch job.
+    """
+    job = await batch_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return {"result": job}
+
+@router.get("/batch/jobs/{job_id}/results")
+async def stream_batch_job_results(job_id: str, batch_service=Depends(get_batch_service)):
+    """
+    GET endpoint streaming a batch job's results as NDJSON, one line per finished request.
+    """
+    if await batch_service.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return StreamingResponse(batch_service.stream_job_results(job_id), media_type="application/x-ndjson")
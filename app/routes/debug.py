@@ -0,0 +1,30 @@
+import asyncio
+import threading
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.config.settings import settings
+from app.utils.diagnostics import ProfilerBusyError, profiler
+
+router = APIRouter()
+
+@router.get("/debug/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = 10, interval_ms: float = 10, all_threads: bool = False):
+    """
+    Samples the stacks of this worker for the given number of seconds and returns
+    them in the folded format (flamegraph.pl, speedscope). By default only the
+    event loop thread is sampled; all_threads includes the threadpool and SDK threads.
+    Only registered when DIAGNOSTICS_ENABLED is set.
+    """
+    if not 0 < seconds <= settings.DIAGNOSTICS_PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {settings.DIAGNOSTICS_PROFILE_MAX_SECONDS}.")
+    # An interval beyond the profile length would hold the profiler for that long
+    if not 1 <= interval_ms <= seconds * 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and seconds * 1000.")
+    # Route handlers run on the event loop thread
+    thread_ids = None if all_threads else {threading.get_ident()}
+    try:
+        return await asyncio.to_thread(profiler.profile, seconds, interval_ms, thread_ids)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
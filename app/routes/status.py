@@ -1,5 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 import logging
+from app.services.registry import services
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -8,3 +9,13 @@ logger = logging.getLogger(__name__)
 async def status():
     logger.info("Status Endpoint")
     return {"message": "Hello World"}
+
+@router.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 until the agent services have been built and warmed up.
+    /status only reports that the process is serving.
+    """
+    if not services.ready:
+        raise HTTPException(status_code=503, detail=services.error or "Starting")
+    return {"message": "Ready"}
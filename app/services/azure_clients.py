@@ -0,0 +1,124 @@
+import logging
+import os
+from typing import TYPE_CHECKING, Optional
+
+from app.config.settings import settings
+from app.utils.rate_limit import RateLimitPolicy, get_rate_limiter
+from app.utils.telemetry import stage
+
+# The SDKs are imported when a client is first created so that importing the
+# registry stays cheap for processes that never talk to the agent service
+if TYPE_CHECKING:
+    from azure.ai.projects import AIProjectClient
+    from azure.ai.projects.aio import AIProjectClient as AsyncAIProjectClient
+    from azure.identity import DefaultAzureCredential
+    from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+
+logger = logging.getLogger(__name__)
+
+AI_PROJECT_SCOPE = "https://ai.azure.com/.default"
+
+class TimedCredential:
+    """
+    Wraps an async credential so every token acquisition is traced and timed.
+    Clients cache tokens, so this only runs on first use and on refresh.
+    """
+    def __init__(self, credential: "AsyncDefaultAzureCredential"):
+        self._credential = credential
+
+    async def get_token(self, *scopes: str, **kwargs):
+        with stage("azure.credential.get_token"):
+            return await self._credential.get_token(*scopes, **kwargs)
+
+    async def get_token_info(self, *scopes: str, **kwargs):
+        with stage("azure.credential.get_token"):
+            return await self._credential.get_token_info(*scopes, **kwargs)
+
+    async def close(self) -> None:
+        await self._credential.close()
+
+    async def __aenter__(self):
+        await self._credential.__aenter__()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self._credential.__aexit__(*args)
+
+class AzureClientRegistry:
+    """
+    Holds the process-wide Azure credentials and AI project clients so that
+    credential discovery, token acquisition and TLS handshakes happen once per
+    process instead of once per request. Credentials cache their tokens and
+    refresh them before expiry.
+    """
+    def __init__(self):
+        self._credential: Optional[TimedCredential] = None
+        self._agent_client: Optional["AsyncAIProjectClient"] = None
+        self._sync_credential: Optional["DefaultAzureCredential"] = None
+        self._project_client: Optional["AIProjectClient"] = None
+
+    @property
+    def credential(self) -> TimedCredential:
+        if self._credential is None:
+            from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+            self._credential = TimedCredential(AsyncDefaultAzureCredential())
+        return self._credential
+
+    @property
+    def agent_client(self) -> "AsyncAIProjectClient":
+        """
+        The async AI project client used by Semantic Kernel's AzureAIAgent.
+        """
+        if self._agent_client is None:
+            from semantic_kernel.agents import AzureAIAgent
+            self._agent_client = AzureAIAgent.create_client(
+                credential=self.credential,
+                per_retry_policies=[RateLimitPolicy(get_rate_limiter("azure-ai-agents"))],
+                retry_total=settings.RATE_LIMIT_MAX_RETRIES,
+                retry_backoff_factor=settings.RATE_LIMIT_BACKOFF_SECONDS)
+        return self._agent_client
+
+    @property
+    def sync_credential(self) -> "DefaultAzureCredential":
+        if self._sync_credential is None:
+            from azure.identity import DefaultAzureCredential
+            self._sync_credential = DefaultAzureCredential()
+        return self._sync_credential
+
+    @property
+    def project_client(self) -> "AIProjectClient":
+        """
+        The synchronous AI project client used for file and vector store operations.
+        """
+        if self._project_client is None:
+            from azure.ai.projects import AIProjectClient
+            self._project_client = AIProjectClient(credential=self.sync_credential, endpoint=os.environ["AZURE_AI_AGENT_ENDPOINT"])
+        return self._project_client
+
+    async def start(self) -> None:
+        """
+        Creates the clients and acquires a first token so the first request does not pay for it.
+        """
+        if not os.getenv("AZURE_AI_AGENT_ENDPOINT"):
+            return
+        try:
+            self.agent_client
+            await self.credential.get_token(AI_PROJECT_SCOPE)
+        except Exception as e:
+            logger.warning("Could not warm up Azure credentials: %s", e)
+
+    async def close(self) -> None:
+        if self._agent_client is not None:
+            await self._agent_client.close()
+            self._agent_client = None
+        if self._credential is not None:
+            await self._credential.close()
+            self._credential = None
+        if self._project_client is not None:
+            self._project_client.close()
+            self._project_client = None
+        if self._sync_credential is not None:
+            self._sync_credential.close()
+            self._sync_credential = None
+
+azure_clients = AzureClientRegistry()
@@ -0,0 +1,84 @@
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+@dataclass
+class WorkItem:
+    run: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+
+@dataclass
+class PriorityLevel:
+    # Per-tenant queues in round-robin order
+    tenants: OrderedDict = field(default_factory=OrderedDict)
+
+class BatchScheduler:
+    """
+    Runs submitted work with bounded concurrency. Lower priority values run first;
+    within a priority level tenants are served round-robin so one large batch
+    cannot starve the others. Upstream RPM/TPM limits are enforced per call by the
+    shared rate limiters in app.utils.rate_limit.
+    """
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._levels: dict[int, PriorityLevel] = {}
+        self._available = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for level in self._levels.values() for queue in level.tenants.values())
+
+    def submit(self, run: Callable[[], Awaitable[Any]], priority: int = 0, tenant: str = "default") -> asyncio.Future:
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        level = self._levels.setdefault(priority, PriorityLevel())
+        level.tenants.setdefault(tenant, deque()).append(WorkItem(run=run, future=future))
+        self._available.set()
+        return future
+
+    def _next(self) -> Optional[WorkItem]:
+        if not self._levels:
+            return None
+        priority = min(self._levels)
+        level = self._levels[priority]
+        tenant, queue = next(iter(level.tenants.items()))
+        item = queue.popleft()
+        # Rotate the tenant to the back of its level, dropping drained queues
+        del level.tenants[tenant]
+        if queue:
+            level.tenants[tenant] = queue
+        if not level.tenants:
+            del self._levels[priority]
+        return item
+
+    async def _worker(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                self._available.clear()
+                await self._available.wait()
+                continue
+            if item.future.cancelled():
+                continue
+            try:
+                result = await item.run()
+                if not item.future.done():
+                    item.future.set_result(result)
+            except asyncio.CancelledError:
+                item.future.cancel()
+                raise
+            except Exception as e:
+                if not item.future.done():
+                    item.future.set_exception(e)
+
+    def _ensure_workers(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import AsyncIterator, Awaitable, Optional
+
+from app.config.settings import settings
+from app.models.api_models import BatchChatRequest, BatchWeatherRequest, BatchItemResult, BatchJob, ChatRequest, ChatThreadRequest
+from app.services.batch_scheduler import BatchScheduler
+from app.services.chat_agent_service import ChatAgentService
+from app.services.job_store import get_job_backend
+from app.services.weather_agent_service import WeatherAgentService
+
+logger = logging.getLogger(__name__)
+
+# Kind of the batch jobs in the shared job store
+JOB_KIND = "batch"
+# How often a worker checks the shared job store for results of a job running in another worker
+JOB_POLL_INTERVAL_SECONDS = 0.5
+
+def result_line(item: BatchItemResult) -> str:
+    return json.dumps(asdict(item), default=str) + "\n"
+
+class BatchJobState:
+    def __init__(self, job: BatchJob):
+        self.job = job
+        self.results: list[BatchItemResult] = []
+        self.updated = asyncio.Condition()
+
+class BatchService:
+    """
+    Runs batches of chat and weather requests through a shared scheduler, either
+    waiting for the whole batch or as a background job whose results are streamed
+    as NDJSON in completion order.
+    """
+    def __init__(self, weather_service: WeatherAgentService, chat_agent_service: ChatAgentService):
+        self.weather_service = weather_service
+        self.chat_agent_service = chat_agent_service
+        self.scheduler = BatchScheduler(settings.BATCH_MAX_CONCURRENCY)
+        # Jobs run by this worker; with several workers they are also shared through the job store
+        self.jobs: OrderedDict[str, BatchJobState] = OrderedDict()
+        self.job_backend = get_job_backend()
+        self._background_tasks: set[asyncio.Task] = set()
+
+    def _submit_chat(self, request: ChatThreadRequest, priority: int, tenant: str) -> asyncio.Future:
+        return self.scheduler.submit(lambda: self.chat_agent_service.run_chat_sk(request), priority=priority, tenant=tenant)
+
+    def _submit_weather(self, request: ChatRequest, priority: int, tenant: str) -> asyncio.Future:
+        return self.scheduler.submit(lambda: self.weather_service.run_weather(request), priority=priority, tenant=tenant)
+
+    def _submit(self, kind: str, batch: BatchChatRequest | BatchWeatherRequest) -> list[asyncio.Future]:
+        if not batch.requests:
+            raise ValueError("No requests found in batch.")
+        if len(batch.requests) > settings.BATCH_MAX_ITEMS:
+            raise ValueError(f"Batch exceeds the limit of {settings.BATCH_MAX_ITEMS} requests.")
+        submit = self._submit_chat if kind == "chat" else self._submit_weather
+        return [submit(request, batch.priority, batch.tenant) for request in batch.requests]
+
+    @staticmethod
+    async def _result(index: int, future: Awaitable) -> BatchItemResult:
+        try:
+            return BatchItemResult(index=index, result=await future)
+        except Exception as e:
+            return BatchItemResult(index=index, error=str(e))
+
+    async def run_batch(self, kind: str, batch: BatchChatRequest | BatchWeatherRequest) -> list[BatchItemResult]:
+        futures = self._submit(kind, batch)
+        try:
+            return list(await asyncio.gather(*(self._result(index, future) for index, future in enumerate(futures))))
+        finally:
+            # Drop queued work if the caller went away
+            for future in futures:
+                future.cancel()
+
+    async def start_job(self, kind: str, batch: BatchChatRequest | BatchWeatherRequest) -> BatchJob:
+        futures = self._submit(kind, batch)
+        state = BatchJobState(BatchJob(job_id=str(uuid.uuid4()), kind=kind, total=len(futures)))
+        self.jobs[state.job.job_id] = state
+        while len(self.jobs) > settings.BATCH_MAX_JOBS:
+            _, dropped = self.jobs.popitem(last=False)
+            for task in self._background_tasks:
+                if task.get_name() == dropped.job.job_id:
+                    task.cancel()
+        if self.job_backend is not None:
+            # Stored before the job is returned, so any worker can answer the first poll
+            try:
+                await asyncio.to_thread(self.job_backend.create, JOB_KIND, state.job.job_id, json.dumps(asdict(state.job)), settings.BATCH_MAX_JOBS)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                del self.jobs[state.job.job_id]
+                raise
+
+        task = asyncio.create_task(self._run_job(state, futures), name=state.job.job_id)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return state.job
+
+    async def _run_job(self, state: BatchJobState, futures: list[asyncio.Future]) -> None:
+        try:
+            for completed in asyncio.as_completed([self._result(index, future) for index, future in enumerate(futures)]):
+                item = await completed
+                async with state.updated:
+                    state.results.append(item)
+                    state.job.completed += 1
+                    if item.error:
+                        state.job.failed += 1
+                    state.updated.notify_all()
+                await self._store_progress(state, item)
+            state.job.status = "completed"
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            state.job.status = "cancelled"
+            raise
+        finally:
+            async with state.updated:
+                state.updated.notify_all()
+            await asyncio.shield(self._store_progress(state))
+
+    async def _store_progress(self, state: BatchJobState, item: Optional[BatchItemResult] = None) -> None:
+        """
+        Copies a finished item and the job's counters to the shared job store.
+        """
+        if self.job_backend is None:
+            return
+        try:
+            if item is not None:
+                await asyncio.to_thread(self.job_backend.add_result, state.job.job_id, len(state.results) - 1, result_line(item))
+            await asyncio.to_thread(self.job_backend.update, JOB_KIND, state.job.job_id, json.dumps(asdict(state.job)))
+        except Exception as e:
+            logger.warning("Could not store the progress of batch job %s: %s", state.job.job_id, e)
+
+    async def get_job(self, job_id: str) -> Optional[BatchJob]:
+        state = self.jobs.get(job_id)
+        if state is not None:
+            return state.job
+        if self.job_backend is None:
+            return None
+        # Started by another worker
+        stored = await asyncio.to_thread(self.job_backend.get, JOB_KIND, job_id)
+        return BatchJob(**json.loads(stored)) if stored else None
+
+    async def stream_job_results(self, job_id: str) -> AsyncIterator[str]:
+        """
+        Yields one JSON line per finished item, waiting for new results until the job ends.
+        """
+        state = self.jobs.get(job_id)
+        if state is None:
+            async for line in self._poll_job_results(job_id):
+                yield line
+            return
+
+        sent = 0
+        while True:
+            async with state.updated:
+                await state.updated.wait_for(lambda: len(state.results) > sent or state.job.status != "running")
+                pending = state.results[sent:]
+            for item in pending:
+                yield result_line(item)
+            sent += len(pending)
+            if state.job.status != "running" and sent >= len(state.results):
+                return
+
+    async def _poll_job_results(self, job_id: str) -> AsyncIterator[str]:
+        """
+        Follows a job running in another worker through the shared job store.
+        """
+        sent = 0
+        while True:
+            job = await self.get_job(job_id)
+            lines = await asyncio.to_thread(self.job_backend.results, job_id, sent)
+            for line in lines:
+                yield line
+            sent += len(lines)
+            # The job is read before its results, so results stored just before it ended are included
+            if job is None or job.status != "running":
+                return
+            if not lines:
+                await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+    async def close(self) -> None:
+        for task in list(self._background_tasks):
+            task.cancel()
+        await self.scheduler.close()
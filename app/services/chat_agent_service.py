@@ -1,20 +1,36 @@
 import os
+import json
 import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import AsyncIterator, Optional
 from dotenv import load_dotenv
 from opentelemetry import trace
-from azure.ai.projects import AIProjectClient
-from app.models.api_models import ChatThreadRequest, RequestResult, Source, FileReference
-
-from azure.storage.blob import BlobServiceClient
+from app.models.api_models import ChatThreadRequest, RequestResult, Source, FileReference, StreamEvent, FileIndexRequest, FileIndexJob
 
 from semantic_kernel.contents import ChatMessageContent, FunctionCallContent, StreamingChatMessageContent, StreamingAnnotationContent, StreamingFileReferenceContent, ImageContent, FileReferenceContent
 from semantic_kernel.agents import AzureAIAgent, AzureAIAgentThread
 
-from azure.identity.aio import DefaultAzureCredential
-from azure.ai.agents.models import FileSearchTool, FileSearchTool
-from azure.identity import DefaultAzureCredential
+from azure.ai.agents.models import FileSearchTool
+
+from app.services.azure_clients import azure_clients
+from app.config.settings import settings
+from app.utils.cache import AsyncTTLCache
+from app.utils.cache_backend import get_cache_backend
+from app.utils.telemetry import AgentRunMetrics, stage
+
+from app.utils.file_utils import get_or_upload_file, create_chat_message_content
+from app.services.file_index import IndexedFile, get_file_index
+from app.services.job_store import get_job_backend
 
-from app.utils.file_utils import download_and_process_file, create_chat_message_content
+logger = logging.getLogger(__name__)
+
+# Kind of the file indexing jobs in the shared job store
+FILE_JOB_KIND = "file_index"
+# Shared generation of the agent definition caches, incremented to invalidate them in every worker
+AGENT_DEFINITIONS_GENERATION = "agent.definitions"
 
 class ChatAgentService:
     def __init__(self):
@@ -25,10 +41,214 @@ class ChatAgentService:
         blob_connection_string = os.getenv("AZURE_BLOB_CONNECTION_STRING")
         self.blob_service_client = None
         if blob_connection_string:
+            # The blob SDK is only loaded when storage is configured
+            from azure.storage.blob import BlobServiceClient
             self.blob_service_client = BlobServiceClient.from_connection_string(blob_connection_string)
-        pass
 
-    async def run_chat_sk(self, request: ChatThreadRequest) -> str:
+        # Agent definitions rarely change; stale entries are refreshed in the background
+        self.agent_definitions = AsyncTTLCache(
+            "agent.definitions",
+            max_size=16,
+            ttl_seconds=settings.AGENT_DEFINITION_CACHE_TTL_SECONDS,
+            stale_seconds=settings.AGENT_DEFINITION_CACHE_STALE_SECONDS)
+        self.cache_backend = get_cache_backend()
+        self._definitions_generation = 0
+
+        # Background file indexing jobs run by this worker, oldest dropped first; with
+        # several workers they are also shared through the job store
+        self.file_jobs: OrderedDict[str, FileIndexJob] = OrderedDict()
+        self.job_backend = get_job_backend()
+        self._background_tasks: set[asyncio.Task] = set()
+
+    async def get_agent_definition(self):
+        if self.cache_backend is not None:
+            # Another worker may have invalidated the definitions since they were cached here
+            generation = await asyncio.to_thread(self.cache_backend.generation, AGENT_DEFINITIONS_GENERATION)
+            if generation != self._definitions_generation:
+                self.agent_definitions.clear()
+                self._definitions_generation = generation
+
+        async def load_definition():
+            with stage("agent.load_definition", agent="chat"):
+                return await azure_clients.agent_client.agents.get_agent(agent_id=self.agent_id), None
+        return await self.agent_definitions.get_or_load(self.agent_id, load_definition)
+
+    async def invalidate_agent_definition(self) -> None:
+        """
+        Drops the cached agent definitions of this worker and, through the shared
+        generation, of every other worker before its next chat request.
+        """
+        self.agent_definitions.clear()
+        if self.cache_backend is not None:
+            self._definitions_generation = await asyncio.to_thread(self.cache_backend.increment_generation, AGENT_DEFINITIONS_GENERATION)
+
+    async def warm_up(self) -> None:
+        """
+        Loads the agent definition at startup so the first chat request does not pay for it.
+        """
+        if not self.agent_id:
+            return
+        try:
+            await self.get_agent_definition()
+        except Exception as e:
+            logger.warning("Could not load agent definition '%s' at startup: %s", self.agent_id, e)
+
+    async def attach_file_to_thread(self, indexed_file: IndexedFile, thread_id: Optional[str]) -> tuple[str, str]:
+        """
+        Makes an uploaded file searchable from a thread, creating the thread when no
+        ID is given, and returns the thread ID and the vector store it searches.
+
+        A thread can search only one vector store. Its first file is searched through
+        that file's own store, which other threads may share and which never gets
+        files added to it. A second file moves the thread onto a store of its own
+        holding all of its files; later files are added to that store.
+        """
+        agents_client = azure_clients.agent_client.agents
+        file_index = get_file_index()
+        vector_store_ids: list[str] = []
+        if thread_id:
+            try:
+                thread_details = await agents_client.threads.get(thread_id)
+                if (hasattr(thread_details, 'tool_resources') and 
+                    thread_details.tool_resources and
+                    hasattr(thread_details.tool_resources, 'file_search') and
+                    thread_details.tool_resources.file_search and
+                    hasattr(thread_details.tool_resources.file_search, 'vector_store_ids')):
+                    vector_store_ids = list(thread_details.tool_resources.file_search.vector_store_ids or [])
+                    logger.debug("Found vector stores %s on thread %s", vector_store_ids, thread_id)
+            except Exception as e:
+                logger.warning("Could not get details of thread %s: %s", thread_id, e)
+
+        if not vector_store_ids:
+            vector_store_id = await self._get_or_create_vector_store(indexed_file)
+            file_search_tool = FileSearchTool(vector_store_ids=[vector_store_id])
+            if not thread_id:
+                # Create thread with the file search tool resources
+                with stage("agent.create_thread", agent="chat"):
+                    thread_id = (await agents_client.threads.create(tool_resources=file_search_tool.resources)).id
+                logger.info("Created thread %s with vector store %s", thread_id, vector_store_id)
+            else:
+                await agents_client.threads.update(thread_id=thread_id, tool_resources=file_search_tool.resources)
+                logger.info("Updated thread %s with vector store %s", thread_id, vector_store_id)
+        elif indexed_file.vector_store_id in vector_store_ids:
+            vector_store_id = indexed_file.vector_store_id
+            logger.info("Thread %s already searches vector store %s", thread_id, vector_store_id)
+        else:
+            # Without an index no store is shared, so the thread's store is its own
+            owned = await asyncio.to_thread(file_index.thread_vector_store, thread_id) if file_index else vector_store_ids[0]
+            if owned in vector_store_ids:
+                vector_store_id = owned
+                with stage("vector_store.add_file"):
+                    await agents_client.vector_store_files.create_and_poll(vector_store_id=vector_store_id, file_id=indexed_file.file_id)
+                logger.info("Added file %s to vector store %s of thread %s", indexed_file.file_id, vector_store_id, thread_id)
+            else:
+                # Copy the files of the shared store into a store owned by the thread
+                file_ids = [file.id for store_id in vector_store_ids async for file in agents_client.vector_store_files.list(vector_store_id=store_id)]
+                with stage("vector_store.create"):
+                    vector_store = await agents_client.vector_stores.create_and_poll(file_ids=file_ids + [indexed_file.file_id], name=f"rutzsco_paif_vs_{uuid.uuid4()}")
+                vector_store_id = vector_store.id
+                file_search_tool = FileSearchTool(vector_store_ids=[vector_store_id])
+                await agents_client.threads.update(thread_id=thread_id, tool_resources=file_search_tool.resources)
+                logger.info("Moved thread %s onto its own vector store %s", thread_id, vector_store_id)
+                if file_index:
+                    await asyncio.to_thread(file_index.record_thread_vector_store, thread_id, vector_store_id)
+                    for file_id in file_ids:
+                        await asyncio.to_thread(file_index.add_thread_ref, thread_id, file_id)
+
+        if file_index:
+            await asyncio.to_thread(file_index.add_thread_ref, thread_id, indexed_file.file_id)
+        return thread_id, vector_store_id
+
+    async def _get_or_create_vector_store(self, indexed_file: IndexedFile) -> str:
+        """
+        Returns the vector store indexing only this file, creating it on first use.
+        """
+        if indexed_file.vector_store_id:
+            logger.info("Reusing vector store %s for file %s", indexed_file.vector_store_id, indexed_file.file_id)
+            return indexed_file.vector_store_id
+
+        with stage("vector_store.create"):
+            vector_store = await azure_clients.agent_client.agents.vector_stores.create_and_poll(file_ids=[indexed_file.file_id], name=f"rutzsco_paif_vs_{uuid.uuid4()}")
+        logger.info("Created vector store %s for file %s", vector_store.id, indexed_file.file_id)
+
+        file_index = get_file_index()
+        if file_index:
+            await asyncio.to_thread(file_index.record_vector_store, indexed_file, vector_store.id)
+        return vector_store.id
+
+    async def start_file_indexing(self, request: FileIndexRequest) -> FileIndexJob:
+        """
+        Starts uploading and indexing a blob for a thread in the background and
+        returns a job the client can poll until the file is searchable.
+        """
+        if not request.file:
+            raise ValueError("No file found in request.")
+        if not self.blob_service_client:
+            raise ValueError("Blob storage is not configured.")
+
+        job = FileIndexJob(job_id=str(uuid.uuid4()), file=request.file, thread_id=request.thread_id)
+        self.file_jobs[job.job_id] = job
+        while len(self.file_jobs) > settings.FILE_INDEX_MAX_JOBS:
+            self.file_jobs.popitem(last=False)
+        if self.job_backend is not None:
+            # Stored before the job is returned, so any worker can answer the first poll
+            await asyncio.to_thread(self.job_backend.create, FILE_JOB_KIND, job.job_id, json.dumps(asdict(job)), settings.FILE_INDEX_MAX_JOBS)
+
+        task = asyncio.create_task(self._run_file_indexing(job))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return job
+
+    async def get_file_indexing_job(self, job_id: str) -> Optional[FileIndexJob]:
+        job = self.file_jobs.get(job_id)
+        if job is not None or self.job_backend is None:
+            return job
+        # Started by another worker
+        stored = await asyncio.to_thread(self.job_backend.get, FILE_JOB_KIND, job_id)
+        return FileIndexJob(**json.loads(stored)) if stored else None
+
+    async def _set_file_job_status(self, job: FileIndexJob, status: str) -> None:
+        job.status = status
+        if self.job_backend is None:
+            return
+        try:
+            await asyncio.to_thread(self.job_backend.update, FILE_JOB_KIND, job.job_id, json.dumps(asdict(job)))
+        except Exception as e:
+            logger.warning("Could not store the status of file indexing job %s: %s", job.job_id, e)
+
+    async def _run_file_indexing(self, job: FileIndexJob) -> None:
+        try:
+            if not job.thread_id:
+                # Create the thread up front so the client learns its ID while indexing runs
+                job.thread_id = (await azure_clients.agent_client.agents.threads.create()).id
+
+            await self._set_file_job_status(job, "uploading")
+            indexed_file = await get_or_upload_file(self.blob_service_client, job.file)
+            if indexed_file is None:
+                raise RuntimeError(f"File '{job.file}' could not be uploaded.")
+            job.file_id = indexed_file.file_id
+
+            await self._set_file_job_status(job, "indexing")
+            _, job.vector_store_id = await self.attach_file_to_thread(indexed_file, job.thread_id)
+            await self._set_file_job_status(job, "ready")
+        except Exception as e:
+            logger.exception("Error indexing file '%s': %s", job.file, e)
+            job.error = str(e)
+            await self._set_file_job_status(job, "failed")
+
+    async def run_chat_sk(self, request: ChatThreadRequest) -> RequestResult:
+        request_result = None
+        async for event in self.stream_chat_sk(request):
+            if event.event == "done":
+                request_result = event.data
+        return request_result
+
+    async def stream_chat_sk(self, request: ChatThreadRequest) -> AsyncIterator[StreamEvent]:
+        """
+        Runs the chat agent and yields text deltas, sources, file references, code
+        output and function call steps as they arrive, followed by a final "done"
+        event carrying the complete RequestResult.
+        """
         tracer = trace.get_tracer(__name__)
         with tracer.start_as_current_span("Agent: Chat") as current_span:
             # Validate the request object
@@ -37,138 +257,103 @@ class ChatAgentService:
             user_message = request.message
 
             # Check if a file was specified in the request
-            file_content = None
-            ai_project_file = None
+            indexed_file = None
             if request.file and self.blob_service_client:
-                file_content, ai_project_file = await download_and_process_file(self.blob_service_client, request.file)
+                indexed_file = await get_or_upload_file(self.blob_service_client, request.file)
 
             # Define a list to hold callback message content
             intermediate_steps: list[str] = []
+            pending_steps: list[str] = []
+            metrics = AgentRunMetrics("chat")
             async def handle_intermediate_steps(message: ChatMessageContent) -> None:
-                print("handle_intermediate_steps")
+                metrics.add_usage(message.metadata)
                 if any(isinstance(item, FunctionCallContent) for item in message.items):
                     for fcc in message.items:
                         if isinstance(fcc, FunctionCallContent):
-                            intermediate_steps.append(f"Function Call: {fcc.name} with arguments: {fcc.arguments}")
+                            step = f"Function Call: {fcc.name} with arguments: {fcc.arguments}"
+                            intermediate_steps.append(step)
+                            pending_steps.append(step)
                         else:
-                            print(f"{message.role}: {message.content}")
+                            logger.debug("%s: %s", message.role, message.content)
                 else:
-                    print(f"{message.role}: {message.content}")
+                    logger.debug("%s: %s", message.role, message.content)
 
-            creds = DefaultAzureCredential()
-            async with (AzureAIAgent.create_client(credential=creds) as client,):
-                  # Create an agent on the Azure AI agent service. Create a Semantic Kernel agent for the Azure AI agent
-                agent_definition = await client.agents.get_agent(agent_id=self.agent_id)
+            client = azure_clients.agent_client
+            # Create an agent on the Azure AI agent service. Create a Semantic Kernel agent for the Azure AI agent
+            with stage("agent.get_agent", agent="chat"):
+                agent_definition = await self.get_agent_definition()
                 agent = AzureAIAgent(client=client, definition=agent_definition)
-                thread: AzureAIAgentThread  = None
-                if request.thread_id:
-                    thread = AzureAIAgentThread(client=client, thread_id=request.thread_id)               
-                if ai_project_file:
-                    try:
-                        project_client = AIProjectClient(credential=DefaultAzureCredential(), endpoint=os.environ["AZURE_AI_AGENT_ENDPOINT"])
-                        with project_client:
-                            # Check if we need to create a thread with vector store functionality
-                            thread_id = request.thread_id
-                            if not thread and not request.thread_id:
-                                # Create a vector store first
-                                print(f"Creating new vector store with file ID: {ai_project_file.id}")
-                                vector_store = project_client.agents.vector_stores.create_and_poll(file_ids=[ai_project_file.id], name=f"rutzsco_paif_vs_{uuid.uuid4()}")
-                                print(f"Created vector store with ID: {vector_store.id}")
-                                
-                                # Create file search tool with the vector store
-                                file_search_tool = FileSearchTool(vector_store_ids=[vector_store.id])
-                                
-                                # Create thread with the file search tool resources
-                                print("Creating new thread with vector store attachment")
-                                thread_response = project_client.agents.threads.create(tool_resources=file_search_tool.resources)
-                                thread_id = thread_response.id
-                                thread = AzureAIAgentThread(client=client, thread_id=thread_id)
-                                print(f"Created new thread with ID: {thread_id} and vector store {vector_store.id}")
-                            elif thread_id:
-                                # Check if the existing thread already has a vector store
-                                vector_store_id = None
-                                try:
-                                    thread_details = project_client.agents.threads.get(thread_id)
-                                    if (hasattr(thread_details, 'tool_resources') and 
-                                        thread_details.tool_resources and
-                                        hasattr(thread_details.tool_resources, 'file_search') and
-                                        thread_details.tool_resources.file_search and
-                                        hasattr(thread_details.tool_resources.file_search, 'vector_store_ids')):
-                                        vector_store_ids = thread_details.tool_resources.file_search.vector_store_ids
-                                        if vector_store_ids:
-                                            vector_store_id = vector_store_ids[0]
-                                            print(f"Found existing vector store ID: {vector_store_id}")
-                                except Exception as e:
-                                    print(f"Could not get thread details: {e}")
-                                
-                                if vector_store_id:
-                                    # Add the file to the existing vector store
-                                    print(f"Adding file {ai_project_file.id} to existing vector store {vector_store_id}")
-                                    project_client.agents.vector_store_files.create_and_poll(vector_store_id=vector_store_id, file_id=ai_project_file.id)
-                                    print(f"Added file to existing vector store {vector_store_id}")
-                                else:
-                                    # Create a new vector store and update the thread
-                                    print(f"Creating new vector store with file ID: {ai_project_file.id}")
-                                    vector_store = project_client.agents.vector_stores.create_and_poll(file_ids=[ai_project_file.id], name=f"rutzsco_paif_vs_{uuid.uuid4()}")
-                                    print(f"Created vector store with ID: {vector_store.id}")
-                                    
-                                    # Update the existing thread with file search tool resources
-                                    file_search_tool = FileSearchTool(vector_store_ids=[vector_store.id])
-                                    project_client.agents.threads.update(thread_id=thread_id, tool_resources=file_search_tool.resources)
-                                    print(f"Updated thread {thread_id} with vector store {vector_store.id}")
-                            
-                    except Exception as e:
-                        print(f"Error setting up vector store: {e}")
-
-                annotations: list[StreamingAnnotationContent] = []
-                files: list[StreamingFileReferenceContent] = []
-                sources = []
-                file_references = []
-                responseContent = ''
-                code_output_content = ''
+            thread: AzureAIAgentThread  = None
+            if request.thread_id:
+                thread = AzureAIAgentThread(client=client, thread_id=request.thread_id)               
+                # Keeps the files the thread searches from being cleaned up while it is in use
+                file_index = get_file_index()
+                if file_index:
+                    await asyncio.to_thread(file_index.touch_thread, request.thread_id)
+            if indexed_file:
                 try:
-                    # Create the appropriate ChatMessageContent based on whether we have a file
-                    cmc = create_chat_message_content(
-                        user_message=user_message, 
-                        #file_content=file_content, 
-                        #file_name=request.file, 
-                        #ai_project_file=ai_project_file
-                    )
-                    
-                    async for result in agent.invoke_stream(messages=cmc, thread=thread, on_intermediate_message=handle_intermediate_steps):
-                        response = result
-                        
-                        annotations.extend([item for item in result.items if isinstance(item, StreamingAnnotationContent)])
-                        files.extend([item for item in result.items if isinstance(item, StreamingFileReferenceContent)])
-                        if isinstance(result.message, StreamingChatMessageContent):
-                            responseContent += result.message.content
-                        else:
-                            print(f"{result}")
-
-                        # Check for code in metadata
-                        if hasattr(result, 'metadata') and result.metadata and result.metadata.get("code") is True:
-                            if isinstance(result.message, StreamingChatMessageContent) and result.message.content:
-                                code_output_content += result.message.content
-
-                        thread = response.thread
-                    
-                    # Extract annotations from the ChatMessageContent response
-                    for item in annotations:
-                        source = Source(
-                            quote=item.quote if hasattr(item, 'quote') else '',
-                            title=item.title if hasattr(item, 'title') else '',
-                            url=item.url if hasattr(item, 'url') else '',
-                            start_index=item.start_index if hasattr(item, 'start_index') else '',
-                            end_index=item.end_index if hasattr(item, 'end_index') else ''
-                        )
-                        sources.append(source)
-
-                    for item in files:
-                        fr = FileReference(id=item.file_id if hasattr(item, 'file_id') else '')
-                        file_references.append(fr)
+                    thread_id, _ = await self.attach_file_to_thread(indexed_file, request.thread_id)
+                    thread = AzureAIAgentThread(client=client, thread_id=thread_id)
+                except Exception as e:
+                    logger.exception("Error setting up vector store: %s", e)
+
+            sources = []
+            file_references = []
+            responseContent = ''
+            code_output_content = ''
+            try:
+                # Create the appropriate ChatMessageContent based on whether we have a file
+                cmc = create_chat_message_content(
+                    user_message=user_message, 
+                    #file_name=request.file, 
+                )
                 
-                finally:
-                    print("Completed agent invocation")  
+                async for result in agent.invoke_stream(messages=cmc, thread=thread, on_intermediate_message=handle_intermediate_steps):
+                    response = result
+                    thread = response.thread
+                    metrics.add_usage(result.message.metadata)
+
+                    # Forward function call steps reported by the intermediate message callback
+                    for step in pending_steps:
+                        yield StreamEvent(event="step", data=step)
+                    pending_steps.clear()
+
+                    for item in result.items:
+                        if isinstance(item, StreamingAnnotationContent):
+                            source = Source(
+                                quote=item.quote if hasattr(item, 'quote') else '',
+                                title=item.title if hasattr(item, 'title') else '',
+                                url=item.url if hasattr(item, 'url') else '',
+                                start_index=item.start_index if hasattr(item, 'start_index') else '',
+                                end_index=item.end_index if hasattr(item, 'end_index') else ''
+                            )
+                            sources.append(source)
+                            yield StreamEvent(event="source", data=source)
+                        elif isinstance(item, StreamingFileReferenceContent):
+                            fr = FileReference(id=item.file_id if hasattr(item, 'file_id') else '')
+                            file_references.append(fr)
+                            yield StreamEvent(event="file", data=fr)
+
+                    if not isinstance(result.message, StreamingChatMessageContent):
+                        logger.debug("Non-streaming agent message: %s", result)
+                        continue
+                    if not result.message.content:
+                        continue
+                    metrics.token()
+                    responseContent += result.message.content
+
+                    # Check for code in metadata
+                    if hasattr(result, 'metadata') and result.metadata and result.metadata.get("code") is True:
+                        code_output_content += result.message.content
+                        yield StreamEvent(event="code", data=result.message.content)
+                    else:
+                        yield StreamEvent(event="delta", data=result.message.content)
+
+                for step in pending_steps:
+                    yield StreamEvent(event="step", data=step)
+            
+            finally:
+                metrics.finish()
 
             request_result = RequestResult(
                 content=responseContent,
@@ -179,4 +364,4 @@ class ChatAgentService:
                 code_content=code_output_content.strip() # Add code_output_content to RequestResult
             )
 
-            return request_result
\ No newline at end of file
+            yield StreamEvent(event="done", data=request_result)
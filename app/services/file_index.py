@@ -0,0 +1,181 @@
+import sqlite3
+import time
+from dataclasses import dataclass
+from functools import cache
+from typing import Optional
+
+from app.config.settings import settings
+from app.utils.cache_backend import SqliteStore
+
+@dataclass
+class IndexedFile:
+    blob_name: str
+    etag: str
+    content_md5: Optional[str]
+    file_id: str
+    vector_store_id: Optional[str] = None
+
+class FileIndex(SqliteStore):
+    """
+    A persistent map from blob name + ETag (or content MD5) to the AI project file
+    and vector store created for it, with thread references used to find orphans.
+
+    A thread searches one vector store: the store of its only file, or a store it
+    owns once it has several. Each thread holds a reference to every file in its
+    store. A reference stays live while its thread keeps being used; a file is
+    only an orphan once no live reference to it remains.
+
+    The methods block on SQLite; call them through asyncio.to_thread.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        blob_name TEXT NOT NULL,
+        etag TEXT NOT NULL,
+        content_md5 TEXT,
+        file_id TEXT NOT NULL,
+        vector_store_id TEXT,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL,
+        PRIMARY KEY (blob_name, etag)
+    );
+    CREATE INDEX IF NOT EXISTS files_content_md5 ON files (content_md5);
+    CREATE TABLE IF NOT EXISTS file_refs (
+        thread_id TEXT NOT NULL,
+        file_id TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL,
+        PRIMARY KEY (thread_id, file_id)
+    );
+    CREATE INDEX IF NOT EXISTS file_refs_file_id ON file_refs (file_id);
+    CREATE TABLE IF NOT EXISTS thread_vector_stores (
+        thread_id TEXT PRIMARY KEY,
+        vector_store_id TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL
+    );
+    """
+
+    def _upgrade(self, connection: sqlite3.Connection) -> None:
+        # Indexes created before references were kept per file referenced a file's vector store
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(thread_refs)")}
+            if columns:
+                last_used_at = "last_used_at" if "last_used_at" in columns else "created_at"
+                connection.execute(
+                    "INSERT OR IGNORE INTO file_refs (thread_id, file_id, created_at, last_used_at) "
+                    f"SELECT thread_refs.thread_id, files.file_id, thread_refs.created_at, thread_refs.{last_used_at} "
+                    "FROM thread_refs JOIN files ON files.vector_store_id = thread_refs.vector_store_id")
+                connection.execute("DROP TABLE thread_refs")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def lookup(self, blob_name: str, etag: str, content_md5: Optional[str] = None) -> Optional[IndexedFile]:
+        """
+        Finds a previously uploaded copy of the blob, matching identical content
+        under another name or ETag when the content MD5 is known.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT blob_name, etag, content_md5, file_id, vector_store_id FROM files WHERE blob_name = ? AND etag = ?",
+                (blob_name, etag)).fetchone()
+            if row is None and content_md5:
+                row = self.connection.execute(
+                    "SELECT blob_name, etag, content_md5, file_id, vector_store_id FROM files WHERE content_md5 = ? ORDER BY last_used_at DESC",
+                    (content_md5,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("UPDATE files SET last_used_at = ? WHERE blob_name = ? AND etag = ?", (time.time(), row[0], row[1]))
+        return IndexedFile(*row)
+
+    def record_file(self, blob_name: str, etag: str, content_md5: Optional[str], file_id: str) -> IndexedFile:
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files (blob_name, etag, content_md5, file_id, vector_store_id, created_at, last_used_at) VALUES (?, ?, ?, ?, NULL, ?, ?)",
+                (blob_name, etag, content_md5, file_id, now, now))
+        return IndexedFile(blob_name=blob_name, etag=etag, content_md5=content_md5, file_id=file_id)
+
+    def record_vector_store(self, indexed_file: IndexedFile, vector_store_id: str) -> None:
+        with self._lock:
+            self.connection.execute(
+                "UPDATE files SET vector_store_id = ? WHERE blob_name = ? AND etag = ?",
+                (vector_store_id, indexed_file.blob_name, indexed_file.etag))
+        indexed_file.vector_store_id = vector_store_id
+
+    def add_thread_ref(self, thread_id: str, file_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO file_refs (thread_id, file_id, created_at, last_used_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (thread_id, file_id) DO UPDATE SET last_used_at = excluded.last_used_at",
+                (thread_id, file_id, now, now))
+
+    def touch_thread(self, thread_id: str) -> None:
+        """
+        Keeps the references and vector store of a thread live; called whenever the thread is used.
+        """
+        now = time.time()
+        with self._lock:
+            self.connection.execute("UPDATE file_refs SET last_used_at = ? WHERE thread_id = ?", (now, thread_id))
+            self.connection.execute("UPDATE thread_vector_stores SET last_used_at = ? WHERE thread_id = ?", (now, thread_id))
+
+    def ref_count(self, file_id: str) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM file_refs WHERE file_id = ?", (file_id,)).fetchone()[0]
+
+    def thread_vector_store(self, thread_id: str) -> Optional[str]:
+        """
+        Returns the vector store owned by the thread, or None while it searches a shared one.
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT vector_store_id FROM thread_vector_stores WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row[0] if row else None
+
+    def record_thread_vector_store(self, thread_id: str, vector_store_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO thread_vector_stores (thread_id, vector_store_id, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (thread_id, vector_store_id, now, now))
+
+    def orphaned(self, retention_seconds: float) -> list[IndexedFile]:
+        """
+        Drops the references of threads not used within the retention period and
+        returns files that have no live references left and that have not been
+        used within it.
+        """
+        cutoff = time.time() - retention_seconds
+        with self._lock:
+            self.connection.execute("DELETE FROM file_refs WHERE last_used_at < ?", (cutoff,))
+            rows = self.connection.execute(
+                "SELECT blob_name, etag, content_md5, file_id, vector_store_id FROM files "
+                "WHERE last_used_at < ? AND file_id NOT IN (SELECT file_id FROM file_refs)",
+                (cutoff,)).fetchall()
+        return [IndexedFile(*row) for row in rows]
+
+    def orphaned_thread_vector_stores(self, retention_seconds: float) -> list[str]:
+        """
+        Returns the vector stores owned by threads not used within the retention period.
+        """
+        cutoff = time.time() - retention_seconds
+        with self._lock:
+            rows = self.connection.execute("SELECT vector_store_id FROM thread_vector_stores WHERE last_used_at < ?", (cutoff,)).fetchall()
+        return [row[0] for row in rows]
+
+    def delete_thread_vector_store(self, vector_store_id: str) -> None:
+        with self._lock:
+            self.connection.execute("DELETE FROM thread_vector_stores WHERE vector_store_id = ?", (vector_store_id,))
+
+    def delete(self, indexed_file: IndexedFile) -> None:
+        with self._lock:
+            self.connection.execute("DELETE FROM files WHERE blob_name = ? AND etag = ?", (indexed_file.blob_name, indexed_file.etag))
+
+@cache
+def get_file_index() -> Optional[FileIndex]:
+    """
+    Returns the process-wide file index, or None when FILE_INDEX_PATH is empty.
+    """
+    return FileIndex(settings.FILE_INDEX_PATH) if settings.FILE_INDEX_PATH else None
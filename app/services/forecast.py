@@ -0,0 +1,85 @@
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+@dataclass
+class ForecastPayload:
+    """
+    A forecast as handed to the model, with the upstream body kept only when
+    WEATHER_FORECAST_FULL_DIAGNOSTICS is enabled.
+    """
+    projected: str
+    raw: Optional[str] = None
+    # time.monotonic() deadline after which the forecast is no longer fresh
+    expires_at: float = 0.0
+
+def _convert_wind(value: str) -> str:
+    """
+    Converts wind speeds such as "5 to 10 mph" to km/h.
+    """
+    if "mph" not in value:
+        return value
+    return NUMBER_PATTERN.sub(lambda match: str(round(float(match.group(0)) * 1.609)), value).replace("mph", "km/h")
+
+def project_period(period: dict[str, Any], fields: list[str], units: str) -> dict[str, Any]:
+    projected: dict[str, Any] = {}
+    for field in fields:
+        value = period.get(field)
+        if value is None:
+            continue
+        # Quantitative values such as probabilityOfPrecipitation arrive as {"unitCode": ..., "value": ...}
+        if isinstance(value, dict):
+            value = value.get("value")
+            if value is None:
+                continue
+        projected[field] = value
+
+    unit = period.get("temperatureUnit")
+    if units in ("F", "C") and "temperature" in projected and unit in ("F", "C") and unit != units:
+        temperature = float(projected["temperature"])
+        projected["temperature"] = round((temperature - 32) * 5 / 9 if units == "C" else temperature * 9 / 5 + 32)
+        if "temperatureUnit" in projected:
+            projected["temperatureUnit"] = units
+    if units == "C" and isinstance(projected.get("windSpeed"), str):
+        projected["windSpeed"] = _convert_wind(projected["windSpeed"])
+    return projected
+
+def project_forecast(body: str, periods: Optional[int] = None, fields: Optional[list[str]] = None, units: Optional[str] = None) -> str:
+    """
+    Reduces an api.weather.gov forecast to the selected periods and fields as
+    compact JSON. The geometry and the other properties are dropped. Bodies that
+    are not a forecast are returned unchanged.
+    """
+    periods = settings.WEATHER_FORECAST_PERIODS if periods is None else periods
+    fields = settings.WEATHER_FORECAST_FIELDS if fields is None else fields
+    units = settings.WEATHER_FORECAST_UNITS if units is None else units
+    try:
+        properties = json.loads(body)["properties"]
+        forecast_periods = properties["periods"]
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning("Forecast body could not be projected, passing it through: %s", e)
+        return body
+
+    if periods > 0:
+        forecast_periods = forecast_periods[:periods]
+    projected = {
+        "updated": properties.get("updateTime") or properties.get("generatedAt"),
+        "periods": [project_period(period, fields, units) for period in forecast_periods],
+    }
+    return json.dumps(projected, separators=(",", ":"), ensure_ascii=False)
+
+def build_forecast_payload(body: str, ttl_seconds: Optional[float] = None) -> ForecastPayload:
+    ttl_seconds = settings.WEATHER_FORECAST_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    return ForecastPayload(
+        projected=project_forecast(body),
+        raw=body if settings.WEATHER_FORECAST_FULL_DIAGNOSTICS else None,
+        expires_at=time.monotonic() + ttl_seconds)
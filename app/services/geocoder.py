@@ -0,0 +1,240 @@
+import csv
+import difflib
+import os
+import re
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from functools import cache
+from typing import Iterable, Optional
+
+from app.config.settings import settings
+
+STATE_ABBREVIATIONS = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "district of columbia": "DC",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID", "illinois": "IL",
+    "indiana": "IN", "iowa": "IA", "kansas": "KS", "kentucky": "KY", "louisiana": "LA",
+    "maine": "ME", "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR",
+    "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC", "south dakota": "SD",
+    "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT", "virginia": "VA",
+    "washington": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+    "puerto rico": "PR", "guam": "GU",
+}
+STATE_CODES = set(STATE_ABBREVIATIONS.values())
+
+# Colloquial names that do not match a gazetteer entry
+NAME_ALIASES = {
+    "nyc": "new york",
+    "new york city": "new york",
+    "la": "los angeles",
+    "sf": "san francisco",
+    "san fran": "san francisco",
+    "philly": "philadelphia",
+    "vegas": "las vegas",
+    "dc": "washington",
+    "washington dc": "washington",
+}
+
+# Census Gazetteer place names carry their legal/statistical area suffix ("Seattle city")
+PLACE_SUFFIXES = (" city", " town", " village", " borough", " cdp", " municipality")
+
+COORDINATES_PATTERN = re.compile(r"^\s*\(?\s*(-?\d{1,3}(?:\.\d+)?)\s*,\s*(-?\d{1,3}(?:\.\d+)?)\s*\)?\s*$")
+ZIP_PATTERN = re.compile(r"^\s*(\d{5})(?:-\d{4})?\s*$")
+
+def normalize_location(value: str) -> str:
+    """
+    Lower-cases a place name, drops punctuation and folds common abbreviations.
+    """
+    value = value.lower().replace(".", " ").replace("-", " ")
+    value = re.sub(r"[^a-z0-9, ]", "", value)
+    value = re.sub(r"\bsaint\b", "st", value)
+    value = re.sub(r"\bft\b", "fort", value)
+    value = re.sub(r"\bmt\b", "mount", value)
+    return re.sub(r"\s+", " ", value).strip(" ,")
+
+@dataclass
+class GeocodeMatch:
+    name: str
+    state: str
+    latitude: float
+    longitude: float
+    match: str
+
+class Gazetteer:
+    """
+    An offline place index. Coordinates live in compact float arrays; names are
+    resolved through hash lookups on normalized keys, with unambiguous prefix and
+    same-initial fuzzy matching over sorted name lists as fallbacks.
+    """
+    def __init__(self):
+        self.names: list[str] = []
+        self.states: list[str] = []
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self._by_name: dict[str, int] = {}
+        self._by_name_state: dict[tuple[str, str], int] = {}
+        self._by_zip: dict[str, int] = {}
+        self._names_by_state: dict[str, list[str]] = {}
+        self._sorted_names: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def load(cls, paths: Iterable[str]) -> "Gazetteer":
+        gazetteer = cls()
+        for path in paths:
+            gazetteer.load_file(path)
+        gazetteer.finalize()
+        return gazetteer
+
+    def load_file(self, path: str) -> None:
+        """
+        Loads either the bundled CSV format (name,state,zip,latitude,longitude) or a
+        tab-separated Census Gazetteer places/ZCTA file.
+        """
+        with open(path, newline="", encoding="utf-8") as file:
+            header = file.readline()
+            delimiter = "\t" if "\t" in header else ","
+            columns = [column.strip() for column in header.split(delimiter)]
+            for row in csv.reader(file, delimiter=delimiter):
+                record = dict(zip(columns, (value.strip() for value in row)))
+                if "GEOID" in record:
+                    name = record.get("NAME", "")
+                    lowered = name.lower()
+                    for suffix in PLACE_SUFFIXES:
+                        if lowered.endswith(suffix):
+                            name = name[:-len(suffix)]
+                            break
+                    zip_code = "" if name else record["GEOID"]
+                    self.add(name, record.get("USPS", ""), zip_code, float(record["INTPTLAT"]), float(record["INTPTLONG"]))
+                else:
+                    self.add(record["name"], record["state"], record.get("zip", ""), float(record["latitude"]), float(record["longitude"]))
+
+    def add(self, name: str, state: str, zip_code: str, latitude: float, longitude: float) -> None:
+        index = len(self.names)
+        self.names.append(name)
+        self.states.append(state.upper())
+        self.latitudes.append(latitude)
+        self.longitudes.append(longitude)
+
+        # The first entry for a key wins, so data files are ordered by importance
+        if zip_code:
+            self._by_zip.setdefault(zip_code, index)
+        if name:
+            key = normalize_location(name)
+            self._by_name.setdefault(key, index)
+            if (key, state.upper()) not in self._by_name_state:
+                self._by_name_state[(key, state.upper())] = index
+                self._names_by_state.setdefault(state.upper(), []).append(key)
+
+    def finalize(self) -> None:
+        self._sorted_names = sorted(self._by_name)
+        for names in self._names_by_state.values():
+            names.sort()
+
+    def lookup(self, location: str) -> Optional[GeocodeMatch]:
+        coordinates = COORDINATES_PATTERN.match(location)
+        if coordinates:
+            latitude, longitude = float(coordinates.group(1)), float(coordinates.group(2))
+            if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                return GeocodeMatch(name=location.strip(), state="", latitude=latitude, longitude=longitude, match="coordinates")
+
+        zip_match = ZIP_PATTERN.match(location)
+        if zip_match:
+            index = self._by_zip.get(zip_match.group(1))
+            return self._match(index, "zip") if index is not None else None
+
+        name, state = self._split_state(normalize_location(location))
+        name = NAME_ALIASES.get(name, name)
+        if not name:
+            return None
+
+        index = self._by_name_state.get((name, state)) if state else self._by_name.get(name)
+        if index is not None:
+            return self._match(index, "exact")
+
+        candidates = self._names_by_state.get(state, []) if state else self._sorted_names
+        if len(name) >= settings.GEOCODER_MIN_PREFIX_LENGTH:
+            # Only an unambiguous prefix counts: "spring" also starts "springdale"
+            position = bisect_left(candidates, name)
+            matches = [candidate for candidate in candidates[position:position + 2] if candidate.startswith(name)]
+            if len(matches) == 1:
+                return self._match(self._index_for(matches[0], state), "prefix")
+
+        # Fuzzy matching compares every candidate, so it only considers names with the
+        # same first letter; the lists are sorted, which makes them a contiguous slice
+        initial = name[0]
+        candidates = candidates[bisect_left(candidates, initial):bisect_left(candidates, chr(ord(initial) + 1))]
+        close = difflib.get_close_matches(name, candidates, n=1, cutoff=settings.GEOCODER_FUZZY_CUTOFF)
+        if close:
+            return self._match(self._index_for(close[0], state), "fuzzy")
+        return None
+
+    def find_places(self, text: str) -> frozenset[str]:
+        """
+        Returns the place and state names mentioned in free text, preferring the
+        longest match ("new york" over "york").
+        """
+        words = normalize_location(text).replace(",", " ").split()
+        found: set[str] = set()
+        position = 0
+        while position < len(words):
+            for size in (3, 2, 1):
+                phrase = " ".join(words[position:position + size])
+                if len(phrase.split()) < size:
+                    continue
+                phrase = NAME_ALIASES.get(phrase, phrase)
+                if phrase in self._by_name or phrase in STATE_ABBREVIATIONS:
+                    found.add(phrase)
+                    position += size
+                    break
+            else:
+                position += 1
+        return frozenset(found)
+
+    def _index_for(self, name: str, state: str) -> int:
+        return self._by_name_state[(name, state)] if state else self._by_name[name]
+
+    def _match(self, index: int, match: str) -> GeocodeMatch:
+        return GeocodeMatch(
+            name=self.names[index],
+            state=self.states[index],
+            latitude=self.latitudes[index],
+            longitude=self.longitudes[index],
+            match=match)
+
+    @staticmethod
+    def _split_state(location: str) -> tuple[str, str]:
+        """
+        Splits "seattle, wa", "seattle wa" or "seattle washington" into name and state code.
+        """
+        if "," in location:
+            name, _, state = location.rpartition(",")
+            state = state.strip()
+            code = state.upper() if state.upper() in STATE_CODES else STATE_ABBREVIATIONS.get(state)
+            if code:
+                return name.strip(" ,"), code
+            location = location.replace(",", " ")
+
+        words = location.split()
+        for size in (3, 2, 1):
+            if len(words) <= size:
+                continue
+            state = " ".join(words[-size:])
+            code = state.upper() if size == 1 and state.upper() in STATE_CODES else STATE_ABBREVIATIONS.get(state)
+            if code:
+                return " ".join(words[:-size]), code
+        return " ".join(words), ""
+
+@cache
+def get_gazetteer() -> Gazetteer:
+    """
+    Returns the process-wide gazetteer, loading the configured data files on first use.
+    """
+    paths = [path.strip() for path in settings.GEOCODER_DATA_PATH.split(",") if path.strip()]
+    return Gazetteer.load(path for path in paths if os.path.exists(path))
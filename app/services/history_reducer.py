@@ -0,0 +1,190 @@
+import logging
+from dataclasses import dataclass
+from functools import cache
+from typing import Optional
+
+from opentelemetry import metrics
+from semantic_kernel.contents import ChatMessageContent, FunctionCallContent, FunctionResultContent, TextContent
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+from app.config.settings import settings
+from app.utils.rate_limit import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+history_prompt_tokens = meter.create_histogram("app.history.prompt_tokens", unit="tokens", description="Tokens of a chat history after compaction")
+history_tokens_saved = meter.create_histogram("app.history.tokens_saved", unit="tokens", description="Tokens removed from a chat history by compaction")
+
+# Tokens the chat format adds to every message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Marks the message holding the summary of collapsed turns
+SUMMARY_METADATA_KEY = "history_summary"
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+# Characters of a user question or answer kept per summary line
+SUMMARY_LINE_CHARS = 240
+
+@cache
+def get_encoding():
+    """
+    Returns the tiktoken encoding when tiktoken is installed and the encoding is
+    available, otherwise None and token counts fall back to an estimate.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(settings.HISTORY_TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning("Could not load tokenizer '%s', estimating tokens instead: %s", settings.HISTORY_TOKENIZER_ENCODING, e)
+        return None
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    return len(encoding.encode(text, disallowed_special=())) if encoding else estimate_tokens(text)
+
+def message_tokens(message: ChatMessageContent) -> int:
+    """
+    Counts the prompt tokens of a message, including tool calls and results.
+    """
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    for item in message.items:
+        if isinstance(item, TextContent):
+            tokens += count_tokens(item.text)
+        elif isinstance(item, FunctionCallContent):
+            tokens += count_tokens(f"{item.name}{item.arguments}")
+        elif isinstance(item, FunctionResultContent):
+            tokens += count_tokens(str(item.result))
+    return tokens
+
+def history_tokens(history: ChatHistory) -> int:
+    return sum(message_tokens(message) for message in history.messages)
+
+def split_turns(messages: list[ChatMessageContent]) -> tuple[list[ChatMessageContent], list[list[ChatMessageContent]]]:
+    """
+    Splits messages into the leading system/developer messages and turns that each
+    start with a user message, so tool calls are never separated from their results.
+    """
+    head: list[ChatMessageContent] = []
+    turns: list[list[ChatMessageContent]] = []
+    for message in messages:
+        if message.role == AuthorRole.USER:
+            turns.append([message])
+        elif turns:
+            turns[-1].append(message)
+        else:
+            head.append(message)
+    return head, turns
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def summarize_turn(turn: list[ChatMessageContent]) -> list[str]:
+    """
+    Extractive summary of a turn: the question and the final answer, without tool traffic.
+    """
+    lines = [f"User: {_clip(turn[0].content or '', SUMMARY_LINE_CHARS)}"]
+    answers = [message.content for message in turn[1:] if message.role == AuthorRole.ASSISTANT and message.content]
+    if answers:
+        lines.append(f"Assistant: {_clip(answers[-1], SUMMARY_LINE_CHARS)}")
+    return lines
+
+def condense_tool_results(message: ChatMessageContent, max_tokens: int) -> ChatMessageContent:
+    """
+    Returns the message with tool results above max_tokens cut down to about that size.
+    Messages are copied rather than changed because stored threads share them.
+    """
+    items = []
+    changed = False
+    for item in message.items:
+        if isinstance(item, FunctionResultContent):
+            result = str(item.result)
+            tokens = count_tokens(result)
+            if tokens > max_tokens:
+                kept = result[:max(0, len(result) * max_tokens // tokens)]
+                item = item.model_copy(update={"result": f"{kept} ... [{tokens - count_tokens(kept)} tokens of tool output omitted]"})
+                changed = True
+        items.append(item)
+    return message.model_copy(update={"items": items}) if changed else message
+
+@dataclass
+class HistoryReduction:
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+def reduce_history(
+    history: ChatHistory,
+    max_tokens: Optional[int] = None,
+    recent_turns: Optional[int] = None,
+    tool_result_max_tokens: Optional[int] = None,
+    summary_max_tokens: Optional[int] = None,
+    source: str = "weather",
+) -> HistoryReduction:
+    """
+    Compacts a chat history in place. The leading system prompt and the latest
+    turn are always kept verbatim. Large tool outputs in earlier turns are
+    condensed, turns older than the most recent ones - and more if the history is
+    still over max_tokens - are collapsed into a single summary message, and the
+    oldest summary lines are dropped if the summary outgrows its budget.
+    """
+    max_tokens = settings.HISTORY_MAX_TOKENS if max_tokens is None else max_tokens
+    recent_turns = settings.HISTORY_RECENT_TURNS if recent_turns is None else recent_turns
+    tool_result_max_tokens = settings.HISTORY_TOOL_RESULT_MAX_TOKENS if tool_result_max_tokens is None else tool_result_max_tokens
+    summary_max_tokens = settings.HISTORY_SUMMARY_MAX_TOKENS if summary_max_tokens is None else summary_max_tokens
+
+    tokens_before = history_tokens(history)
+    if max_tokens <= 0:
+        return HistoryReduction(tokens_before, tokens_before)
+
+    head, turns = split_turns(history.messages)
+    summary_lines: list[str] = []
+    for message in [message for message in head if message.metadata.get(SUMMARY_METADATA_KEY)]:
+        summary_lines.extend(line for line in (message.content or "").splitlines()[1:] if line)
+        head.remove(message)
+
+    if tool_result_max_tokens > 0:
+        turns = [[condense_tool_results(message, tool_result_max_tokens) for message in turn] for turn in turns[:-1]] + turns[-1:]
+
+    turn_tokens = [sum(message_tokens(message) for message in turn) for turn in turns]
+    fixed_tokens = sum(message_tokens(message) for message in head)
+    collapsed = max(0, len(turns) - max(1, recent_turns)) if recent_turns > 0 else 0
+    while collapsed < len(turns) - 1 and fixed_tokens + sum(turn_tokens[collapsed:]) > max_tokens:
+        collapsed += 1
+    for turn in turns[:collapsed]:
+        summary_lines.extend(summarize_turn(turn))
+
+    # Whatever budget the kept turns leave, bounded by summary_max_tokens, goes to the summary
+    summary_budget = min(summary_max_tokens, max_tokens - fixed_tokens - sum(turn_tokens[collapsed:]))
+    line_tokens = [count_tokens(line) + 1 for line in summary_lines]
+    header_tokens = count_tokens(SUMMARY_HEADER) + MESSAGE_OVERHEAD_TOKENS
+    first = 0
+    while first < len(summary_lines) and sum(line_tokens[first:]) + header_tokens > summary_budget:
+        first += 1
+
+    messages = list(head)
+    if summary_lines[first:]:
+        messages.append(ChatMessageContent(
+            role=AuthorRole.SYSTEM,
+            content="\n".join([SUMMARY_HEADER] + summary_lines[first:]),
+            metadata={SUMMARY_METADATA_KEY: True}))
+    history.messages = messages + [message for turn in turns[collapsed:] for message in turn]
+
+    reduction = HistoryReduction(tokens_before, history_tokens(history))
+    attributes = {"source": source}
+    history_prompt_tokens.record(reduction.tokens_after, attributes)
+    history_tokens_saved.record(reduction.tokens_saved, attributes)
+    return reduction
@@ -0,0 +1,71 @@
+import time
+from functools import cache
+from typing import Optional
+
+from app.config.settings import settings
+from app.utils.cache_backend import SqliteStore
+
+class SqliteJobBackend(SqliteStore):
+    """
+    Background job status and results shared by the worker processes, so a job
+    started on one worker can be polled through any of them. Jobs are kept per
+    kind (batch, file indexing) as JSON, and each kind keeps its newest max_jobs.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        kind TEXT NOT NULL,
+        job_id TEXT NOT NULL,
+        job TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (kind, job_id)
+    );
+    CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (kind, created_at);
+    CREATE TABLE IF NOT EXISTS job_results (
+        job_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        result TEXT NOT NULL,
+        PRIMARY KEY (job_id, position)
+    );
+    """
+
+    def create(self, kind: str, job_id: str, job: str, max_jobs: int) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO jobs (kind, job_id, job, created_at) VALUES (?, ?, ?, ?)",
+                (kind, job_id, job, time.time()))
+            dropped = [row[0] for row in self.connection.execute(
+                "SELECT job_id FROM jobs WHERE kind = ? ORDER BY created_at DESC LIMIT -1 OFFSET ?",
+                (kind, max_jobs))]
+            for dropped_id in dropped:
+                self.connection.execute("DELETE FROM jobs WHERE kind = ? AND job_id = ?", (kind, dropped_id))
+                self.connection.execute("DELETE FROM job_results WHERE job_id = ?", (dropped_id,))
+
+    def update(self, kind: str, job_id: str, job: str) -> None:
+        with self._lock:
+            self.connection.execute("UPDATE jobs SET job = ? WHERE kind = ? AND job_id = ?", (job, kind, job_id))
+
+    def get(self, kind: str, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self.connection.execute("SELECT job FROM jobs WHERE kind = ? AND job_id = ?", (kind, job_id)).fetchone()
+        return row[0] if row else None
+
+    def add_result(self, job_id: str, position: int, result: str) -> None:
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO job_results (job_id, position, result) VALUES (?, ?, ?)",
+                (job_id, position, result))
+
+    def results(self, job_id: str, start: int) -> list[str]:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT result FROM job_results WHERE job_id = ? AND position >= ? ORDER BY position",
+                (job_id, start)).fetchall()
+        return [row[0] for row in rows]
+
+@cache
+def get_job_backend() -> Optional[SqliteJobBackend]:
+    """
+    Returns the job store shared by the worker processes (kept in CACHE_PATH), or
+    None when jobs are only kept in the memory of the worker that runs them.
+    """
+    return SqliteJobBackend(settings.CACHE_PATH) if settings.CACHE_BACKEND == "sqlite" else None
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from app.services.azure_clients import azure_clients
+
+if TYPE_CHECKING:
+    from app.services.batch_service import BatchService
+    from app.services.chat_agent_service import ChatAgentService
+    from app.services.weather_agent_service import WeatherAgentService
+
+logger = logging.getLogger(__name__)
+
+class ServiceRegistry:
+    """
+    Builds the agent services on first use instead of at import time, so the app
+    starts serving before Semantic Kernel and the Azure SDKs are loaded. The
+    lifespan warms the services up in the background and readiness reports
+    when that has finished.
+    """
+    def __init__(self):
+        # Services may be built from the warm-up thread and request threads at once
+        self._lock = threading.RLock()
+        self._weather_service: Optional["WeatherAgentService"] = None
+        self._chat_agent_service: Optional["ChatAgentService"] = None
+        self._batch_service: Optional["BatchService"] = None
+        self.ready = False
+        self.error: Optional[str] = None
+
+    @property
+    def weather_service(self) -> "WeatherAgentService":
+        if self._weather_service is None:
+            with self._lock:
+                if self._weather_service is None:
+                    from app.services.weather_agent_service import WeatherAgentService
+                    self._weather_service = WeatherAgentService()
+        return self._weather_service
+
+    @property
+    def chat_agent_service(self) -> "ChatAgentService":
+        if self._chat_agent_service is None:
+            with self._lock:
+                if self._chat_agent_service is None:
+                    from app.services.chat_agent_service import ChatAgentService
+                    self._chat_agent_service = ChatAgentService()
+        return self._chat_agent_service
+
+    @property
+    def batch_service(self) -> "BatchService":
+        if self._batch_service is None:
+            with self._lock:
+                if self._batch_service is None:
+                    from app.services.batch_service import BatchService
+                    self._batch_service = BatchService(self.weather_service, self.chat_agent_service)
+        return self._batch_service
+
+    def build(self) -> None:
+        self.preload()
+        self.batch_service
+
+    def preload(self) -> None:
+        """
+        Imports the service modules and loads the gazetteer and tokenizer without
+        creating any clients. gunicorn calls this in the master process before
+        forking, so the workers share these pages and skip the imports; clients,
+        connections and the agent definition are still created per worker by start().
+        """
+        import app.services.batch_service
+        import app.services.chat_agent_service
+        import app.services.weather_agent_service
+        from app.services.geocoder import get_gazetteer
+        from app.services.history_reducer import get_encoding
+        get_gazetteer()
+        # Loading the encoding may download it, which must not happen on the event loop
+        get_encoding()
+
+    async def start(self) -> None:
+        """
+        Builds the services off the event loop, then warms up the Azure clients and
+        the agent definition. Failures are logged and leave the app not ready;
+        requests retry building the service they need.
+        """
+        try:
+            await asyncio.to_thread(self.build)
+            await azure_clients.start()
+            await self.chat_agent_service.warm_up()
+        except Exception as e:
+            logger.exception("Service warm-up failed")
+            self.error = str(e)
+            return
+        self.error = None
+        self.ready = True
+
+    async def close(self) -> None:
+        if self._batch_service is not None:
+            await self._batch_service.close()
+        if self._weather_service is not None:
+            from app.services.thread_store import thread_store
+            thread_store.close()
+        from app.services.file_index import get_file_index
+        from app.services.job_store import get_job_backend
+        from app.utils.cache_backend import get_cache_backend
+        for backend in (get_cache_backend(), get_job_backend(), get_file_index()):
+            if backend is not None:
+                backend.close()
+
+services = ServiceRegistry()
+
+# FastAPI dependencies. They are synchronous so a service built on first use is
+# constructed in the threadpool rather than on the event loop.
+def get_weather_service() -> "WeatherAgentService":
+    return services.weather_service
+
+def get_chat_agent_service() -> "ChatAgentService":
+    return services.chat_agent_service
+
+def get_batch_service() -> "BatchService":
+    return services.batch_service
@@ -0,0 +1,180 @@
+import datetime
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+from opentelemetry import metrics
+
+from app.config.settings import settings
+from app.models.api_models import ChatMessage, ExecutionDiagnostics, ExecutionStep, RequestResult
+from app.services.geocoder import get_gazetteer
+from app.utils.cache import AsyncTTLCache, CacheCodec
+from app.utils.cache_backend import get_cache_backend
+from app.utils.telemetry import elapsed_ms
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+response_cache_requests = meter.create_counter("app.response_cache.requests", description="Cacheable requests by result: exact_hit, semantic_hit or miss")
+
+# Words that change the answer to an otherwise identical weather question
+TIME_WORDS = frozenset((
+    "now", "today", "tonight", "tomorrow", "morning", "afternoon", "evening", "night", "weekend", "week",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+))
+
+# A model call that returns the result and how long it stays fresh (None uses the cache default)
+Runner = Callable[[], Awaitable[tuple[RequestResult, Optional[float]]]]
+
+def normalize_text(text: str) -> str:
+    text = re.sub(r"[^\w\s,]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip(" ,")
+
+def history_key(messages: list[ChatMessage], prompt_version: str) -> str:
+    """
+    Exact-tier key: the prompt version and the normalized role/content pairs.
+    """
+    digest = hashlib.sha256(prompt_version.encode())
+    for message in messages:
+        digest.update(f"\n{message.role.lower()}:{normalize_text(message.content or '')}".encode())
+    return digest.hexdigest()
+
+def question_signature(text: str) -> frozenset[str]:
+    """
+    The places, times and numbers a question mentions. Similar embeddings only
+    count as a match when these agree, so "Chicago today" never answers "Boston today".
+    """
+    words = normalize_text(text).replace(",", " ").split()
+    signature = {word for word in words if word in TIME_WORDS or word.isdigit()}
+    return frozenset(signature | get_gazetteer().find_places(text))
+
+@dataclass
+class CachedResponse:
+    content: str
+    prompt_version: str
+    signature: frozenset[str]
+    expires_at: float
+
+def encode_response(entry: CachedResponse) -> str:
+    # expires_at is monotonic, so the shared copy carries the remaining lifetime
+    return json.dumps({
+        "content": entry.content,
+        "prompt_version": entry.prompt_version,
+        "signature": sorted(entry.signature),
+        "expires_in": entry.expires_at - time.monotonic(),
+    })
+
+def decode_response(value: str) -> CachedResponse:
+    stored = json.loads(value)
+    return CachedResponse(
+        content=stored["content"],
+        prompt_version=stored["prompt_version"],
+        signature=frozenset(stored["signature"]),
+        expires_at=time.monotonic() + stored["expires_in"])
+
+class SemanticIndex:
+    """
+    A fixed-size ring of unit-length embeddings searched by cosine similarity
+    with one matrix-vector product; the oldest entry is overwritten when full.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: list[Optional[CachedResponse]] = [None] * max_entries
+        self._next = 0
+
+    def add(self, vector: np.ndarray, entry: CachedResponse) -> None:
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        self._vectors[self._next] = vector
+        self._entries[self._next] = entry
+        self._next = (self._next + 1) % self.max_entries
+
+    def search(self, vector: np.ndarray, threshold: float, accept: Callable[[CachedResponse], bool]) -> Optional[tuple[CachedResponse, float]]:
+        if self._vectors is None:
+            return None
+        similarities = self._vectors @ vector
+        candidates = np.flatnonzero(similarities >= threshold)
+        for index in candidates[np.argsort(-similarities[candidates])]:
+            entry = self._entries[index]
+            if entry is not None and accept(entry):
+                return entry, float(similarities[index])
+        return None
+
+class ResponseCache:
+    """
+    Answers repeated /weather questions without a model call. The exact tier is
+    keyed on the normalized message history and prompt version and coalesces
+    concurrent identical questions; the optional semantic tier matches
+    single-question requests by embedding similarity. Entries live no longer than
+    the forecasts the answer was based on.
+    """
+    def __init__(self, embedding_service: Any = None, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None, similarity_threshold: Optional[float] = None):
+        max_entries = settings.RESPONSE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl_seconds = settings.RESPONSE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.similarity_threshold = settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD if similarity_threshold is None else similarity_threshold
+        self.embedding_service = embedding_service if self.similarity_threshold > 0 else None
+        # The exact tier is shared with the other workers; the semantic index is per process
+        self._responses = AsyncTTLCache(
+            "weather.responses",
+            max_size=max_entries,
+            ttl_seconds=self.ttl_seconds,
+            backend=get_cache_backend(),
+            codec=CacheCodec(encode_response, decode_response))
+        self._index = SemanticIndex(max_entries) if self.embedding_service is not None else None
+
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            vector = (await self.embedding_service.generate_embeddings([text]))[0].astype(np.float32)
+        except Exception as e:
+            logger.warning("Could not embed question for the response cache: %s", e)
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def get_or_run(self, messages: list[ChatMessage], prompt_version: str, run: Runner) -> RequestResult:
+        start_time = datetime.datetime.now().isoformat()
+        start = time.perf_counter()
+        result: Optional[RequestResult] = None
+        hit: dict[str, Any] = {"Tier": "exact"}
+
+        async def load():
+            nonlocal result
+            question = messages[0].content if len(messages) == 1 and messages[0].role.lower() == "user" else None
+            vector = signature = None
+            if self._index is not None and question:
+                vector, signature = await self.embed(normalize_text(question)), question_signature(question)
+                if vector is not None:
+                    now = time.monotonic()
+                    match = self._index.search(
+                        vector,
+                        self.similarity_threshold,
+                        lambda entry: entry.prompt_version == prompt_version and entry.signature == signature and entry.expires_at > now)
+                    if match is not None:
+                        entry, similarity = match
+                        hit.update(Tier="semantic", Similarity=round(similarity, 4))
+                        return entry, entry.expires_at - now
+
+            result, ttl = await run()
+            ttl = self.ttl_seconds if ttl is None else min(ttl, self.ttl_seconds)
+            entry = CachedResponse(content=result.content, prompt_version=prompt_version, signature=signature or frozenset(), expires_at=time.monotonic() + ttl)
+            if vector is not None and ttl > 0:
+                self._index.add(vector, entry)
+            return entry, ttl
+
+        entry = await self._responses.get_or_load(history_key(messages, prompt_version), load)
+        if result is not None:
+            response_cache_requests.add(1, {"result": "miss"})
+            return result
+
+        response_cache_requests.add(1, {"result": f"{hit['Tier']}_hit"})
+        hit["ExpiresInSeconds"] = round(max(0.0, entry.expires_at - time.monotonic()))
+        end_time = datetime.datetime.now().isoformat()
+        return RequestResult(
+            content=entry.content,
+            execution_diagnostics=ExecutionDiagnostics(steps=[ExecutionStep(name="response_cache", content=hit, start_time=start_time, end_time=end_time, duration_ms=elapsed_ms(start))]))
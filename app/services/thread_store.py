@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+
+from app.config.settings import settings
+from app.services.history_reducer import reduce_history
+from app.utils.cache import AsyncTTLCache
+from app.utils.cache_backend import SqliteStore
+
+logger = logging.getLogger(__name__)
+
+# Tool results carry the request's KernelArguments (queues, semaphores) in their
+# metadata; they are not needed to continue the conversation and cannot be serialized
+RUNTIME_METADATA = ("arguments", "used_arguments")
+
+def serialize_history(history: ChatHistory) -> str:
+    for message in history.messages:
+        for item in message.items:
+            if isinstance(item, FunctionResultContent):
+                for key in RUNTIME_METADATA:
+                    item.metadata.pop(key, None)
+    return history.serialize()
+
+class ThreadNotFoundError(Exception):
+    pass
+
+class SqliteThreadBackend(SqliteStore):
+    """
+    Persists serialized chat histories by thread id. The get/set/delete interface
+    over JSON strings with a TTL maps one-to-one onto a Redis-compatible store.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS threads (
+        thread_id TEXT PRIMARY KEY,
+        history TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS threads_updated_at ON threads (updated_at);
+    """
+
+    def get(self, thread_id: str, ttl_seconds: float) -> Optional[str]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT history FROM threads WHERE thread_id = ? AND updated_at >= ?",
+                (thread_id, time.time() - ttl_seconds)).fetchone()
+        return row[0] if row else None
+
+    def set(self, thread_id: str, history: str, ttl_seconds: float) -> None:
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO threads (thread_id, history, updated_at) VALUES (?, ?, ?)",
+                (thread_id, history, now))
+            self.connection.execute("DELETE FROM threads WHERE updated_at < ?", (now - ttl_seconds,))
+
+    def delete(self, thread_id: str) -> None:
+        with self._lock:
+            self.connection.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+
+class ThreadStore:
+    """
+    Keeps weather conversations server-side, keyed by thread id, so clients send
+    only the new message each turn. Thread ids are generated by create(); ids
+    the store does not know are rejected rather than started, so a guessed id
+    cannot open someone else's conversation. Histories live in a bounded LRU and are
+    optionally persisted to a backend; they are compacted to a token budget
+    before each turn so prompts stop growing with the conversation.
+
+    A backend shared by several worker processes is read on every turn instead
+    of the LRU, since another worker may have continued the thread. Turns on one
+    thread are serialized within a worker only; across workers the last save wins.
+    """
+    def __init__(self, max_threads: int, ttl_seconds: float, max_tokens: int, backend: Optional[SqliteThreadBackend] = None, shared: bool = False):
+        self.ttl_seconds = ttl_seconds
+        self.max_tokens = max_tokens
+        self.backend = backend
+        self.shared = shared and backend is not None
+        self._histories = AsyncTTLCache("weather.threads", max_size=max_threads, ttl_seconds=ttl_seconds)
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    async def load(self, thread_id: str) -> Optional[ChatHistory]:
+        async def load_history():
+            if self.backend is None:
+                return None, 0
+            serialized = await asyncio.to_thread(self.backend.get, thread_id, self.ttl_seconds)
+            if serialized is None:
+                return None, 0
+            return ChatHistory.restore_chat_history(serialized), None
+        if self.shared:
+            return (await load_history())[0]
+        return await self._histories.get_or_load(thread_id, load_history)
+
+    async def create(self) -> str:
+        thread_id = f"thread_{uuid.uuid4().hex}"
+        await self.save(thread_id, ChatHistory())
+        return thread_id
+
+    async def exists(self, thread_id: str) -> bool:
+        return await self.load(thread_id) is not None
+
+    async def save(self, thread_id: str, history: ChatHistory) -> None:
+        if not self.shared:
+            self._histories.set(thread_id, history)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set, thread_id, serialize_history(history), self.ttl_seconds)
+
+    async def delete(self, thread_id: str) -> None:
+        self._histories.invalidate(thread_id)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.delete, thread_id)
+
+    @asynccontextmanager
+    async def open(self, thread_id: str) -> AsyncIterator[ChatHistory]:
+        """
+        Yields the thread's history, truncated to the token budget, and saves it
+        when the block completes. Turns on the same thread run one at a time.
+        Raises ThreadNotFoundError for ids not created by create() or expired.
+        """
+        lock = self._locks.get(thread_id)
+        if lock is None:
+            lock = self._locks[thread_id] = asyncio.Lock()
+        async with lock:
+            # Work on a copy so a failed turn leaves the stored history untouched
+            stored = await self.load(thread_id)
+            if stored is None:
+                raise ThreadNotFoundError(f"Thread '{thread_id}' not found.")
+            history = ChatHistory(messages=list(stored.messages))
+            reduction = reduce_history(history, max_tokens=self.max_tokens, source="thread_store")
+            if reduction.tokens_saved:
+                logger.info("Compacted thread %s by %d tokens", thread_id, reduction.tokens_saved)
+            yield history
+            await self.save(thread_id, history)
+
+    def close(self) -> None:
+        if self.backend is not None:
+            self.backend.close()
+
+def thread_store_path() -> str:
+    # With a shared cache backend, threads are kept in the same database unless THREAD_STORE_PATH is set
+    if settings.THREAD_STORE_PATH:
+        return settings.THREAD_STORE_PATH
+    return settings.CACHE_PATH if settings.CACHE_BACKEND == "sqlite" else ""
+
+thread_store = ThreadStore(
+    max_threads=settings.THREAD_STORE_MAX_THREADS,
+    ttl_seconds=settings.THREAD_STORE_TTL_SECONDS,
+    max_tokens=settings.HISTORY_MAX_TOKENS,
+    backend=SqliteThreadBackend(thread_store_path()) if thread_store_path() else None,
+    shared=settings.WEB_CONCURRENCY > 1)
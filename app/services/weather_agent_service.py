@@ -1,18 +1,31 @@
 import os
-from typing import List
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List
 
+import httpx
 import semantic_kernel as sk
 from dotenv import load_dotenv
 from opentelemetry import trace
-from azure.identity import DefaultAzureCredential
+from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 
-from app.models.api_models import ChatRequest, ExecutionDiagnostics, RequestResult, ChatThreadRequest
-from app.prompts.file_service import FileService
+from app.models.api_models import ChatRequest, ExecutionDiagnostics, RequestResult, ChatThreadRequest, StreamEvent
+from app.prompts.file_service import file_service
 from app.services.weather_plugin import WeatherPlugin
+from app.services.thread_store import thread_store
+from app.services.history_reducer import reduce_history
+from app.services.response_cache import ResponseCache
+from app.config.settings import settings as app_settings
+from app.utils.rate_limit import RateLimitedTransport, RateLimitPolicy, get_rate_limiter
+from app.utils.telemetry import AgentRunMetrics, stage
 
-from semantic_kernel.agents import ChatCompletionAgent
+from semantic_kernel.agents import ChatCompletionAgent, ChatHistoryAgentThread
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.function_call_choice_configuration import FunctionCallChoiceConfiguration
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureTextEmbedding
 from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
 from semantic_kernel.contents import ChatMessageContent
 from semantic_kernel.contents.chat_history import ChatHistory
@@ -20,6 +33,135 @@ from semantic_kernel.functions.kernel_arguments import KernelArguments
 from semantic_kernel.contents import ChatMessageContent, FunctionCallContent
 from semantic_kernel.connectors.ai.azure_ai_inference import AzureAIInferenceChatCompletion
 from azure.ai.inference.aio import ChatCompletionsClient
+from openai import AsyncAzureOpenAI
+from semantic_kernel.filters import FilterTypes, FunctionInvocationContext
+
+logger = logging.getLogger(__name__)
+
+# KernelArguments keys carrying per-request state rather than function parameters
+INTERNAL_ARGUMENTS = ("diagnostics", "events", "forecast_expiry", "tool_slots")
+
+WEATHER_PROMPT = "WeatherSystemPrompt.txt"
+
+# Function choice configurations by kernel, plugin set and filters. Kept outside the
+# behavior because the chat service deep-copies the execution settings per request.
+_function_choice_configs: dict[tuple, FunctionCallChoiceConfiguration] = {}
+
+class CachedFunctionChoiceBehavior(FunctionChoiceBehavior):
+    """
+    FunctionChoiceBehavior that collects the kernel function metadata once per
+    kernel and plugin set instead of walking every plugin on each request.
+    """
+    def get_config(self, kernel: sk.Kernel) -> FunctionCallChoiceConfiguration:
+        key = (id(kernel), tuple(kernel.plugins), repr(self.filters))
+        config = _function_choice_configs.get(key)
+        if config is None:
+            config = _function_choice_configs[key] = super().get_config(kernel)
+        return config
+
+class WeatherAgentFactory:
+    """
+    Builds the weather ChatCompletionAgent and its execution settings once per
+    process. The agent is rebuilt only when the system prompt changes; each
+    request gets its own KernelArguments carrying the per-request state.
+    """
+    def __init__(self, kernel: sk.Kernel):
+        self.kernel = kernel
+        self.execution_settings = PromptExecutionSettings(
+            function_choice_behavior=CachedFunctionChoiceBehavior.Auto(filters={"included_plugins": ["weather"]}),
+            # Lets the model request several tools in one turn. Only the OpenAI connector (API key
+            # authentication) sends it, and drops it when no tools are sent; the Azure AI Inference
+            # connector used with a credential ignores it, so the service default (true) applies there
+            extension_data={"parallel_tool_calls": app_settings.WEATHER_PARALLEL_TOOL_CALLS},
+        )
+        self._agent: ChatCompletionAgent | None = None
+        self._prompt_version: str | None = None
+
+    def get_agent(self) -> ChatCompletionAgent:
+        version = file_service.version(WEATHER_PROMPT)
+        if self._agent is None or self._prompt_version != version:
+            self._agent = ChatCompletionAgent(
+                kernel=self.kernel,
+                name="WeatherAgent",
+                instructions=file_service.read_file(WEATHER_PROMPT),
+                arguments=KernelArguments(settings=self.execution_settings)
+            )
+            self._prompt_version = version
+        return self._agent
+
+    def request_arguments(self, events: asyncio.Queue | None = None) -> KernelArguments:
+        """
+        Per-request arguments; the agent merges them with its own execution settings.
+        """
+        kernel_arguments = KernelArguments()
+        kernel_arguments ["diagnostics"] = []
+        kernel_arguments ["tool_slots"] = asyncio.Semaphore(app_settings.WEATHER_TOOL_CONCURRENCY)
+        if events is not None:
+            kernel_arguments ["events"] = events
+        return kernel_arguments
+
+async def report_function_invocation(context: FunctionInvocationContext, next: Callable[[FunctionInvocationContext], Awaitable[None]]) -> None:
+    """
+    Kernel filter that publishes tool call start/finish events, including the
+    ExecutionStep recorded by the plugin, when the request streams its events.
+    """
+    events = context.arguments.get("events") if context.arguments else None
+    if events is None:
+        await next(context)
+        return
+
+    name = context.function.fully_qualified_name
+    diagnostics = context.arguments.get("diagnostics", [])
+    step_count = len(diagnostics)
+    arguments = {key: str(value) for key, value in context.arguments.items() if key not in INTERNAL_ARGUMENTS}
+    await events.put(StreamEvent(event="tool_call_start", data={"name": name, "arguments": arguments}))
+    try:
+        await next(context)
+    finally:
+        steps = diagnostics[step_count:]
+        await events.put(StreamEvent(event="tool_call_end", data={"name": name, "steps": steps}))
+
+async def limit_tool_concurrency(context: FunctionInvocationContext, next: Callable[[FunctionInvocationContext], Awaitable[None]]) -> None:
+    """
+    Kernel filter that caps how many tool calls of one request run at once.
+    Semantic Kernel runs all calls the model makes in one turn concurrently.
+    """
+    slots = context.arguments.get("tool_slots") if context.arguments else None
+    if slots is None:
+        await next(context)
+        return
+    async with slots:
+        await next(context)
+
+async def measure_tool_call(context: FunctionInvocationContext, next: Callable[[FunctionInvocationContext], Awaitable[None]]) -> None:
+    """
+    Kernel filter that records each tool call's latency, excluding the wait for a tool slot.
+    """
+    with stage("tool_call", tool=context.function.fully_qualified_name):
+        await next(context)
+
+async def drain_events(events: asyncio.Queue, producer: Awaitable[None]) -> AsyncIterator[StreamEvent]:
+    """
+    Runs the producer in the background and yields the events it queues until it puts None.
+    """
+    task = asyncio.create_task(producer)
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
+
+def add_request_messages(chat_history: ChatHistory, request: ChatRequest) -> None:
+    for message in request.messages:
+        if message.role.lower() == "user":
+            chat_history.add_user_message(message.content)
+        elif message.role.lower() == "assistant":
+            chat_history.add_assistant_message(message.content)
 
 class WeatherAgentService:
     def __init__(self):
@@ -37,28 +179,94 @@ class WeatherAgentService:
         self.kernel = sk.Kernel()
         
         # If API key is present, use key-based authentication
+        # Both clients are admitted through the shared Azure OpenAI rate limiter
+        rate_limiter = get_rate_limiter("azure-openai")
         if api_key:
             self.kernel.add_service(AzureChatCompletion(
-                api_key=api_key,
-                endpoint=endpoint,
                 deployment_name=deployment_name,
-                service_id="azure-chat-completion"
+                service_id="azure-chat-completion",
+                async_client=AsyncAzureOpenAI(
+                    api_key=api_key,
+                    azure_endpoint=endpoint,
+                    api_version=app_settings.AZURE_OPENAI_API_VERSION,
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(transport=RateLimitedTransport(rate_limiter)),
+                )
             ))
         # Otherwise use DefaultAzureCredential
         else:
+            if not app_settings.WEATHER_PARALLEL_TOOL_CALLS:
+                # Its extra_parameters would carry the setting, but Semantic Kernel also passes them to the transport, which rejects them
+                logger.warning("WEATHER_PARALLEL_TOOL_CALLS=false is not supported with credential authentication; the model may still request tools in parallel.")
             self.kernel.add_service(AzureAIInferenceChatCompletion(
                 ai_model_id=deployment_name,
                 client=ChatCompletionsClient(
                      endpoint=f"{str(endpoint).strip('/')}/openai/deployments/{deployment_name}",
                      credential=DefaultAzureCredential(),
                      credential_scopes=["https://cognitiveservices.azure.com/.default"],
+                     per_retry_policies=[RateLimitPolicy(rate_limiter)],
+                     retry_total=app_settings.RATE_LIMIT_MAX_RETRIES,
+                     retry_backoff_factor=app_settings.RATE_LIMIT_BACKOFF_SECONDS,
                 )
             ))
 
         self.kernel.add_plugin(WeatherPlugin(self.kernel), plugin_name="weather")
-        self.file_service = FileService()
+        self.kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, report_function_invocation)
+        self.kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, limit_tool_concurrency)
+        self.kernel.add_filter(FilterTypes.FUNCTION_INVOCATION, measure_tool_call)
+        self.file_service = file_service
+
+        # Resolved by type so both the API key and the credential-based service are found
+        self.chat_completion_service = self.kernel.get_service(type=ChatCompletionClientBase)
+        self.agent_factory = WeatherAgentFactory(self.kernel)
+
+        # Opt-in response cache; the embedding tier needs a deployment and a similarity threshold
+        self.response_cache = None
+        if app_settings.RESPONSE_CACHE_ENABLED:
+            embedding_service = None
+            embedding_deployment_name = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+            if embedding_deployment_name and app_settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD > 0:
+                embedding_service = AzureTextEmbedding(
+                    deployment_name=embedding_deployment_name,
+                    service_id="azure-text-embedding",
+                    async_client=AsyncAzureOpenAI(
+                        api_key=api_key or None,
+                        azure_ad_token_provider=None if api_key else get_bearer_token_provider(DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"),
+                        azure_endpoint=endpoint,
+                        api_version=app_settings.AZURE_OPENAI_API_VERSION,
+                        max_retries=app_settings.RATE_LIMIT_MAX_RETRIES,
+                    )
+                )
+            self.response_cache = ResponseCache(embedding_service)
+
+    async def create_thread(self) -> str:
+        return await thread_store.create()
+
+    async def has_thread(self, thread_id: str) -> bool:
+        return await thread_store.exists(thread_id)
 
-        pass
+    @asynccontextmanager
+    async def conversation(self, request: ChatRequest) -> AsyncIterator[ChatHistory]:
+        """
+        Yields the chat history for a /weather request: the system prompt, the
+        stored turns of request.thread_id (if set) and the request's messages,
+        compacted to the history token budget. The caller adds the final answer;
+        the thread is saved without the system prompt.
+        """
+        chat_history_1 = ChatHistory()
+        chat_history_1.add_system_message(self.file_service.read_file(WEATHER_PROMPT))
+        if not request.thread_id:
+            add_request_messages(chat_history_1, request)
+            reduce_history(chat_history_1)
+            yield chat_history_1
+            return
+
+        async with thread_store.open(request.thread_id) as stored:
+            chat_history_1.messages.extend(stored.messages)
+            add_request_messages(chat_history_1, request)
+            reduce_history(chat_history_1)
+            yield chat_history_1
+            stored.messages = chat_history_1.messages[1:]
 
 
     async def run_weather(self, request: ChatRequest) -> str:
@@ -67,42 +275,59 @@ class WeatherAgentService:
             # Validate the request object
             if not request.messages:
                 raise ValueError("No messages found in request.")
-            
-            chat_completion_service = self.kernel.get_service(service_id="azure-chat-completion")
-            settings=PromptExecutionSettings(
-                function_choice_behavior=FunctionChoiceBehavior.Auto(filters={"included_plugins": ["weather"]}),
-            )
-            kernel_arguments = KernelArguments()
-            kernel_arguments ["diagnostics"] = []
-
-            system_message = self.file_service.read_file('WeatherSystemPrompt.txt')
-            chat_history_1 = ChatHistory()
-            chat_history_1.add_system_message(system_message)
-            for message in request.messages:
-                if message.role.lower() == "user":
-                    chat_history_1.add_user_message(message.content)
-                elif message.role.lower() == "assistant":
-                    chat_history_1.add_assistant_message(message.content)
-            
-            chat_result = await chat_completion_service.get_chat_message_content(
-                chat_history=chat_history_1,
-                arguments=kernel_arguments, 
-                settings=settings,
-                kernel=self.kernel)  
 
-            request_result = RequestResult(
-                content=f"{chat_result}",
-                execution_diagnostics=ExecutionDiagnostics(steps=kernel_arguments ["diagnostics"]))
+            # Stateless requests can be answered from the response cache
+            if self.response_cache is not None and not request.thread_id:
+                return await self.response_cache.get_or_run(
+                    request.messages,
+                    self.file_service.version(WEATHER_PROMPT),
+                    lambda: self.complete_weather(request))
 
+            request_result, _ = await self.complete_weather(request)
             return request_result
+
+    async def complete_weather(self, request: ChatRequest) -> tuple[RequestResult, float | None]:
+        """
+        Answers a /weather request with the model. Also returns how many seconds the
+        answer stays fresh: until the earliest forecast it used expires, or None
+        when it used no forecast.
+        """
+        kernel_arguments = self.agent_factory.request_arguments()
+        kernel_arguments ["forecast_expiry"] = []
+
+        metrics = AgentRunMetrics("weather")
+        async with self.conversation(request) as chat_history_1:
+            message_count = len(chat_history_1.messages)
+            with stage("agent.invoke", agent="weather"):
+                chat_result = await self.chat_completion_service.get_chat_message_content(
+                    chat_history=chat_history_1,
+                    arguments=kernel_arguments, 
+                    settings=self.agent_factory.execution_settings,
+                    kernel=self.kernel)  
+            # Tool calling turns are added to the history, each with its own usage
+            for message in chat_history_1.messages[message_count:] + [chat_result]:
+                metrics.add_usage(message.metadata)
+            chat_history_1.add_message(chat_result)
+        metrics.finish()
+
+        request_result = RequestResult(
+            content=f"{chat_result}",
+            execution_diagnostics=ExecutionDiagnostics(steps=kernel_arguments ["diagnostics"]),
+            thread_id=request.thread_id)
+
+        forecast_expiry = kernel_arguments ["forecast_expiry"]
+        return request_result, min(forecast_expiry) - time.monotonic() if forecast_expiry else None
         
     async def run_weather_agent(self, request: ChatThreadRequest) -> str:
 
         # Define a list to hold callback message content
         intermediate_steps: list[str] = []
 
+        metrics = AgentRunMetrics("weather")
+
         # Define an async method to handle the `on_intermediate_message` callback
         async def handle_intermediate_steps(message: ChatMessageContent) -> None:
+            metrics.add_usage(message.metadata)
             if any(isinstance(item, FunctionCallContent) for item in message.items):
                 for fcc in message.items:
                   if isinstance(fcc, FunctionCallContent):
@@ -114,35 +339,134 @@ class WeatherAgentService:
             if not request.message:
                 raise ValueError("No messages found in request.")
             user_message = request.message
-            system_message = self.file_service.read_file('WeatherSystemPrompt.txt')
-
-            settings=PromptExecutionSettings(
-                function_choice_behavior=FunctionChoiceBehavior.Auto(filters={"included_plugins": ["weather"]}),
-            )
-            kernel_arguments = KernelArguments(settings=settings)
-            kernel_arguments ["diagnostics"] = []
-
-            agent = ChatCompletionAgent(
-                kernel=self.kernel, 
-                name="WeatherAgent", 
-                instructions=system_message,
-                arguments=kernel_arguments
-            )
+            with stage("agent.get_agent", agent="weather"):
+                agent = self.agent_factory.get_agent()
+            kernel_arguments = self.agent_factory.request_arguments()
             
+            # Continue the stored conversation, or start a new one the client can continue
+            thread_id = request.thread_id or await thread_store.create()
+
             # Iterate over the async generator to get the final response
             response = None
-            thread = None
-            
-            async for result in agent.invoke(messages=user_message, thread=thread, on_intermediate_message=handle_intermediate_steps):
-                response = result
-                thread = response.thread
+            async with thread_store.open(thread_id) as history:
+                thread = ChatHistoryAgentThread(chat_history=history, thread_id=thread_id)
+                with stage("agent.invoke", agent="weather"):
+                    async for result in agent.invoke(messages=user_message, thread=thread, on_intermediate_message=handle_intermediate_steps, arguments=kernel_arguments):
+                        response = result
+                        thread = response.thread
+                        metrics.add_usage(result.message.metadata)
 
-            if response is None:
-                raise ValueError("No response received from the agent.")
+                if response is None:
+                    raise ValueError("No response received from the agent.")
+            metrics.finish()
 
             request_result = RequestResult(
                 content=f"{response}",
                 execution_diagnostics=ExecutionDiagnostics(steps=kernel_arguments ["diagnostics"]),
-                intermediate_steps = intermediate_steps)
+                intermediate_steps = intermediate_steps,
+                thread_id=thread_id)
+
+            return request_result
+
+    async def stream_weather(self, request: ChatRequest) -> AsyncIterator[StreamEvent]:
+        """
+        Streaming counterpart of run_weather: yields tool call events and token
+        deltas as they happen, then a final "done" event with the RequestResult.
+        """
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("Agent: Weather") as current_span:
+            # Validate the request object
+            if not request.messages:
+                raise ValueError("No messages found in request.")
+
+            events: asyncio.Queue = asyncio.Queue()
+            kernel_arguments = self.agent_factory.request_arguments(events)
+
+            content: list[str] = []
+            metrics = AgentRunMetrics("weather")
+            async with self.conversation(request) as chat_history_1:
+                async def produce() -> None:
+                    try:
+                        with stage("agent.invoke", agent="weather"):
+                            async for chunks in self.chat_completion_service.get_streaming_chat_message_contents(
+                                chat_history=chat_history_1,
+                                arguments=kernel_arguments,
+                                settings=self.agent_factory.execution_settings,
+                                kernel=self.kernel):
+                                for chunk in chunks:
+                                    metrics.add_usage(chunk.metadata)
+                                    if chunk.content:
+                                        metrics.token()
+                                        content.append(chunk.content)
+                                        await events.put(StreamEvent(event="delta", data=chunk.content))
+                    finally:
+                        await events.put(None)
+
+                async for event in drain_events(events, produce()):
+                    yield event
+                chat_history_1.add_assistant_message("".join(content))
+            metrics.finish()
+
+            request_result = RequestResult(
+                content="".join(content),
+                execution_diagnostics=ExecutionDiagnostics(steps=kernel_arguments ["diagnostics"]),
+                thread_id=request.thread_id)
+
+            yield StreamEvent(event="done", data=request_result)
+
+    async def stream_weather_agent(self, request: ChatThreadRequest) -> AsyncIterator[StreamEvent]:
+        """
+        Streaming counterpart of run_weather_agent.
+        """
+        intermediate_steps: list[str] = []
+        metrics = AgentRunMetrics("weather")
+
+        async def handle_intermediate_steps(message: ChatMessageContent) -> None:
+            metrics.add_usage(message.metadata)
+            if any(isinstance(item, FunctionCallContent) for item in message.items):
+                for fcc in message.items:
+                  if isinstance(fcc, FunctionCallContent):
+                      intermediate_steps.append(f"Function Call: {fcc.name} with arguments: {fcc.arguments}")
+
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("Agent: Weather") as current_span:
+            # Validate the request object
+            if not request.message:
+                raise ValueError("No messages found in request.")
+            user_message = request.message
+            with stage("agent.get_agent", agent="weather"):
+                agent = self.agent_factory.get_agent()
+            events: asyncio.Queue = asyncio.Queue()
+            kernel_arguments = self.agent_factory.request_arguments(events)
+
+            thread_id = request.thread_id or await thread_store.create()
+
+            content: list[str] = []
+            async with thread_store.open(thread_id) as history:
+                thread = ChatHistoryAgentThread(chat_history=history, thread_id=thread_id)
+                async def produce() -> None:
+                    nonlocal thread
+                    try:
+                        with stage("agent.invoke", agent="weather"):
+                            async for result in agent.invoke_stream(messages=user_message, thread=thread, on_intermediate_message=handle_intermediate_steps, arguments=kernel_arguments):
+                                thread = result.thread
+                                metrics.add_usage(result.message.metadata)
+                                # AgentResponseItem.content is the message; its text is on message.content
+                                if result.message.content:
+                                    metrics.token()
+                                    content.append(result.message.content)
+                                    await events.put(StreamEvent(event="delta", data=result.message.content))
+                    finally:
+                        await events.put(None)
+
+                async for event in drain_events(events, produce()):
+                    yield event
+            metrics.finish()
+
+            request_result = RequestResult(
+                content="".join(content),
+                execution_diagnostics=ExecutionDiagnostics(steps=kernel_arguments ["diagnostics"]),
+                intermediate_steps = intermediate_steps,
+                thread_id=thread_id)
 
-            return request_result
\ No newline at end of file
+            yield StreamEvent(event="done", data=request_result)
@@ -1,18 +1,95 @@
-import requests
 import json
+import time
+import asyncio
 import datetime
+from email.utils import parsedate_to_datetime
 from typing import Annotated
 from semantic_kernel.functions.kernel_function_decorator import kernel_function
 from dataclasses import dataclass
 from semantic_kernel.kernel import Kernel
 from semantic_kernel.functions.kernel_arguments import KernelArguments
 from app.models.api_models import ExecutionStep
+from app.config.settings import settings
+from app.utils.http_client import get_with_retry
+from app.utils.cache import AsyncTTLCache, CacheCodec
+from app.utils.cache_backend import get_cache_backend
+from app.services.geocoder import get_gazetteer, normalize_location
+from app.services.forecast import ForecastPayload, build_forecast_payload
+from app.utils.telemetry import elapsed_ms, stage
 
 @dataclass
 class LocationPoint:
     Latitude: float
     Longitude: float
 
+def encode_forecast(forecast: ForecastPayload) -> str:
+    # Deadlines are monotonic, so the shared copy carries the remaining lifetime
+    return json.dumps({"projected": forecast.projected, "raw": forecast.raw, "expires_in": forecast.expires_at - time.monotonic()})
+
+def decode_forecast(value: str) -> ForecastPayload:
+    stored = json.loads(value)
+    return ForecastPayload(projected=stored["projected"], raw=stored["raw"], expires_at=time.monotonic() + stored["expires_in"])
+
+def encode_location(location: tuple[LocationPoint, str]) -> str:
+    point, source = location
+    return json.dumps([point.Latitude, point.Longitude, source])
+
+def decode_location(value: str) -> tuple[LocationPoint, str]:
+    latitude, longitude, source = json.loads(value)
+    return LocationPoint(Latitude=latitude, Longitude=longitude), source
+
+# Points lookups (rounded coordinates -> forecast URL) practically never change
+points_cache = AsyncTTLCache(
+    "weather.points",
+    max_size=settings.WEATHER_POINTS_CACHE_MAX_SIZE,
+    ttl_seconds=settings.WEATHER_POINTS_CACHE_TTL_SECONDS,
+    backend=get_cache_backend())
+
+# Projected forecasts keyed by forecast URL, i.e. by grid point
+forecast_cache = AsyncTTLCache(
+    "weather.forecast",
+    max_size=settings.WEATHER_FORECAST_CACHE_MAX_SIZE,
+    ttl_seconds=settings.WEATHER_FORECAST_CACHE_TTL_SECONDS,
+    stale_seconds=settings.WEATHER_FORECAST_CACHE_STALE_SECONDS,
+    backend=get_cache_backend(),
+    codec=CacheCodec(encode_forecast, decode_forecast))
+
+# Resolved locations keyed by normalized location string
+geocode_cache = AsyncTTLCache(
+    "weather.geocode",
+    max_size=settings.GEOCODER_CACHE_SIZE,
+    ttl_seconds=settings.GEOCODER_CACHE_TTL_SECONDS,
+    backend=get_cache_backend(),
+    codec=CacheCodec(encode_location, decode_location))
+
+def response_ttl(response) -> float | None:
+    """
+    Returns the freshness lifetime declared by the Cache-Control or Expires headers,
+    or None when the response does not declare one.
+    """
+    cache_control = response.headers.get("cache-control", "")
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        name = name.lower()
+        if name in ("no-store", "no-cache"):
+            return 0
+        if name in ("s-maxage", "max-age"):
+            try:
+                return max(0.0, float(value) - float(response.headers.get("age", 0)))
+            except ValueError:
+                continue
+
+    expires = response.headers.get("expires")
+    if expires:
+        try:
+            expires_at = parsedate_to_datetime(expires)
+            date_header = response.headers.get("date")
+            now = parsedate_to_datetime(date_header) if date_header else datetime.datetime.now(datetime.timezone.utc)
+            return max(0.0, (expires_at - now).total_seconds())
+        except (TypeError, ValueError):
+            return 0
+    return None
+
 class WeatherPlugin:
     def __init__(self, kernel: Kernel):
         self.kernel = kernel
@@ -20,42 +97,90 @@ class WeatherPlugin:
     @kernel_function(name="get_weather_for_latitude_longitude", description="get the weather for a latitude and longitude GeoPoint")
     async def get_weather_for_latitude_longitude(self, arguments: Annotated[KernelArguments, {"include_in_function_choices": False}], latitude: Annotated[str, "The location GeoPoint latitude"], longitude: Annotated[str, "The location GeoPoint longitude"]) -> Annotated[str, "The output is a string"]:
         start_time = datetime.datetime.now().isoformat()
-        url = f"https://api.weather.gov/points/{latitude},{longitude}"
-        headers = {"User-Agent": "app"}
+        start = time.perf_counter()
+        precision = settings.WEATHER_POINTS_CACHE_PRECISION
+        point = (round(float(latitude), precision), round(float(longitude), precision))
+        headers = {"User-Agent": settings.WEATHER_API_USER_AGENT}
+
+        async def load_forecast_url():
+            with stage("weather.points_lookup"):
+                response = await get_with_retry(f"{settings.WEATHER_API_BASE_URL}/points/{point[0]},{point[1]}", headers=headers)
+            return response.json()["properties"]["forecast"], None
+
+        forecast_url = await points_cache.get_or_load(point, load_forecast_url)
 
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        json_response = response.json()
-        forecast_url = json_response["properties"]["forecast"]
+        async def load_forecast():
+            with stage("weather.forecast_fetch"):
+                forecast_response = await get_with_retry(forecast_url, headers=headers)
+            # Parse and project once per fetch; cache hits reuse the compact form
+            ttl = response_ttl(forecast_response)
+            return build_forecast_payload(forecast_response.text, ttl), ttl
 
-        forecast_response = requests.get(forecast_url, headers=headers)
-        forecast_response.raise_for_status()
-        forecast_response_body = forecast_response.text
+        forecast = await forecast_cache.get_or_load(forecast_url, load_forecast)
+        # Answers based on this forecast are only as fresh as the forecast itself
+        if "forecast_expiry" in arguments:
+            arguments["forecast_expiry"].append(forecast.expires_at)
 
         end_time = datetime.datetime.now().isoformat()
         # Add the diagnostic result to the arguments
-        diagnostic_result = ExecutionStep(name="get_weather_for_latitude_longitude", content=forecast_response_body, start_time=start_time, end_time=end_time)
+        diagnostic_result = ExecutionStep(name="get_weather_for_latitude_longitude", content=forecast.raw or forecast.projected, start_time=start_time, end_time=end_time, duration_ms=elapsed_ms(start))
         arguments["diagnostics"].append(diagnostic_result)
 
-        return forecast_response_body
+        return forecast.projected
             
     @kernel_function(name="get_lat_long", description="Get a latitude and longitude GeoPoint for the provided city or postal code.")
     async def determine_lat_long_async(self, arguments: Annotated[KernelArguments, {"include_in_function_choices": False}], location: Annotated[str, "A location string as a city and state or postal code"]) -> Annotated[LocationPoint, "The location GeoPoint"]:
         start_time = datetime.datetime.now().isoformat()
+        start = time.perf_counter()
+
+        async def load_location():
+            # Resolve against the offline gazetteer first and only ask the LLM for unknown places
+            match = get_gazetteer().lookup(location)
+            if match:
+                return (LocationPoint(Latitude=match.latitude, Longitude=match.longitude), f"gazetteer:{match.match}"), None
+            with stage("weather.geocode_llm"):
+                return (await self._determine_lat_long_llm(location), "llm"), None
+
+        point, source = await geocode_cache.get_or_load(normalize_location(location), load_location)
+
+        end_time = datetime.datetime.now().isoformat()
+        # Add the diagnostic result to the arguments
+        json_data = {"Latitude": point.Latitude, "Longitude": point.Longitude, "Source": source}
+        diagnostic_result = ExecutionStep(name="get_lat_long", content=json_data, start_time=start_time, end_time=end_time, duration_ms=elapsed_ms(start))
+        arguments["diagnostics"].append(diagnostic_result)
+
+        return point
+
+    @kernel_function(name="get_weather_for_locations", description="Get the weather for several cities or postal codes at once. Use this instead of get_lat_long and get_weather_for_latitude_longitude when the user asks about more than one place.")
+    async def get_weather_for_locations(self, arguments: Annotated[KernelArguments, {"include_in_function_choices": False}], locations: Annotated[list[str], "The locations, each a city and state or postal code"]) -> Annotated[str, "A JSON list with the coordinates and forecast of each location"]:
+        # Geocode and fetch every location concurrently, so N places cost about one round trip
+        semaphore = asyncio.Semaphore(settings.WEATHER_TOOL_CONCURRENCY)
+        unique_locations = list({normalize_location(location): location for location in locations}.values())
+
+        async def fetch(location: str) -> dict:
+            async with semaphore:
+                try:
+                    point = await self.determine_lat_long_async(arguments, location)
+                    forecast = await self.get_weather_for_latitude_longitude(arguments, str(point.Latitude), str(point.Longitude))
+                except Exception as e:
+                    return {"location": location, "error": str(e)}
+            try:
+                forecast = json.loads(forecast)
+            except ValueError:
+                pass
+            return {"location": location, "latitude": point.Latitude, "longitude": point.Longitude, "forecast": forecast}
+
+        results = await asyncio.gather(*(fetch(location) for location in unique_locations[:settings.WEATHER_MAX_BATCH_LOCATIONS]))
+        return json.dumps(results, separators=(",", ":"), ensure_ascii=False)
+
+    async def _determine_lat_long_llm(self, location: str) -> LocationPoint:
         # Use the LLM get the latitude and longitude
         result = await self.kernel.invoke_prompt(f"What is the geopoint for: {location}. Return the result as a JSON object with Latitude and Longitude properties: {{\"Latitude\": 0.0, \"Longitude\": 0.0}}. Only return the JSON.", max_tokens=100)
-        
+
         # Parse the result to extract the JSON object
-        json_result  = f"{result}".strip("'")
+        json_result  = f"{result}".strip().strip("'").strip("`").removeprefix("json").strip()
         json_data = json.loads(json_result)
-        location = LocationPoint(
+        return LocationPoint(
             Latitude=json_data["Latitude"],
             Longitude=json_data["Longitude"]
         )
-
-        end_time = datetime.datetime.now().isoformat()
-        # Add the diagnostic result to the arguments
-        diagnostic_result = ExecutionStep(name="get_lat_long", content=json_data, start_time=start_time, end_time=end_time)
-        arguments["diagnostics"].append(diagnostic_result)
-
-        return location
\ No newline at end of file
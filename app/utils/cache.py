@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from opentelemetry import metrics
+
+if TYPE_CHECKING:
+    from app.utils.cache_backend import SqliteCacheBackend
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+cache_hits = meter.create_counter("app.cache.hits", description="Cache lookups served from a fresh entry")
+cache_stale_hits = meter.create_counter("app.cache.stale_hits", description="Cache lookups served from a stale entry while it is revalidated")
+cache_misses = meter.create_counter("app.cache.misses", description="Cache lookups that required a load")
+cache_coalesced = meter.create_counter("app.cache.coalesced", description="Cache loads joined onto an in-flight load for the same key")
+cache_evictions = meter.create_counter("app.cache.evictions", description="Entries evicted to honor the cache size bound")
+cache_shared_hits = meter.create_counter("app.cache.shared_hits", description="Cache misses served from the store shared by the worker processes")
+
+# A loader returns the value together with its time to live in seconds (None uses the cache default)
+Loader = Callable[[], Awaitable[Tuple[Any, Optional[float]]]]
+
+@dataclass
+class CacheCodec:
+    """
+    Converts cached values to and from the strings kept in a shared backend.
+    """
+    encode: Callable[[Any], str] = json.dumps
+    decode: Callable[[str], Any] = json.loads
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    stale_until: float
+
+class AsyncTTLCache:
+    """
+    A bounded LRU cache for async loaders with per-entry TTL, stale-while-revalidate
+    and request coalescing: concurrent misses for the same key share a single load.
+
+    With a backend, loads first look for an entry another worker process stored
+    and store what they load, so every worker benefits from each upstream call.
+    The in-process LRU stays in front of the backend; set() and invalidate()
+    only affect this process.
+    """
+    def __init__(self, name: str, max_size: int, ttl_seconds: float, stale_seconds: float = 0,
+                 backend: Optional["SqliteCacheBackend"] = None, codec: Optional[CacheCodec] = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.backend = backend
+        self.codec = codec or CacheCodec()
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._attributes = {"cache": name}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            self._entries.pop(key, None)
+            return
+        now = time.monotonic()
+        self._entries[key] = CacheEntry(value=value, expires_at=now + ttl, stale_until=now + ttl + self.stale_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            cache_evictions.add(1, self._attributes)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Loader) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.expires_at:
+                self._entries.move_to_end(key)
+                cache_hits.add(1, self._attributes)
+                return entry.value
+            if now < entry.stale_until:
+                # Serve the stale value and refresh it in the background
+                self._entries.move_to_end(key)
+                cache_stale_hits.add(1, self._attributes)
+                self._load(key, loader)
+                return entry.value
+            del self._entries[key]
+
+        cache_misses.add(1, self._attributes)
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Loader) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            cache_coalesced.add(1, self._attributes)
+            return task
+
+        async def run() -> Any:
+            shared = await self._get_shared(key)
+            if shared is not None:
+                value, ttl = shared
+                cache_shared_hits.add(1, self._attributes)
+            else:
+                value, ttl = await loader()
+            self.set(key, value, ttl)
+            if shared is None:
+                await self._set_shared(key, value, ttl)
+            return value
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._load_done(key, t))
+        return task
+
+    def _load_done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Cache '%s' load failed for %r: %s", self.name, key, task.exception())
+
+    async def _get_shared(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        if self.backend is None:
+            return None
+        try:
+            stored = await asyncio.to_thread(self.backend.get, self.name, json.dumps(key))
+            return (self.codec.decode(stored[0]), stored[1]) if stored else None
+        except Exception as e:
+            # The shared store only saves upstream calls; loading still works without it
+            logger.warning("Cache '%s' could not read the shared store: %s", self.name, e)
+            return None
+
+    async def _set_shared(self, key: Hashable, value: Any, ttl_seconds: Optional[float]) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if self.backend is None or ttl <= 0:
+            return
+        try:
+            await asyncio.to_thread(self.backend.set, self.name, json.dumps(key), self.codec.encode(value), ttl)
+        except Exception as e:
+            logger.warning("Cache '%s' could not write the shared store: %s", self.name, e)
@@ -0,0 +1,158 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import cache
+from typing import Optional
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class SqliteStore:
+    """
+    Base for SQLite stores shared by the worker processes of a node. The database
+    runs in WAL mode so readers in one worker do not block a writer in another.
+    The connection is opened on first use in each process, and reopened after a
+    fork, so a store created in the gunicorn master before it forks its workers
+    never shares a connection across processes.
+    """
+    SCHEMA = ""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        The connection of the current process. Use it while holding self._lock.
+        """
+        if self._pid != os.getpid():
+            # A connection inherited from the parent is dropped without closing it,
+            # which would disturb the parent's locks
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(self.SCHEMA)
+            self._upgrade(self._connection)
+            self._pid = os.getpid()
+        return self._connection
+
+    def _upgrade(self, connection: sqlite3.Connection) -> None:
+        """
+        Brings a database created by an earlier version up to SCHEMA.
+        """
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._pid = None
+
+class SqliteCacheBackend(SqliteStore):
+    """
+    Cache entries shared by the workers of a node: serialized values by cache
+    name and key, with a wall-clock expiry. get/set/delete with a TTL map
+    one-to-one onto a Redis-compatible store should the cache need to span nodes.
+
+    Also holds generation counters, which workers compare to drop caches that
+    another worker invalidated, and leases, which let one worker at a time run
+    work that must not run in parallel (INCR and SET NX PX in Redis terms).
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE INDEX IF NOT EXISTS cache_entries_expires_at ON cache_entries (expires_at);
+    CREATE TABLE IF NOT EXISTS generations (
+        namespace TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    """
+    # Expired rows are purged every this many writes
+    PURGE_INTERVAL = 1000
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._writes = 0
+
+    def get(self, namespace: str, key: str) -> Optional[tuple[str, float]]:
+        """
+        Returns the value and its remaining time to live, or None when missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, now)).fetchone()
+        return (row[0], row[1] - now) if row else None
+
+    def set(self, namespace: str, key: str, value: str, ttl_seconds: float) -> None:
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, now + ttl_seconds))
+            self._writes += 1
+            if self._writes % self.PURGE_INTERVAL == 0:
+                self.connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self.connection.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def generation(self, namespace: str) -> int:
+        with self._lock:
+            row = self.connection.execute("SELECT generation FROM generations WHERE namespace = ?", (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def increment_generation(self, namespace: str) -> int:
+        with self._lock:
+            return self.connection.execute(
+                "INSERT INTO generations (namespace, generation) VALUES (?, 1) "
+                "ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1 RETURNING generation",
+                (namespace,)).fetchone()[0]
+
+    def acquire_lease(self, name: str, owner: str, ttl_seconds: float) -> bool:
+        """
+        Takes or renews the named lease for owner until ttl_seconds from now. Returns
+        False while another owner holds an unexpired lease.
+        """
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at <= ? RETURNING owner",
+                (name, owner, now + ttl_seconds, now)).fetchone()
+        return row is not None
+
+@cache
+def get_cache_backend() -> Optional[SqliteCacheBackend]:
+    """
+    Returns the store shared by the worker processes, or None when caches are
+    kept in process memory only (CACHE_BACKEND=memory, the default for a single worker).
+    """
+    if settings.CACHE_BACKEND == "memory":
+        return None
+    if settings.CACHE_BACKEND != "sqlite":
+        raise ValueError(f"Unknown CACHE_BACKEND '{settings.CACHE_BACKEND}'; expected memory or sqlite.")
+    logger.info("Sharing caches between workers through %s", settings.CACHE_PATH)
+    return SqliteCacheBackend(settings.CACHE_PATH)
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from types import FrameType
+from typing import Optional
+
+from opentelemetry import metrics
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+
+loop_lag = meter.create_histogram("app.event_loop.lag", unit="s", description="How late the event loop ran a timer callback")
+loop_blocked = meter.create_counter("app.event_loop.blocked", description="Times the event loop was blocked for longer than the slow callback threshold")
+
+class EventLoopMonitor:
+    """
+    Measures event loop lag with a timer that should fire every interval_ms and
+    records how late it ran. A watchdog thread checks that the timer keeps
+    firing; when the loop has not run it for slow_ms, the stack of the loop
+    thread is logged while it is still blocked, which points at the blocking
+    call rather than the coroutine that made it. Each stall is logged once.
+    """
+    def __init__(self, interval_ms: float, slow_ms: float):
+        self.interval = interval_ms / 1000
+        self.slow = slow_ms / 1000
+        self.loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._stopped = threading.Event()
+
+    async def run(self) -> None:
+        self.loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        watchdog = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                start = time.monotonic()
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                loop_lag.record(max(0.0, now - start - self.interval))
+                self._heartbeat = now
+        finally:
+            self._stopped.set()
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopped.wait(max(self.slow / 2, 0.01)):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.slow or reported == heartbeat:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            loop_blocked.add(1)
+            logger.warning("Event loop blocked for at least %.0fms:\n%s", blocked * 1000, stack,
+                           extra={"blocked_ms": round(blocked * 1000, 1)})
+
+class ProfilerBusyError(Exception):
+    pass
+
+def _folded(thread_name: str, frame: Optional[FrameType]) -> str:
+    functions = []
+    while frame is not None:
+        code = frame.f_code
+        functions.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join([thread_name] + functions[::-1])
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the running threads at a fixed interval, like py-spy
+    but from inside the process. The result is in the folded format read by
+    flamegraph.pl and speedscope: one line per distinct stack, root first,
+    followed by the number of samples it was seen in. One profile runs at a time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval_ms: float, thread_ids: Optional[set[int]] = None) -> str:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running.")
+        try:
+            stacks = self._sample(seconds, interval_ms / 1000, thread_ids)
+        finally:
+            self._lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def _sample(self, seconds: float, interval: float, thread_ids: Optional[set[int]]) -> Counter[str]:
+        stacks: Counter[str] = Counter()
+        own_thread_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id or (thread_ids is not None and thread_id not in thread_ids):
+                    continue
+                stacks[_folded(names.get(thread_id, str(thread_id)), frame)] += 1
+            time.sleep(interval)
+        return stacks
+
+profiler = SamplingProfiler()
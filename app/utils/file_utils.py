@@ -1,18 +1,32 @@
 import os
-import uuid
+import socket
+import asyncio
+import logging
 import base64
+import tempfile
 import mimetypes
-from typing import Tuple, Optional, Any
+from typing import TYPE_CHECKING, Optional, Any
 
-from azure.storage.blob import BlobServiceClient
-from azure.ai.projects import AIProjectClient
 from azure.ai.agents.models import FilePurpose
-from azure.identity import DefaultAzureCredential
 
 from semantic_kernel.contents import ChatMessageContent, ImageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
 
-async def download_and_process_file(blob_service_client: BlobServiceClient, file_name: str) -> Tuple[Optional[bytes], Any]:
+from app.services.azure_clients import azure_clients
+from app.config.settings import settings
+from app.services.file_index import IndexedFile, get_file_index
+from app.utils.cache_backend import get_cache_backend
+from app.utils.telemetry import stage
+
+if TYPE_CHECKING:
+    from azure.storage.blob import BlobServiceClient
+
+logger = logging.getLogger(__name__)
+
+# Lease in the shared cache backend held by the one worker running the orphaned file cleanup
+FILE_CLEANUP_LEASE = "file_cleanup"
+
+async def download_and_process_file(blob_service_client: "BlobServiceClient", file_name: str) -> Any:
     """
     Downloads a file from blob storage and processes it for AI Project service.
     
@@ -21,41 +35,124 @@ async def download_and_process_file(blob_service_client: BlobServiceClient, file
         file_name: Name of the file to download and process
         
     Returns:
-        tuple: (file_content, ai_project_file) where file_content is the binary content
-              and ai_project_file is the reference to the uploaded file in AI Project service
+        The reference to the uploaded file in AI Project service, or None on error
     """
-    file_content = None
-    ai_project_file = None
-    temp_file_path = None
-    
     try:
-        # Get the blob container name from environment variables
+        # The blob and project SDK calls are synchronous, so keep them off the event loop
+        return await asyncio.to_thread(stream_blob_to_project, blob_service_client, file_name)
+    except Exception as e:
+        logger.exception("Error processing file '%s': %s", file_name, e)
+        # Continue without the file if there's an error
+        return None
+
+def stream_blob_to_project(blob_service_client: "BlobServiceClient", file_name: str) -> Any:
+    """
+    Streams a blob into a spooled temporary file and uploads it from there. The
+    file stays in memory up to FILE_UPLOAD_MEMORY_LIMIT_BYTES and rolls over to
+    FILE_UPLOAD_TEMP_DIR beyond that; the blob is downloaded in concurrent chunks.
+    """
+    # Get the blob container name from environment variables
+    blob_container_name = os.getenv("AZURE_BLOB_CONTAINER_NAME")
+    blob_client = blob_service_client.get_blob_client(container=blob_container_name, blob=file_name)
+
+    with tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MEMORY_LIMIT_BYTES, dir=settings.FILE_UPLOAD_TEMP_DIR) as spool:
+        with stage("blob.download") as span:
+            download_stream = blob_client.download_blob(max_concurrency=settings.BLOB_DOWNLOAD_CONCURRENCY)
+            size = download_stream.readinto(spool)
+            span.set_attribute("app.file.size_bytes", size)
+        logger.info("Downloaded file '%s' from blob storage (%d bytes)", file_name, size)
+
+        # Upload the file through the shared AI Project client
+        spool.seek(0)
+        project_client = azure_clients.project_client
+        with stage("file.upload"):
+            ai_project_file = project_client.agents.files.upload_and_poll(file=spool, filename=os.path.basename(file_name), purpose=FilePurpose.AGENTS)
+        logger.info("Uploaded file '%s' to AI Project service with ID %s", file_name, ai_project_file.id)
+
+    return ai_project_file
+
+async def get_or_upload_file(blob_service_client: "BlobServiceClient", file_name: str) -> Optional[IndexedFile]:
+    """
+    Returns the AI project file (and vector store, if one was created) for a blob,
+    uploading it only when the same blob version or content has not been uploaded before.
+    """
+    file_index = get_file_index()
+    if file_index is None:
+        ai_project_file = await download_and_process_file(blob_service_client, file_name)
+        return IndexedFile(blob_name=file_name, etag="", content_md5=None, file_id=ai_project_file.id) if ai_project_file else None
+
+    try:
         blob_container_name = os.getenv("AZURE_BLOB_CONTAINER_NAME")
         blob_client = blob_service_client.get_blob_client(container=blob_container_name, blob=file_name)
-        download_stream = blob_client.download_blob()
-        file_content = download_stream.readall()
-        print(f"Downloaded file '{file_name}' from blob storage")
-        
-        # Create a temporary file to upload to AI Project service
-        temp_file_path = f"./temp_{uuid.uuid4()}{os.path.splitext(file_name)[1]}"
-        with open(temp_file_path, "wb") as f:
-            f.write(file_content)
-        
-
-        # Create an AI Project client and upload the file
-        project_client = AIProjectClient(credential=DefaultAzureCredential(), endpoint=os.environ["AZURE_AI_AGENT_ENDPOINT"])
-        ai_project_file = project_client.agents.files.upload_and_poll(file_path=temp_file_path, purpose=FilePurpose.AGENTS)
-        print(f"Uploaded file to AI Project service with ID: {ai_project_file.id}")
-        
+        properties = await asyncio.to_thread(blob_client.get_blob_properties)
     except Exception as e:
-        print(f"Error processing file: {e}")
-        # Continue without the file if there's an error
-    finally:
-        # Clean up the temporary file if it was created
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-            
-    return file_content, ai_project_file
+        logger.warning("Error reading blob properties of '%s': %s", file_name, e)
+        return None
+
+    content_md5 = properties.content_settings.content_md5
+    content_md5 = bytes(content_md5).hex() if content_md5 else None
+    indexed_file = await asyncio.to_thread(file_index.lookup, file_name, properties.etag, content_md5)
+    if indexed_file:
+        logger.info("Reusing uploaded file %s for '%s'", indexed_file.file_id, file_name)
+        return indexed_file
+
+    ai_project_file = await download_and_process_file(blob_service_client, file_name)
+    if ai_project_file is None:
+        return None
+    return await asyncio.to_thread(file_index.record_file, file_name, properties.etag, content_md5, ai_project_file.id)
+
+async def cleanup_orphaned_files() -> int:
+    """
+    Deletes the vector stores of threads not used within the retention period,
+    then uploaded files and vector stores that no thread has referenced within
+    it. Returns the number of index entries removed.
+    """
+    file_index = get_file_index()
+    if file_index is None:
+        return 0
+
+    removed = 0
+    agents_client = azure_clients.agent_client.agents
+    for vector_store_id in await asyncio.to_thread(file_index.orphaned_thread_vector_stores, settings.FILE_INDEX_RETENTION_SECONDS):
+        try:
+            await agents_client.vector_stores.delete(vector_store_id)
+        except Exception as e:
+            logger.warning("Error deleting orphaned thread vector store %s: %s", vector_store_id, e)
+            continue
+        await asyncio.to_thread(file_index.delete_thread_vector_store, vector_store_id)
+        removed += 1
+    for indexed_file in await asyncio.to_thread(file_index.orphaned, settings.FILE_INDEX_RETENTION_SECONDS):
+        try:
+            if indexed_file.vector_store_id:
+                await agents_client.vector_stores.delete(indexed_file.vector_store_id)
+            await agents_client.files.delete(indexed_file.file_id)
+        except Exception as e:
+            logger.warning("Error deleting orphaned file %s: %s", indexed_file.file_id, e)
+            continue
+        await asyncio.to_thread(file_index.delete, indexed_file)
+        removed += 1
+    return removed
+
+async def run_file_cleanup() -> None:
+    """
+    Periodically removes orphaned files; started from the FastAPI lifespan of
+    every worker. With a shared cache backend only the worker holding the
+    cleanup lease runs it; the lease outlives two intervals, so another worker
+    takes over once the holder stops renewing it.
+    """
+    backend = get_cache_backend()
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        await asyncio.sleep(settings.FILE_INDEX_CLEANUP_INTERVAL_SECONDS)
+        try:
+            if backend is not None and not await asyncio.to_thread(
+                    backend.acquire_lease, FILE_CLEANUP_LEASE, owner, 2 * settings.FILE_INDEX_CLEANUP_INTERVAL_SECONDS):
+                continue
+            removed = await cleanup_orphaned_files()
+            if removed:
+                logger.info("Removed %d orphaned uploaded files", removed)
+        except Exception as e:
+            logger.exception("Error cleaning up orphaned files: %s", e)
 
 def create_chat_message_content(user_message: str, file_content=None, file_name=None, ai_project_file=None) -> ChatMessageContent:
     """
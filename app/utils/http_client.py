@@ -0,0 +1,66 @@
+import asyncio
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config.settings import settings
+from app.utils.rate_limit import retry_delay
+
+# Process-wide client, created lazily on first use and closed from the FastAPI lifespan
+_client: Optional[httpx.AsyncClient] = None
+_host_limits: dict[str, asyncio.Semaphore] = {}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared pooled async HTTP client, creating it on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(settings.HTTP_TIMEOUT_SECONDS, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS),
+            follow_redirects=True,
+        )
+    return _client
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_limits.clear()
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    semaphore = _host_limits.get(host)
+    if semaphore is None:
+        semaphore = _host_limits[host] = asyncio.Semaphore(settings.HTTP_MAX_CONNECTIONS_PER_HOST)
+    return semaphore
+
+async def get_with_retry(url: str, headers: Optional[dict] = None) -> httpx.Response:
+    """
+    Issues a GET on the shared client, retrying transport errors and retryable
+    status codes with exponential backoff. Raises for the final non-2xx response.
+    """
+    client = get_http_client()
+    attempt = 0
+    while True:
+        response = None
+        try:
+            async with _host_limit(url):
+                response = await client.get(url, headers=headers)
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= settings.HTTP_MAX_RETRIES:
+                response.raise_for_status()
+                return response
+        except httpx.TransportError:
+            if attempt >= settings.HTTP_MAX_RETRIES:
+                raise
+        await asyncio.sleep(retry_delay(attempt, response.headers if response is not None else None, settings.HTTP_RETRY_BACKOFF_SECONDS))
+        attempt += 1
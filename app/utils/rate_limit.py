@@ -0,0 +1,198 @@
+import asyncio
+import json
+import random
+import time
+from functools import cache
+from typing import Mapping, Optional
+
+import httpx
+from azure.core.pipeline import PipelineRequest, PipelineResponse
+from azure.core.pipeline.policies import AsyncHTTPPolicy
+from opentelemetry import metrics
+
+from app.config.settings import settings
+
+meter = metrics.get_meter(__name__)
+
+queue_depth = meter.create_up_down_counter("app.ratelimit.queue_depth", description="Requests waiting for rate limit admission")
+throttle_wait = meter.create_histogram("app.ratelimit.wait_time", unit="s", description="Time requests waited for rate limit admission")
+throttled = meter.create_counter("app.ratelimit.throttled", description="Responses throttled by the upstream (429)")
+retries = meter.create_counter("app.ratelimit.retries", description="Requests retried after a throttled or unavailable response")
+
+RETRY_STATUS_CODES = {429, 503}
+
+def retry_delay(attempt: int, headers: Optional[Mapping[str, str]], backoff_seconds: float) -> float:
+    """
+    Returns the server-requested delay (retry-after-ms / retry-after) or an
+    exponential backoff with full jitter.
+    """
+    if headers is not None:
+        for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+            value = headers.get(header)
+            if value:
+                try:
+                    return float(value) * scale
+                except ValueError:
+                    pass
+    backoff = backoff_seconds * (2 ** attempt)
+    return backoff + random.uniform(0, backoff)
+
+class TokenBucket:
+    """
+    A token bucket refilled continuously at a per-minute rate. A rate of 0 disables it.
+    Waiters are served in arrival order.
+    """
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def limit_to(self, remaining: float) -> None:
+        """
+        Lowers the available tokens to what the upstream reports as remaining.
+        """
+        if self.per_minute > 0:
+            self._refill()
+            self.tokens = min(self.tokens, remaining)
+
+    async def acquire(self, amount: float = 1) -> float:
+        """
+        Waits until the amount is available and takes it. Returns the time waited in seconds.
+        """
+        if self.per_minute <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) * 60 / self.per_minute
+                await asyncio.sleep(delay)
+                waited += delay
+
+class RateLimiter:
+    """
+    Client-side request-per-minute and token-per-minute limits for one upstream
+    deployment. The buckets are sized from the deployment's configured RPM/TPM and
+    adapt to the x-ratelimit-remaining-* and retry-after headers it returns.
+    """
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._attributes = {"upstream": name}
+
+    async def acquire(self, tokens: float = 0) -> float:
+        queue_depth.add(1, self._attributes)
+        start = time.monotonic()
+        try:
+            # Everyone waits out a throttling window announced by the upstream
+            while (pause := self._paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(pause)
+            await self.requests.acquire(1)
+            if tokens:
+                await self.tokens.acquire(tokens)
+        finally:
+            queue_depth.add(-1, self._attributes)
+        waited = time.monotonic() - start
+        throttle_wait.record(waited, self._attributes)
+        return waited
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> None:
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        if remaining_requests is not None:
+            self.requests.limit_to(float(remaining_requests))
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None:
+            self.tokens.limit_to(float(remaining_tokens))
+        if status_code == 429:
+            throttled.add(1, self._attributes)
+            pause = retry_delay(0, headers, settings.RATE_LIMIT_BACKOFF_SECONDS)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+@cache
+def get_rate_limiter(upstream: str) -> RateLimiter:
+    """
+    Returns the process-wide limiter for an upstream ("azure-openai" or "azure-ai-agents").
+    """
+    if upstream == "azure-openai":
+        return RateLimiter(upstream, settings.AZURE_OPENAI_RPM, settings.AZURE_OPENAI_TPM)
+    if upstream == "azure-ai-agents":
+        return RateLimiter(upstream, settings.AZURE_AI_AGENT_RPM, settings.AZURE_AI_AGENT_TPM)
+    raise ValueError(f"Unknown upstream '{upstream}'.")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough prompt token estimate (about four characters per token).
+    """
+    return len(text) // 4 + 1
+
+def estimate_request_tokens(body) -> int:
+    """
+    Estimates the tokens a chat request counts against TPM: its prompt plus the
+    requested (or assumed) completion size.
+    """
+    if not body:
+        return 0
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="ignore")
+    completion_tokens = settings.RATE_LIMIT_ESTIMATED_COMPLETION_TOKENS
+    try:
+        payload = json.loads(body)
+        completion_tokens = payload.get("max_completion_tokens") or payload.get("max_tokens") or completion_tokens
+    except (ValueError, AttributeError):
+        pass
+    return estimate_tokens(body) + completion_tokens
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport for the OpenAI SDK client that admits requests through a
+    RateLimiter and retries throttled or unavailable responses with jittered backoff.
+    """
+    def __init__(self, limiter: RateLimiter, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._limiter = limiter
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_request_tokens(await request.aread())
+        attempt = 0
+        while True:
+            await self._limiter.acquire(tokens)
+            response = await self._transport.handle_async_request(request)
+            self._limiter.observe(response.status_code, response.headers)
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= settings.RATE_LIMIT_MAX_RETRIES:
+                return response
+            await response.aclose()
+            retries.add(1, {"upstream": self._limiter.name})
+            await asyncio.sleep(retry_delay(attempt, response.headers, settings.RATE_LIMIT_BACKOFF_SECONDS))
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+class RateLimitPolicy(AsyncHTTPPolicy):
+    """
+    azure-core pipeline policy that admits each attempt through a RateLimiter and
+    feeds it the response headers. Install it as a per-retry policy so the
+    client's own RetryPolicy (which honors retry-after) retries throttled calls.
+    """
+    def __init__(self, limiter: RateLimiter):
+        super().__init__()
+        self._limiter = limiter
+
+    async def send(self, request: PipelineRequest) -> PipelineResponse:
+        await self._limiter.acquire(estimate_request_tokens(request.http_request.body))
+        response = await self.next.send(request)
+        self._limiter.observe(response.http_response.status_code, response.http_response.headers)
+        return response
@@ -0,0 +1,36 @@
+import json
+import logging
+from dataclasses import asdict, is_dataclass
+from typing import Any, AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+from app.models.api_models import StreamEvent
+
+logger = logging.getLogger(__name__)
+
+def _to_jsonable(value: Any) -> Any:
+    if is_dataclass(value):
+        return asdict(value)
+    return str(value)
+
+def format_sse(event: StreamEvent) -> str:
+    """
+    Formats an event as a Server-Sent Events message with a JSON data payload.
+    """
+    return f"event: {event.event}\ndata: {json.dumps(event.data, default=_to_jsonable)}\n\n"
+
+async def sse_stream(events: AsyncIterator[StreamEvent]) -> AsyncIterator[str]:
+    try:
+        async for event in events:
+            yield format_sse(event)
+    except Exception as e:
+        # The response status has already been sent, so report failures in-band
+        logger.exception("Streaming response failed")
+        yield format_sse(StreamEvent(event="error", data={"message": str(e)}))
+
+def sse_response(events: AsyncIterator[StreamEvent]) -> StreamingResponse:
+    return StreamingResponse(
+        sse_stream(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
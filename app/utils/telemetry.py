@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from opentelemetry import context, metrics, trace
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.sdk.trace.sampling import TraceIdRatioBased
+from opentelemetry.trace import StatusCode
+
+logger = logging.getLogger(__name__)
+meter = metrics.get_meter(__name__)
+tracer = trace.get_tracer(__name__)
+
+stage_duration = meter.create_histogram("app.stage.duration", unit="s", description="Duration of a request stage, by stage name")
+time_to_first_token = meter.create_histogram("app.agent.time_to_first_token", unit="s", description="Time from the start of an agent run to its first streamed token")
+sampled_traces = meter.create_counter("app.telemetry.traces", description="Traces seen by tail sampling by decision: error, slow, sampled, dropped or evicted")
+agent_tokens = meter.create_histogram("app.agent.tokens", unit="tokens", description="Tokens of an agent run by direction: input (prompt) or output (completion)")
+
+def elapsed_ms(start: float) -> float:
+    """
+    Milliseconds since a time.perf_counter() start.
+    """
+    return round((time.perf_counter() - start) * 1000, 1)
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[trace.Span]:
+    """
+    Runs a block in a span named after the stage and records its duration in
+    app.stage.duration. Durations use a monotonic clock; failed stages are
+    recorded with their error type.
+    """
+    attributes = {"stage": name, **attributes}
+    start = time.perf_counter()
+    with tracer.start_as_current_span(name, attributes=attributes) as span:
+        try:
+            yield span
+        except BaseException as e:
+            attributes["error.type"] = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            stage_duration.record(duration, attributes)
+            logger.debug("Stage %s took %.1fms", name, duration * 1000, extra={"stage": name, "duration_ms": round(duration * 1000, 1)})
+
+class AgentRunMetrics:
+    """
+    Time to first token and token usage of one agent run, recorded as
+    histograms and as attributes of the span that is current when the run starts.
+    """
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.span = trace.get_current_span()
+        self.start = time.perf_counter()
+        self.first_token_ms: Optional[float] = None
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._counted: set[str] = set()
+
+    def token(self) -> None:
+        if self.first_token_ms is None:
+            self.first_token_ms = elapsed_ms(self.start)
+            time_to_first_token.record(self.first_token_ms / 1000, {"agent": self.agent})
+            self.span.set_attribute("app.time_to_first_token_ms", self.first_token_ms)
+
+    def add_usage(self, metadata: Optional[dict]) -> None:
+        """
+        Adds the usage reported in a message's metadata: a CompletionUsage for
+        chat completions, the run step usage for Azure AI agents. Each completion
+        or run step is counted once, whether it arrives on a streamed chunk or an
+        intermediate message.
+        """
+        usage = metadata.get("usage") if metadata else None
+        if usage is None:
+            return
+        key = metadata.get("id") or metadata.get("step_id")
+        if key is not None:
+            if key in self._counted:
+                return
+            self._counted.add(key)
+        self.input_tokens += getattr(usage, "prompt_tokens", None) or 0
+        self.output_tokens += getattr(usage, "completion_tokens", None) or 0
+
+    def finish(self) -> None:
+        self.span.set_attribute("gen_ai.usage.input_tokens", self.input_tokens)
+        self.span.set_attribute("gen_ai.usage.output_tokens", self.output_tokens)
+        agent_tokens.record(self.input_tokens, {"agent": self.agent, "direction": "input"})
+        agent_tokens.record(self.output_tokens, {"agent": self.agent, "direction": "output"})
+        logger.info(
+            "Agent %s run took %.1fms (first token %sms, %d input and %d output tokens)",
+            self.agent, elapsed_ms(self.start), self.first_token_ms, self.input_tokens, self.output_tokens,
+            extra={"agent": self.agent, "duration_ms": elapsed_ms(self.start), "time_to_first_token_ms": self.first_token_ms,
+                   "input_tokens": self.input_tokens, "output_tokens": self.output_tokens})
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """
+    Holds the spans of each trace until its local root span ends, then passes
+    the whole trace to the delegate processor when a span failed, the root took
+    at least slow_ms, or the trace id falls within ratio. Other traces are
+    dropped. Spans ending after the decision follow it. At most max_traces
+    undecided traces are held; the oldest is dropped beyond that.
+    """
+    def __init__(self, delegate: SpanProcessor, ratio: float, slow_ms: float, max_traces: int):
+        self.delegate = delegate
+        self.bound = TraceIdRatioBased.get_bound_for_rate(min(max(ratio, 0.0), 1.0))
+        self.slow_ns = slow_ms * 1_000_000
+        self.max_traces = max_traces
+        # Spans end on worker threads as well as the event loop
+        self._lock = threading.Lock()
+        self._pending: OrderedDict[int, list[ReadableSpan]] = OrderedDict()
+        self._decisions: OrderedDict[int, bool] = OrderedDict()
+
+    def on_start(self, span: Span, parent_context: Optional[context.Context] = None) -> None:
+        self.delegate.on_start(span, parent_context=parent_context)
+
+    def _decide(self, root: ReadableSpan, spans: list[ReadableSpan]) -> str:
+        if any(span.status.status_code == StatusCode.ERROR for span in spans):
+            return "error"
+        if root.end_time - root.start_time >= self.slow_ns:
+            return "slow"
+        if root.context.trace_id & TraceIdRatioBased.TRACE_ID_LIMIT < self.bound:
+            return "sampled"
+        return "dropped"
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        local_root = span.parent is None or span.parent.is_remote
+        decision = None
+        evicted = 0
+        with self._lock:
+            keep = self._decisions.get(trace_id)
+            if keep is not None:
+                spans = [span]
+            elif not local_root:
+                self._pending.setdefault(trace_id, []).append(span)
+                while len(self._pending) > self.max_traces:
+                    self._pending.popitem(last=False)
+                    evicted += 1
+                spans = []
+            else:
+                spans = self._pending.pop(trace_id, []) + [span]
+                decision = self._decide(span, spans)
+                keep = self._decisions[trace_id] = decision != "dropped"
+                while len(self._decisions) > self.max_traces:
+                    self._decisions.popitem(last=False)
+
+        if evicted:
+            sampled_traces.add(evicted, {"decision": "evicted"})
+        if decision is not None:
+            sampled_traces.add(1, {"decision": decision})
+        if keep:
+            for pending_span in spans:
+                self.delegate.on_end(pending_span)
+
+    def shutdown(self) -> None:
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
@@ -0,0 +1,89 @@
+"""
+Measures the per-request setup cost of the weather ChatCompletionAgent.
+
+"per-request" builds the execution settings, function choice behavior,
+KernelArguments and ChatCompletionAgent for every request, as
+WeatherAgentService used to; "factory" reuses WeatherAgentFactory and only
+creates the per-request arguments. Each iteration also renders the agent
+instructions and resolves the function choice configuration, which Semantic
+Kernel does on every invocation. No model is called.
+
+Needs AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_CHAT_DEPLOYMENT_NAME (any values).
+
+    python -m benchmarks.bench_agent_setup --iterations 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from semantic_kernel.agents import ChatCompletionAgent
+from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+
+from app.prompts.file_service import file_service
+from app.services.weather_agent_service import WEATHER_PROMPT, WeatherAgentService
+
+async def per_request(service: WeatherAgentService) -> None:
+    settings = PromptExecutionSettings(
+        function_choice_behavior=FunctionChoiceBehavior.Auto(filters={"included_plugins": ["weather"]}),
+    )
+    kernel_arguments = KernelArguments(settings=settings)
+    kernel_arguments ["diagnostics"] = []
+    agent = ChatCompletionAgent(
+        kernel=service.kernel,
+        name="WeatherAgent",
+        instructions=file_service.read_file(WEATHER_PROMPT),
+        arguments=kernel_arguments
+    )
+    await agent.format_instructions(service.kernel, kernel_arguments)
+    settings.function_choice_behavior.get_config(service.kernel)
+
+async def factory(service: WeatherAgentService) -> None:
+    agent = service.agent_factory.get_agent()
+    kernel_arguments = service.agent_factory.request_arguments()
+    await agent.format_instructions(service.kernel, kernel_arguments)
+    service.agent_factory.execution_settings.function_choice_behavior.get_config(service.kernel)
+
+async def measure(setup, service: WeatherAgentService, iterations: int) -> tuple[list[float], list[int]]:
+    # Warm up once so one-off construction is excluded, as it is for a long-running process
+    await setup(service)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await setup(service)
+        samples.append(time.perf_counter() - start)
+
+    # Peak traced memory above the starting point is the transient allocation per request
+    allocations = []
+    tracemalloc.start()
+    for _ in range(iterations):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await setup(service)
+        allocations.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return samples, allocations
+
+def report(name: str, samples: list[float], allocations: list[int]) -> None:
+    samples_us = sorted(sample * 1_000_000 for sample in samples)
+    p95 = samples_us[max(0, int(len(samples_us) * 0.95) - 1)]
+    print(f"{name:12} mean={statistics.mean(samples_us):8.1f}us  p50={statistics.median(samples_us):8.1f}us  p95={p95:8.1f}us"
+          f"  peak alloc={statistics.mean(allocations) / 1024:7.1f}KiB/request")
+
+async def main(iterations: int) -> None:
+    service = WeatherAgentService()
+    per_request_samples, per_request_allocations = await measure(per_request, service, iterations)
+    factory_samples, factory_allocations = await measure(factory, service, iterations)
+
+    report("per-request", per_request_samples, per_request_allocations)
+    report("factory", factory_samples, factory_allocations)
+    saved = statistics.mean(per_request_samples) - statistics.mean(factory_samples)
+    print(f"setup saved per request: {saved * 1_000_000:.1f}us")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    asyncio.run(main(parser.parse_args().iterations))
@@ -0,0 +1,63 @@
+"""
+Measures the per-request overhead of Azure client setup for /agent/chat.
+
+"per-request" rebuilds the credential and AI project client for every request,
+as ChatAgentService used to; "shared" reuses the process-wide registry from
+app.services.azure_clients. Each iteration fetches the configured agent
+definition so TLS handshakes and token acquisition are included.
+
+Requires AZURE_AI_AGENT_ENDPOINT, AZURE_AI_AGENT_ID and an Azure login.
+
+    python -m benchmarks.bench_azure_clients --iterations 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from dotenv import load_dotenv
+from azure.identity.aio import DefaultAzureCredential
+from semantic_kernel.agents import AzureAIAgent
+
+from app.services.azure_clients import azure_clients
+
+async def per_request(agent_id: str) -> float:
+    start = time.perf_counter()
+    credential = DefaultAzureCredential()
+    async with credential, AzureAIAgent.create_client(credential=credential) as client:
+        await client.agents.get_agent(agent_id=agent_id)
+    return time.perf_counter() - start
+
+async def shared(agent_id: str) -> float:
+    start = time.perf_counter()
+    await azure_clients.agent_client.agents.get_agent(agent_id=agent_id)
+    return time.perf_counter() - start
+
+def report(name: str, samples: list[float]) -> None:
+    samples_ms = sorted(sample * 1000 for sample in samples)
+    p95 = samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)]
+    print(f"{name:12} mean={statistics.mean(samples_ms):8.1f}ms  p50={statistics.median(samples_ms):8.1f}ms  p95={p95:8.1f}ms")
+
+async def main(iterations: int) -> None:
+    load_dotenv()
+    agent_id = os.environ["AZURE_AI_AGENT_ID"]
+
+    await azure_clients.start()
+    try:
+        # Exclude the one-off warm-up of the shared registry from the comparison
+        await shared(agent_id)
+        shared_samples = [await shared(agent_id) for _ in range(iterations)]
+        per_request_samples = [await per_request(agent_id) for _ in range(iterations)]
+    finally:
+        await azure_clients.close()
+
+    report("per-request", per_request_samples)
+    report("shared", shared_samples)
+    overhead = statistics.mean(per_request_samples) - statistics.mean(shared_samples)
+    print(f"per-request setup overhead: {overhead * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    asyncio.run(main(parser.parse_args().iterations))
@@ -0,0 +1,110 @@
+"""
+Compares peak RSS of the blob -> AI project upload pipeline.
+
+"legacy" reproduces the previous readall() + ./temp_<uuid> file + re-read
+flow; "spooled" runs app.utils.file_utils.stream_blob_to_project. Blob storage
+and the AI project upload are replaced by in-process fakes that produce and
+consume the bytes in chunks, so only the pipeline's own buffering is measured.
+Each mode runs in a fresh subprocess so ru_maxrss is not shared.
+
+    python -m benchmarks.bench_blob_upload --size-mb 200
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+import uuid
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+class FakeDownloader:
+    def __init__(self, size: int):
+        self.size = size
+
+    def chunks(self):
+        remaining = self.size
+        while remaining > 0:
+            length = min(CHUNK_SIZE, remaining)
+            remaining -= length
+            yield b"x" * length
+
+    def readall(self) -> bytes:
+        return b"".join(self.chunks())
+
+    def readinto(self, stream) -> int:
+        for chunk in self.chunks():
+            stream.write(chunk)
+        return self.size
+
+class FakeBlobClient:
+    def __init__(self, size: int):
+        self.size = size
+
+    def download_blob(self, **kwargs) -> FakeDownloader:
+        return FakeDownloader(self.size)
+
+class FakeBlobServiceClient:
+    def __init__(self, size: int):
+        self.size = size
+
+    def get_blob_client(self, container, blob) -> FakeBlobClient:
+        return FakeBlobClient(self.size)
+
+class FakeFiles:
+    def upload_and_poll(self, file=None, file_path=None, filename=None, purpose=None):
+        # Consume the body in chunks the way a streaming transport would
+        stream = open(file_path, "rb") if file_path else file
+        try:
+            while stream.read(CHUNK_SIZE):
+                pass
+        finally:
+            if file_path:
+                stream.close()
+        return type("UploadedFile", (), {"id": f"assistant-{uuid.uuid4().hex}"})()
+
+class FakeProjectClient:
+    def __init__(self):
+        self.agents = type("Agents", (), {"files": FakeFiles()})()
+
+def run_legacy(size: int) -> None:
+    file_content = FakeBlobServiceClient(size).get_blob_client("c", "b").download_blob().readall()
+    temp_file_path = f"./temp_{uuid.uuid4()}.pdf"
+    try:
+        with open(temp_file_path, "wb") as f:
+            f.write(file_content)
+        FakeProjectClient().agents.files.upload_and_poll(file_path=temp_file_path)
+    finally:
+        os.remove(temp_file_path)
+
+def measure(mode: str, size: int) -> None:
+    pipeline = run_legacy
+    if mode == "spooled":
+        # Import the app modules before taking the baseline so only the pipeline is measured
+        from app.services.azure_clients import azure_clients
+        from app.utils.file_utils import stream_blob_to_project
+        azure_clients._project_client = FakeProjectClient()
+        pipeline = lambda size: stream_blob_to_project(FakeBlobServiceClient(size), "manual.pdf")
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    pipeline(size)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    print(f"{mode:8} size={size / 2**20:7.1f}MiB  peak_rss={peak / 1024:8.1f}MiB  "
+          f"pipeline_delta={(peak - baseline) / 1024:8.1f}MiB  time={elapsed * 1000:8.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--mode", choices=["legacy", "spooled"])
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    if args.mode:
+        measure(args.mode, size)
+    else:
+        for mode in ("legacy", "spooled"):
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_blob_upload", "--mode", mode, "--size-mb", str(args.size_mb)], check=True)
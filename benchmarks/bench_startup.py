@@ -0,0 +1,111 @@
+"""
+Measures how quickly the app starts serving.
+
+Each run starts a fresh interpreter and records:
+
+- import: time to import app.main
+- status: process start until /status answers (liveness)
+- ready:  process start until /ready answers 200 (services built and warmed up)
+- first:  latency of the first request that needs an agent service, sent as
+          soon as /status answers; GET /batch/jobs/<missing> builds the batch,
+          weather and chat services without calling a model
+
+Needs AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_CHAT_DEPLOYMENT_NAME (any values);
+placeholders are used when they are not set. --importtime prints the slowest
+modules of one import of app.main.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+def benchmark_env() -> dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+    env.setdefault("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "benchmark")
+    env.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+    # Keep exporters and prompt watching out of the measurement
+    env.pop("APPLICATIONINSIGHTS_CONNECTION_STRING", None)
+    env["PROMPT_RELOAD_INTERVAL_SECONDS"] = "0"
+    return env
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_import(env: dict[str, str]) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=env, capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def wait_for(client: httpx.Client, path: str, start: float, timeout: float) -> float:
+    while time.perf_counter() - start < timeout:
+        try:
+            if client.get(path).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{path} did not answer within {timeout}s")
+
+def measure_server(env: dict[str, str], timeout: float) -> tuple[float, float, float]:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            status = wait_for(client, "/status", start, timeout)
+            request_start = time.perf_counter()
+            client.get("/batch/jobs/missing")
+            first = time.perf_counter() - request_start
+            ready = wait_for(client, "/ready", start, timeout)
+    finally:
+        process.terminate()
+        process.wait()
+    return status, ready, first
+
+def report(name: str, samples: list[float]) -> None:
+    samples_ms = [sample * 1000 for sample in samples]
+    print(f"{name:8} mean={statistics.mean(samples_ms):8.1f}ms  min={min(samples_ms):8.1f}ms  max={max(samples_ms):8.1f}ms")
+
+def print_importtime(env: dict[str, str], top: int) -> None:
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env, capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    print("slowest imports (cumulative):")
+    for cumulative, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:8.1f}ms {module}")
+
+def main(runs: int, timeout: float, importtime: bool) -> None:
+    env = benchmark_env()
+    imports = [measure_import(env) for _ in range(runs)]
+    status, ready, first = zip(*(measure_server(env, timeout) for _ in range(runs)))
+
+    report("import", imports)
+    report("status", list(status))
+    report("ready", list(ready))
+    report("first", list(first))
+    if importtime:
+        print_importtime(env, 20)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--importtime", action="store_true")
+    arguments = parser.parse_args()
+    main(arguments.runs, arguments.timeout, arguments.importtime)
@@ -0,0 +1,103 @@
+"""
+Measures the per-request cost of the telemetry pipeline configured in app.main.
+
+Each mode runs in a fresh interpreter with its TELEMETRY_* settings, imports
+app.main and sends requests through the ASGI app in process to a route that
+opens --spans nested stage spans, roughly the span volume of an agent request.
+Reported per request: wall-clock latency and CPU time of the whole process,
+which includes the batch export thread, after a final flush. "none" is the
+baseline; console output goes to /dev/null.
+
+Modes: none, console, console at a 10% head sampling ratio, console with tail
+sampling at 10%, and azure when APPLICATIONINSIGHTS_CONNECTION_STRING is set.
+
+    python -m benchmarks.bench_telemetry --requests 2000 --spans 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+RESULT_PREFIX = "RESULT "
+
+MODES = [
+    ("none", {"TELEMETRY_EXPORTER": "none"}),
+    ("console", {"TELEMETRY_EXPORTER": "console"}),
+    ("console 10%", {"TELEMETRY_EXPORTER": "console", "TELEMETRY_SAMPLE_RATIO": "0.1"}),
+    ("console tail 10%", {"TELEMETRY_EXPORTER": "console", "TELEMETRY_SAMPLE_RATIO": "0.1", "TELEMETRY_TAIL_SAMPLING": "true"}),
+]
+
+async def worker(requests: int, spans: int) -> None:
+    from opentelemetry import trace
+
+    from app.main import app
+    from app.utils.telemetry import stage
+
+    @app.get("/_bench")
+    async def bench():
+        with stage("bench.request"):
+            for _ in range(spans - 1):
+                with stage("bench.stage"):
+                    pass
+        return {"message": "ok"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(min(100, requests)):
+            await client.get("/_bench")
+
+        samples = []
+        cpu_start = time.process_time()
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.get("/_bench")
+            samples.append(time.perf_counter() - start)
+        provider = trace.get_tracer_provider()
+        if hasattr(provider, "force_flush"):
+            provider.force_flush()
+        cpu = time.process_time() - cpu_start
+
+    print(RESULT_PREFIX + json.dumps({"samples": samples, "cpu": cpu}), file=sys.stderr)
+
+def run_mode(overrides: dict[str, str], requests: int, spans: int) -> dict:
+    env = dict(os.environ)
+    for name in [name for name in env if name.startswith("TELEMETRY_")]:
+        del env[name]
+    env.update(overrides)
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_telemetry", "--worker", "--requests", str(requests), "--spans", str(spans)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    line = next(line for line in reversed(process.stderr.splitlines()) if line.startswith(RESULT_PREFIX))
+    return json.loads(line[len(RESULT_PREFIX):])
+
+def main(requests: int, spans: int) -> None:
+    modes = list(MODES)
+    if os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING"):
+        modes.append(("azure", {"TELEMETRY_EXPORTER": "azure"}))
+
+    baseline_cpu = None
+    print(f"{requests} requests, {spans} spans each")
+    for name, overrides in modes:
+        result = run_mode(overrides, requests, spans)
+        samples_us = sorted(sample * 1_000_000 for sample in result["samples"])
+        p95 = samples_us[max(0, int(len(samples_us) * 0.95) - 1)]
+        cpu_us = result["cpu"] * 1_000_000 / requests
+        baseline_cpu = cpu_us if baseline_cpu is None else baseline_cpu
+        print(f"{name:18} mean={statistics.mean(samples_us):8.1f}us  p95={p95:8.1f}us  cpu={cpu_us:8.1f}us/request"
+              f"  overhead={cpu_us - baseline_cpu:+8.1f}us/request")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--spans", type=int, default=10)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.worker:
+        asyncio.run(worker(arguments.requests, arguments.spans))
+    else:
+        main(arguments.requests, arguments.spans)
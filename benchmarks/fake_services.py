@@ -0,0 +1,399 @@
+"""
+Local stand-ins for the services the app calls, for load tests.
+
+One server answers for all of them:
+
+- Azure OpenAI chat completions (/openai/deployments/{name}/chat/completions),
+  streaming and non-streaming. While the weather tools are offered it calls
+  get_lat_long, then get_weather_for_latitude_longitude, then answers.
+- api.weather.gov points and gridpoint forecasts
+- the Azure AI Agents endpoints used by /agent/chat: agents, threads,
+  messages, streamed runs, files and vector stores
+- Azure Blob Storage blob properties and ranged downloads
+
+Latencies are configurable so the app can be measured against slow or fast
+upstreams. Authentication is not checked.
+
+    python -m benchmarks.fake_services --port 9000 --openai-latency-ms 300
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+@dataclass
+class FakeConfig:
+    # Time to the first byte of a chat completion or agent run, and between streamed tokens
+    openai_latency_ms: float = 300
+    token_delay_ms: float = 10
+    answer_tokens: int = 60
+    weather_latency_ms: float = 80
+    forecast_max_age: int = 300
+    agent_latency_ms: float = 50
+    blob_size: int = 64 * 1024
+    location: str = "Mankato, MN"
+
+def estimate_tokens(value: Any) -> int:
+    return max(1, len(json.dumps(value)) // 4)
+
+async def pause(milliseconds: float) -> None:
+    if milliseconds > 0:
+        await asyncio.sleep(milliseconds / 1000)
+
+def answer_words(config: FakeConfig, subject: str) -> list[str]:
+    words = f"The forecast for {subject} is mostly sunny with a high near 72 and light winds from the northwest.".split()
+    return [(words * (config.answer_tokens // len(words) + 1))[index] + " " for index in range(config.answer_tokens)]
+
+def plan_completion(body: dict, config: FakeConfig) -> dict:
+    """
+    Decides the next assistant message: a weather tool call while the tools are
+    offered and not yet answered, otherwise a text answer.
+    """
+    messages = body.get("messages", [])
+    tools = {tool["function"]["name"] for tool in body.get("tools") or []}
+    last_user = max((index for index, message in enumerate(messages) if message.get("role") == "user"), default=0)
+    tool_results = [message for message in messages[last_user + 1:] if message.get("role") == "tool"]
+
+    if "weather-get_lat_long" in tools and not tool_results:
+        return {"tool": "weather-get_lat_long", "arguments": {"location": config.location}}
+    if "weather-get_weather_for_latitude_longitude" in tools and len(tool_results) == 1:
+        latitude, longitude = (NUMBER_PATTERN.findall(str(tool_results[0].get("content"))) + ["44.16", "-93.99"])[:2]
+        return {"tool": "weather-get_weather_for_latitude_longitude", "arguments": {"latitude": latitude, "longitude": longitude}}
+
+    prompt = str(messages[-1].get("content")) if messages else ""
+    if "geopoint" in prompt.lower():
+        return {"content": json.dumps({"Latitude": 44.16, "Longitude": -93.99})}
+    return {"content": "".join(answer_words(config, config.location)).strip()}
+
+def create_app(config: FakeConfig) -> FastAPI:
+    app = FastAPI()
+    threads: dict[str, dict] = {}
+    messages: dict[str, dict] = {}
+    files: dict[str, dict] = {}
+    vector_stores: dict[str, dict] = {}
+    vector_store_files: dict[str, list[str]] = {}
+    blob = bytes(index % 251 for index in range(config.blob_size))
+    blob_md5 = base64.b64encode(hashlib.md5(blob).digest()).decode()
+
+    @app.get("/healthz")
+    async def healthz():
+        return {"status": "ok"}
+
+    # Azure OpenAI
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        plan = plan_completion(body, config)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        prompt_tokens = estimate_tokens(body.get("messages", []))
+        tool_calls = None
+        if "tool" in plan:
+            tool_calls = [{"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function", "function": {"name": plan["tool"], "arguments": json.dumps(plan["arguments"])}}]
+        completion_tokens = estimate_tokens(tool_calls) if tool_calls else config.answer_tokens
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        finish_reason = "tool_calls" if tool_calls else "stop"
+
+        if not body.get("stream"):
+            await pause(config.openai_latency_ms + config.token_delay_ms * completion_tokens)
+            message = {"role": "assistant", "content": plan.get("content"), "tool_calls": tool_calls}
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": deployment,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            }
+
+        def chunk(delta: dict, finish: str | None = None) -> str:
+            data = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": deployment,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def stream() -> AsyncIterator[str]:
+            await pause(config.openai_latency_ms)
+            yield chunk({"role": "assistant", "content": ""})
+            if tool_calls:
+                yield chunk({"tool_calls": [{"index": 0, **tool_calls[0]}]})
+            else:
+                for word in answer_words(config, config.location):
+                    await pause(config.token_delay_ms)
+                    yield chunk({"content": word})
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": deployment, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(data)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    # api.weather.gov
+
+    @app.get("/points/{coordinates}")
+    async def points(coordinates: str, request: Request):
+        await pause(config.weather_latency_ms)
+        base_url = str(request.base_url).rstrip("/")
+        return {"properties": {"forecast": f"{base_url}/gridpoints/FAKE/{abs(hash(coordinates)) % 100},1/forecast"}}
+
+    @app.get("/gridpoints/{office}/{grid}/forecast")
+    async def forecast(office: str, grid: str):
+        await pause(config.weather_latency_ms)
+        periods = [{
+            "number": index + 1,
+            "name": f"Period {index + 1}",
+            "startTime": f"2025-01-01T{(index * 12) % 24:02d}:00:00-06:00",
+            "temperature": 60 + index,
+            "temperatureUnit": "F",
+            "probabilityOfPrecipitation": {"unitCode": "wmoUnit:percent", "value": index * 5},
+            "windSpeed": "5 to 10 mph",
+            "windDirection": "NW",
+            "shortForecast": "Mostly Sunny",
+            "detailedForecast": "Mostly sunny, with a high near 72. Northwest wind 5 to 10 mph.",
+        } for index in range(14)]
+        body = {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": []}, "properties": {"updateTime": "2025-01-01T00:00:00+00:00", "periods": periods}}
+        return JSONResponse(body, headers={"Cache-Control": f"public, max-age={config.forecast_max_age}"})
+
+    # Azure AI Agents
+
+    def thread_object(thread_id: str, tool_resources: Any = None) -> dict:
+        return {"id": thread_id, "object": "thread", "created_at": int(time.time()), "metadata": {}, "tool_resources": tool_resources or {}}
+
+    def message_object(message_id: str, thread_id: str, role: str, text: str, run_id: str | None = None) -> dict:
+        return {
+            "id": message_id, "object": "thread.message", "created_at": int(time.time()), "thread_id": thread_id,
+            "role": role, "status": "completed", "run_id": run_id, "assistant_id": None, "attachments": [], "metadata": {},
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        }
+
+    @app.get("/{prefix:path}/assistants/{agent_id}")
+    async def get_agent(prefix: str, agent_id: str):
+        await pause(config.agent_latency_ms)
+        return {
+            "id": agent_id, "object": "assistant", "created_at": int(time.time()), "name": "LoadTestAgent",
+            "description": None, "model": "fake", "instructions": "Answer questions.", "tools": [],
+            "tool_resources": {}, "metadata": {}, "temperature": 1.0, "top_p": 1.0, "response_format": "auto",
+        }
+
+    @app.post("/{prefix:path}/threads/{thread_id}/messages")
+    async def create_message(prefix: str, thread_id: str, request: Request):
+        body = await request.json()
+        content = body.get("content")
+        text = content if isinstance(content, str) else " ".join(str(item.get("text", "")) for item in content or [])
+        message = message_object(f"msg_{uuid.uuid4().hex}", thread_id, body.get("role", "user"), text)
+        messages[message["id"]] = message
+        return message
+
+    @app.get("/{prefix:path}/threads/{thread_id}/messages/{message_id}")
+    async def get_message(prefix: str, thread_id: str, message_id: str):
+        return messages.get(message_id) or JSONResponse({"error": {"message": "not found"}}, status_code=404)
+
+    @app.post("/{prefix:path}/threads/{thread_id}/runs")
+    async def create_run(prefix: str, thread_id: str, request: Request):
+        body = await request.json()
+        run_id = f"run_{uuid.uuid4().hex}"
+        message_id = f"msg_{uuid.uuid4().hex}"
+        agent_id = body.get("assistant_id") or body.get("agent_id")
+        words = answer_words(config, "your question")
+        usage = {"prompt_tokens": 200, "completion_tokens": len(words), "total_tokens": 200 + len(words)}
+
+        def run_object(status: str) -> dict:
+            return {
+                "id": run_id, "object": "thread.run", "created_at": int(time.time()), "thread_id": thread_id,
+                "assistant_id": agent_id, "status": status, "model": "fake", "instructions": "", "tools": [],
+                "metadata": {}, "usage": usage if status == "completed" else None,
+            }
+
+        def event(name: str, data: Any) -> str:
+            return f"event: {name}\ndata: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+
+        async def stream() -> AsyncIterator[str]:
+            yield event("thread.run.created", run_object("queued"))
+            await pause(config.openai_latency_ms)
+            for word in words:
+                yield event("thread.message.delta", {
+                    "id": message_id, "object": "thread.message.delta",
+                    "delta": {"role": "assistant", "content": [{"index": 0, "type": "text", "text": {"value": word}}]},
+                })
+                await pause(config.token_delay_ms)
+            messages[message_id] = message_object(message_id, thread_id, "assistant", "".join(words), run_id)
+            yield event("thread.run.step.completed", {
+                "id": f"step_{uuid.uuid4().hex}", "object": "thread.run.step", "type": "message_creation",
+                "status": "completed", "created_at": int(time.time()), "run_id": run_id, "thread_id": thread_id,
+                "assistant_id": agent_id, "usage": usage,
+                "step_details": {"type": "message_creation", "message_creation": {"message_id": message_id}},
+            })
+            yield event("thread.run.completed", run_object("completed"))
+            yield event("done", "[DONE]")
+
+        if not body.get("stream"):
+            return run_object("completed")
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    def too_many_vector_stores(tool_resources: Any) -> Optional[JSONResponse]:
+        # The service accepts at most one vector store per thread for file search
+        vector_store_ids = ((tool_resources or {}).get("file_search") or {}).get("vector_store_ids") or []
+        if len(vector_store_ids) > 1:
+            return JSONResponse({"error": {"message": "A thread can have at most 1 vector store."}}, status_code=400)
+        return None
+
+    @app.post("/{prefix:path}/threads/{thread_id}")
+    async def update_thread(prefix: str, thread_id: str, request: Request):
+        body = await request.json()
+        if error := too_many_vector_stores(body.get("tool_resources")):
+            return error
+        threads[thread_id] = thread_object(thread_id, body.get("tool_resources"))
+        return threads[thread_id]
+
+    @app.get("/{prefix:path}/threads/{thread_id}")
+    async def get_thread(prefix: str, thread_id: str):
+        return threads.get(thread_id) or thread_object(thread_id)
+
+    @app.post("/{prefix:path}/threads")
+    async def create_thread(prefix: str, request: Request):
+        await pause(config.agent_latency_ms)
+        body = await request.json() if await request.body() else {}
+        if error := too_many_vector_stores(body.get("tool_resources")):
+            return error
+        thread_id = f"thread_{uuid.uuid4().hex}"
+        threads[thread_id] = thread_object(thread_id, body.get("tool_resources"))
+        return threads[thread_id]
+
+    # Vector store routes come first so their /files paths are not taken for project files
+    def vector_store_object(vector_store_id: str, name: str | None, file_count: int) -> dict:
+        return {
+            "id": vector_store_id, "object": "vector_store", "created_at": int(time.time()), "name": name,
+            "usage_bytes": 0, "status": "completed", "metadata": {},
+            "file_counts": {"in_progress": 0, "completed": file_count, "failed": 0, "cancelled": 0, "total": file_count},
+        }
+
+    @app.post("/{prefix:path}/vector_stores/{vector_store_id}/files")
+    async def add_vector_store_file(prefix: str, vector_store_id: str, request: Request):
+        body = await request.json()
+        await pause(config.agent_latency_ms)
+        vector_store_files.setdefault(vector_store_id, []).append(body.get("file_id"))
+        return {
+            "id": body.get("file_id"), "object": "vector_store.file", "created_at": int(time.time()),
+            "vector_store_id": vector_store_id, "usage_bytes": 0, "status": "completed",
+        }
+
+    @app.get("/{prefix:path}/vector_stores/{vector_store_id}/files")
+    async def list_vector_store_files(prefix: str, vector_store_id: str, after: Optional[str] = None):
+        # One page; the client asks for the next one after last_id until it gets an empty page
+        file_ids = vector_store_files.get(vector_store_id, [])
+        if after in file_ids:
+            file_ids = file_ids[file_ids.index(after) + 1:]
+        data = [{
+            "id": file_id, "object": "vector_store.file", "created_at": int(time.time()),
+            "vector_store_id": vector_store_id, "usage_bytes": 0, "status": "completed",
+        } for file_id in file_ids]
+        return {"object": "list", "data": data, "first_id": file_ids[0] if file_ids else None,
+                "last_id": file_ids[-1] if file_ids else None, "has_more": False}
+
+    @app.get("/{prefix:path}/vector_stores/{vector_store_id}/files/{file_id}")
+    async def get_vector_store_file(prefix: str, vector_store_id: str, file_id: str):
+        return {
+            "id": file_id, "object": "vector_store.file", "created_at": int(time.time()),
+            "vector_store_id": vector_store_id, "usage_bytes": 0, "status": "completed",
+        }
+
+    @app.post("/{prefix:path}/vector_stores")
+    async def create_vector_store(prefix: str, request: Request):
+        body = await request.json()
+        await pause(config.agent_latency_ms)
+        vector_store_id = f"vs_{uuid.uuid4().hex}"
+        vector_stores[vector_store_id] = vector_store_object(vector_store_id, body.get("name"), len(body.get("file_ids") or []))
+        vector_store_files[vector_store_id] = list(body.get("file_ids") or [])
+        return vector_stores[vector_store_id]
+
+    @app.get("/{prefix:path}/vector_stores/{vector_store_id}")
+    async def get_vector_store(prefix: str, vector_store_id: str):
+        return vector_stores.get(vector_store_id) or vector_store_object(vector_store_id, None, 1)
+
+    @app.delete("/{prefix:path}/vector_stores/{vector_store_id}")
+    async def delete_vector_store(prefix: str, vector_store_id: str):
+        vector_stores.pop(vector_store_id, None)
+        vector_store_files.pop(vector_store_id, None)
+        return {"id": vector_store_id, "object": "vector_store.deleted", "deleted": True}
+
+    @app.post("/{prefix:path}/files")
+    async def upload_file(prefix: str, request: Request):
+        # The multipart body is not parsed; only the file name is picked out of it
+        body = await request.body()
+        filename = re.search(rb'filename="([^"]*)"', body)
+        await pause(config.agent_latency_ms)
+        file_id = f"assistant-{uuid.uuid4().hex}"
+        files[file_id] = {
+            "id": file_id, "object": "file", "bytes": len(body), "created_at": int(time.time()),
+            "filename": filename.group(1).decode() if filename else "upload", "purpose": "assistants", "status": "processed",
+        }
+        return files[file_id]
+
+    @app.get("/{prefix:path}/files/{file_id}")
+    async def get_file(prefix: str, file_id: str):
+        return files.get(file_id) or JSONResponse({"error": {"message": "not found"}}, status_code=404)
+
+    @app.delete("/{prefix:path}/files/{file_id}")
+    async def delete_file(prefix: str, file_id: str):
+        files.pop(file_id, None)
+        return {"id": file_id, "object": "file", "deleted": True}
+
+    # Azure Blob Storage
+
+    def blob_headers() -> dict[str, str]:
+        return {
+            "ETag": '"0x8DCFAKE"',
+            "Last-Modified": formatdate(usegmt=True),
+            "Content-Type": "text/plain",
+            "Content-MD5": blob_md5,
+            "Accept-Ranges": "bytes",
+            "x-ms-blob-type": "BlockBlob",
+            "x-ms-version": "2025-01-05",
+            "x-ms-creation-time": formatdate(usegmt=True),
+            "x-ms-server-encrypted": "true",
+        }
+
+    @app.head("/{account}/{container}/{blob_name:path}")
+    async def blob_properties(account: str, container: str, blob_name: str):
+        return Response(headers={**blob_headers(), "Content-Length": str(len(blob))})
+
+    @app.get("/{account}/{container}/{blob_name:path}")
+    async def download_blob(account: str, container: str, blob_name: str, request: Request):
+        await pause(config.weather_latency_ms)
+        start, end = 0, len(blob) - 1
+        requested = re.match(r"bytes=(\d+)-(\d*)", request.headers.get("x-ms-range") or request.headers.get("range") or "")
+        if requested:
+            start = int(requested.group(1))
+            end = min(int(requested.group(2)) if requested.group(2) else end, len(blob) - 1)
+        headers = {**blob_headers(), "Content-Range": f"bytes {start}-{end}/{len(blob)}"}
+        return Response(content=blob[start:end + 1], status_code=206 if requested else 200, headers=headers)
+
+    return app
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--openai-latency-ms", type=float, default=FakeConfig.openai_latency_ms)
+    parser.add_argument("--token-delay-ms", type=float, default=FakeConfig.token_delay_ms)
+    parser.add_argument("--answer-tokens", type=int, default=FakeConfig.answer_tokens)
+    parser.add_argument("--weather-latency-ms", type=float, default=FakeConfig.weather_latency_ms)
+    parser.add_argument("--forecast-max-age", type=int, default=FakeConfig.forecast_max_age)
+    parser.add_argument("--agent-latency-ms", type=float, default=FakeConfig.agent_latency_ms)
+    parser.add_argument("--blob-size", type=int, default=FakeConfig.blob_size)
+    arguments = vars(parser.parse_args())
+    port = arguments.pop("port")
+    uvicorn.run(create_app(FakeConfig(**arguments)), host="127.0.0.1", port=port, log_level="warning")
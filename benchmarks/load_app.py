@@ -0,0 +1,185 @@
+"""
+Runs app.main for load tests, pointed at benchmarks.fake_services.
+
+The weather.gov base URL and blob endpoint are plain settings. Semantic Kernel
+and the Azure AI Agents clients only accept https endpoints, so Azure OpenAI is
+configured as https://openai.fake and the agents endpoint as https://agents.fake,
+and the clients are given transports that send those hosts to the fake server
+(FAKE_SERVICES_URL). The agents clients use a static token instead of an
+Azure credential.
+
+Adds two routes for the load driver:
+
+- GET /_load/stats: event loop lag (how late a 10ms timer fires) and RSS
+- POST /_load/stats/reset: clears the lag samples and peak RSS between scenarios
+
+    python -m benchmarks.load_app --port 8001
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Iterator
+
+import httpx
+from azure.core.credentials import AccessToken
+from azure.core.pipeline.transport import AioHttpTransport, RequestsTransport
+
+from app.main import app
+from app.services.azure_clients import azure_clients
+from app.utils.rate_limit import RateLimitedTransport, RateLimitPolicy, get_rate_limiter
+
+FAKE_HOSTS = ("openai.fake", "agents.fake")
+LAG_INTERVAL_SECONDS = 0.01
+
+@contextmanager
+def redirected(request) -> Iterator[None]:
+    """
+    Points an azure-core request at the fake server while it is sent. The URL is
+    restored afterwards because retries resend the same request through the
+    https-only authentication policy.
+    """
+    url = request.url
+    for host in FAKE_HOSTS:
+        if url.startswith(f"https://{host}/"):
+            request.url = os.environ["FAKE_SERVICES_URL"].rstrip("/") + url[len(host) + 8:]
+    try:
+        yield
+    finally:
+        request.url = url
+
+class RedirectHTTPTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host in FAKE_HOSTS:
+            fake_url = httpx.URL(os.environ["FAKE_SERVICES_URL"])
+            request.url = request.url.copy_with(scheme=fake_url.scheme, host=fake_url.host, port=fake_url.port)
+        return await super().handle_async_request(request)
+
+class RedirectAioHttpTransport(AioHttpTransport):
+    async def send(self, request, **kwargs):
+        with redirected(request):
+            return await super().send(request, **kwargs)
+
+class RedirectRequestsTransport(RequestsTransport):
+    def send(self, request, **kwargs):
+        with redirected(request):
+            return super().send(request, **kwargs)
+
+def static_token() -> AccessToken:
+    return AccessToken("fake-token", int(time.time()) + 3600)
+
+class FakeAsyncCredential:
+    async def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        return static_token()
+
+    async def close(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+class FakeCredential:
+    def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        return static_token()
+
+    def close(self) -> None:
+        pass
+
+def use_fake_clients() -> None:
+    from azure.ai.projects import AIProjectClient
+    from semantic_kernel.agents import AzureAIAgent
+
+    from app.services import weather_agent_service
+
+    # The OpenAI client of the weather service is built with this transport
+    weather_agent_service.RateLimitedTransport = lambda limiter: RateLimitedTransport(limiter, RedirectHTTPTransport())
+
+    endpoint = os.environ["AZURE_AI_AGENT_ENDPOINT"]
+    azure_clients._credential = FakeAsyncCredential()
+    azure_clients._agent_client = AzureAIAgent.create_client(
+        credential=azure_clients._credential,
+        endpoint=endpoint,
+        transport=RedirectAioHttpTransport(),
+        per_retry_policies=[RateLimitPolicy(get_rate_limiter("azure-ai-agents"))])
+    azure_clients._sync_credential = FakeCredential()
+    azure_clients._project_client = AIProjectClient(
+        credential=azure_clients._sync_credential, endpoint=endpoint, transport=RedirectRequestsTransport())
+
+class LoopMonitor:
+    """
+    Samples how late a short timer fires on the event loop, which is how long
+    other requests would have waited behind blocking work.
+    """
+    def __init__(self, max_samples: int = 100_000):
+        self.lags = deque(maxlen=max_samples)
+        self.peak_rss = 0
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL_SECONDS)
+            self.lags.append(max(0.0, loop.time() - start - LAG_INTERVAL_SECONDS))
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    def reset(self) -> None:
+        self.lags.clear()
+        self.peak_rss = rss_bytes()
+
+    def stats(self) -> dict:
+        lags_ms = sorted(lag * 1000 for lag in self.lags) or [0.0]
+        return {
+            "loop_lag_ms": {
+                "mean": round(statistics.mean(lags_ms), 2),
+                "p50": round(lags_ms[len(lags_ms) // 2], 2),
+                "p99": round(lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))], 2),
+                "max": round(lags_ms[-1], 2),
+                "samples": len(self.lags),
+            },
+            "rss_mb": round(rss_bytes() / 2**20, 1),
+            "peak_rss_mb": round(max(self.peak_rss, rss_bytes()) / 2**20, 1),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+monitor = LoopMonitor()
+app_lifespan = app.router.lifespan_context
+
+@asynccontextmanager
+async def lifespan(app_instance):
+    use_fake_clients()
+    task = asyncio.create_task(monitor.run())
+    try:
+        async with app_lifespan(app_instance) as state:
+            yield state
+    finally:
+        task.cancel()
+
+app.router.lifespan_context = lifespan
+
+@app.get("/_load/stats", include_in_schema=False)
+async def load_stats():
+    return monitor.stats()
+
+@app.post("/_load/stats/reset", include_in_schema=False)
+async def reset_load_stats():
+    monitor.reset()
+    return monitor.stats()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001)
+    arguments = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=arguments.port, log_level="warning")
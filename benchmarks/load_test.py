@@ -0,0 +1,251 @@
+"""
+Load-tests the API against local stand-ins for Azure OpenAI, Azure AI Agents,
+Azure Blob Storage and api.weather.gov.
+
+Starts benchmarks.fake_services and benchmarks.load_app (app.main pointed at
+the fakes) as subprocesses, waits for /ready, then runs each scenario with
+--concurrency clients until --requests requests have finished:
+
+- weather:       POST /weather (chat completions with two tool calls)
+- agent-weather: POST /agent/weather (chat completion agent, streamed)
+- chat:          POST /agent/chat (Azure AI agent run, streamed)
+- chat-file:     POST /agent/chat with a blob file attached to the thread
+
+Reported per scenario: p50/p95/p99 latency, requests per second, errors,
+event loop lag of the app (how late a 10ms timer fires) and its RSS. Results
+are written as JSON to --output (benchmarks/results/ by default); --compare
+prints the change against an earlier result file.
+
+The upstream latencies are set with the --openai-latency-ms style flags and
+passed to the fake services. Telemetry export is off unless --telemetry is given.
+
+    python -m benchmarks.load_test --concurrency 16 --requests 200
+    python -m benchmarks.load_test --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# The well-known Azurite development account; the fake server does not check signatures
+BLOB_ACCOUNT = "devstoreaccount1"
+BLOB_KEY = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+QUESTION = "What is the weather in Mankato MN"
+
+SCENARIOS = {
+    "weather": ("/weather", {"messages": [{"role": "User", "content": QUESTION}]}),
+    "agent-weather": ("/agent/weather", {"message": QUESTION, "thread_id": ""}),
+    "chat": ("/agent/chat", {"message": QUESTION, "thread_id": ""}),
+    "chat-file": ("/agent/chat", {"message": "Summarize the attached file.", "thread_id": "", "file": "load-test/report.txt"}),
+}
+FAKE_OPTIONS = ["openai_latency_ms", "token_delay_ms", "answer_tokens", "weather_latency_ms", "agent_latency_ms", "blob_size"]
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    requests: int
+    concurrency: int
+    errors: int
+    duration_s: float
+    rps: float
+    latency_ms: dict
+    loop_lag_ms: dict
+    rss_mb: float
+    peak_rss_mb: float
+    error_samples: list[str] = field(default_factory=list)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+def git_commit() -> str:
+    process = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return process.stdout.strip() or "unknown"
+
+def app_env(fake_url: str, work_dir: str, telemetry: bool) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "FAKE_SERVICES_URL": fake_url,
+        "AZURE_OPENAI_ENDPOINT": "https://openai.fake",
+        "AZURE_OPENAI_API_KEY": "fake",
+        "AZURE_OPENAI_CHAT_DEPLOYMENT_NAME": "load-test",
+        "WEATHER_API_BASE_URL": fake_url,
+        "AZURE_AI_AGENT_ENDPOINT": "https://agents.fake/api/projects/load-test",
+        "AZURE_AI_AGENT_ID": "asst_load_test",
+        "AZURE_BLOB_CONNECTION_STRING": f"DefaultEndpointsProtocol=http;AccountName={BLOB_ACCOUNT};AccountKey={BLOB_KEY};BlobEndpoint={fake_url}/{BLOB_ACCOUNT};",
+        "AZURE_BLOB_CONTAINER_NAME": "load-test",
+        "FILE_INDEX_PATH": os.path.join(work_dir, "file_index.sqlite"),
+        "PROMPT_RELOAD_INTERVAL_SECONDS": "0",
+    })
+    if not telemetry:
+        env["TELEMETRY_EXPORTER"] = "none"
+    return env
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            if httpx.get(url).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} did not answer within {timeout}s")
+
+async def run_scenario(base_url: str, name: str, requests: int, concurrency: int, timeout: float) -> ScenarioResult:
+    path, body = SCENARIOS[name]
+    latencies: list[float] = []
+    errors: list[str] = []
+    remaining = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        # One request to build anything the scenario creates lazily
+        await client.post(path, json=body)
+        await client.post("/_load/stats/reset")
+
+        async def user() -> None:
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json=body)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        duration = time.perf_counter() - start
+        stats = (await client.get("/_load/stats")).json()
+
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return ScenarioResult(
+        scenario=name,
+        requests=requests,
+        concurrency=concurrency,
+        errors=len(errors),
+        duration_s=round(duration, 3),
+        rps=round(len(latencies) / duration, 2),
+        latency_ms={
+            "mean": round(statistics.mean(latencies_ms), 1) if latencies_ms else 0.0,
+            "p50": round(percentile(latencies_ms, 0.50), 1),
+            "p95": round(percentile(latencies_ms, 0.95), 1),
+            "p99": round(percentile(latencies_ms, 0.99), 1),
+            "max": round(max(latencies_ms, default=0.0), 1),
+        },
+        loop_lag_ms=stats["loop_lag_ms"],
+        rss_mb=stats["rss_mb"],
+        peak_rss_mb=stats["peak_rss_mb"],
+        error_samples=sorted(set(errors))[:5],
+    )
+
+def print_result(result: ScenarioResult) -> None:
+    latency = result.latency_ms
+    print(f"{result.scenario:14} p50={latency['p50']:8.1f}ms  p95={latency['p95']:8.1f}ms  p99={latency['p99']:8.1f}ms"
+          f"  rps={result.rps:7.1f}  errors={result.errors:3}  lag p99={result.loop_lag_ms['p99']:6.1f}ms"
+          f"  max={result.loop_lag_ms['max']:6.1f}ms  rss={result.rss_mb:6.1f}MB  peak={result.peak_rss_mb:6.1f}MB")
+    for sample in result.error_samples:
+        print(f"{'':14} {sample}")
+
+def compare(current: dict, previous_path: str) -> None:
+    with open(previous_path) as file:
+        previous = {result["scenario"]: result for result in json.load(file)["results"]}
+    print(f"change against {previous_path}:")
+    for result in current["results"]:
+        before = previous.get(result["scenario"])
+        if before is None:
+            continue
+        changes = []
+        for label, now, then in [
+            ("p50", result["latency_ms"]["p50"], before["latency_ms"]["p50"]),
+            ("p95", result["latency_ms"]["p95"], before["latency_ms"]["p95"]),
+            ("p99", result["latency_ms"]["p99"], before["latency_ms"]["p99"]),
+            ("rps", result["rps"], before["rps"]),
+            ("lag p99", result["loop_lag_ms"]["p99"], before["loop_lag_ms"]["p99"]),
+            ("peak rss", result["peak_rss_mb"], before["peak_rss_mb"]),
+        ]:
+            percent = f"{(now - then) / then * 100:+.1f}%" if then else "n/a"
+            changes.append(f"{label} {then}->{now} ({percent})")
+        print(f"{result['scenario']:14} " + "  ".join(changes))
+
+def main(arguments: argparse.Namespace) -> None:
+    fake_port, app_port = free_port(), free_port()
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    base_url = f"http://127.0.0.1:{app_port}"
+    fake_options = {name: getattr(arguments, name) for name in FAKE_OPTIONS}
+    fake_command = [sys.executable, "-m", "benchmarks.fake_services", "--port", str(fake_port)]
+    for name, value in fake_options.items():
+        fake_command += [f"--{name.replace('_', '-')}", str(value)]
+
+    output = None if arguments.verbose else subprocess.DEVNULL
+    with tempfile.TemporaryDirectory() as work_dir:
+        fakes = subprocess.Popen(fake_command, stdout=output, stderr=output)
+        server = None
+        try:
+            wait_for(f"{fake_url}/healthz", fakes, arguments.timeout)
+            server = subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.load_app", "--port", str(app_port)],
+                env=app_env(fake_url, work_dir, arguments.telemetry), stdout=output, stderr=output)
+            wait_for(f"{base_url}/ready", server, arguments.timeout)
+
+            results = []
+            for name in arguments.scenarios:
+                result = asyncio.run(run_scenario(base_url, name, arguments.requests, arguments.concurrency, arguments.timeout))
+                print_result(result)
+                results.append(asdict(result))
+        finally:
+            for process in (server, fakes):
+                if process is not None:
+                    process.terminate()
+                    process.wait()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {"requests": arguments.requests, "concurrency": arguments.concurrency, "telemetry": arguments.telemetry, **fake_options},
+        "results": results,
+    }
+    path = arguments.output or os.path.join(RESULTS_DIR, f"load-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"results written to {path}")
+    if arguments.compare:
+        compare(report, arguments.compare)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=["weather", "agent-weather", "chat"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--openai-latency-ms", type=float, default=300)
+    parser.add_argument("--token-delay-ms", type=float, default=10)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--weather-latency-ms", type=float, default=80)
+    parser.add_argument("--agent-latency-ms", type=float, default=50)
+    parser.add_argument("--blob-size", type=int, default=64 * 1024)
+    parser.add_argument("--telemetry", action="store_true", help="keep the configured telemetry exporter")
+    parser.add_argument("--output", help="result file, default benchmarks/results/load-<time>-<commit>.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the app and fake services")
+    main(parser.parse_args())
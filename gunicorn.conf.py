@@ -0,0 +1,41 @@
+"""
+gunicorn settings for serving app.main:app with several uvicorn worker processes.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the master and the workers are forked from it.
+Each worker runs the FastAPI lifespan, so it creates its own clients and
+warms up the agent definition before /ready reports it. With more than one
+worker, caches and weather threads are shared through the SQLite database at
+CACHE_PATH (see CACHE_BACKEND).
+
+kill -HUP <master pid> replaces the workers one by one, letting running
+requests finish for up to GRACEFUL_TIMEOUT seconds; code changes need a full
+restart because the app is preloaded. Other gunicorn settings can be passed
+in GUNICORN_CMD_ARGS.
+"""
+import os
+
+def default_workers() -> int:
+    # CPUs available to the container rather than the host
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+workers = int(os.getenv("WEB_CONCURRENCY") or default_workers())
+# The app reads the worker count to decide whether its caches must be shared
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE_SECONDS", "5"))
+# Recycle workers after this many requests (0 never), spread out so they do not restart together
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before the workers are forked
+    from app.services.registry import services
+    services.preload()